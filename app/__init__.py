@@ -60,26 +60,104 @@ def create_app(config_name='default'):
         from app.core.scheduler import DynamicTimeSliceScheduler
         from app.models.data_manager import DataManager
         from app.services.task_service import TaskService
+        from app.core.connection_pool import FTPConnectionPool
+        from app.core.rate_limiter import HierarchicalRateLimiter
+        from app.core.throughput_model import ThroughputModel
+        from app.core.process_executor import ProcessStageExecutor
 
         # 创建全局实例
         print("创建数据管理器...")
-        data_manager = DataManager(app.config['DATA_DIR'])
+        data_manager = DataManager(
+            app.config['DATA_DIR'],
+            backup_interval=app.config['BACKUP_INTERVAL'],
+            storage_backend=app.config['STORAGE_BACKEND'],
+            db_path=app.config['SQLITE_DB_PATH'],
+            task_flush_interval=app.config['TASK_FLUSH_INTERVAL'],
+            task_durability=app.config['TASK_DURABILITY'],
+            log_max_size=app.config['LOG_MAX_SIZE'],
+            log_flush_interval=app.config['LOG_FLUSH_INTERVAL'],
+            log_compress=app.config['LOG_COMPRESS_ROTATED']
+        )
+
+        print("创建传输限速器...")
+        rate_limiter = HierarchicalRateLimiter(
+            global_rate=app.config['RATE_LIMIT_GLOBAL'],
+            burst_seconds=app.config['RATE_LIMIT_BURST']
+        )
+
+        throughput_model = None
+        if app.config['ADAPTIVE_TIME_SLICES']:
+            print("加载吞吐模型...")
+            throughput_model = ThroughputModel(
+                app.config['THROUGHPUT_MODEL_FILE'],
+                alpha=app.config['THROUGHPUT_EWMA_ALPHA'],
+                min_samples=app.config['THROUGHPUT_MIN_SAMPLES']
+            )
+
+        process_executor = None
+        if app.config['PROCESS_POOL_WORKERS'] > 0:
+            print("创建进程池执行器...")
+            process_executor = ProcessStageExecutor(app.config['PROCESS_POOL_WORKERS'])
 
         print("创建调度器...")
         scheduler = DynamicTimeSliceScheduler(
             max_workers=app.config['MAX_WORKERS'],
-            data_manager=data_manager
+            data_manager=data_manager,
+            preemption_grace_period=app.config['PREEMPTION_GRACE_PERIOD'],
+            rate_limiter=rate_limiter,
+            throughput_model=throughput_model,
+            slice_overhead_ratio=app.config['SLICE_OVERHEAD_RATIO'],
+            max_tasks_per_site=app.config['MAX_TASKS_PER_SITE'],
+            worker_mode=app.config['WORKER_POOL_MODE'],
+            min_workers=app.config['MIN_WORKERS'],
+            worker_idle_timeout=app.config['WORKER_IDLE_TIMEOUT'],
+            scale_interval=app.config['WORKER_SCALE_INTERVAL'],
+            scale_up_min_gain=app.config['WORKER_SCALE_MIN_GAIN'],
+            process_executor=process_executor,
+            default_monitor_interval=app.config['MONITOR_INTERVAL'],
+            reschedule_jitter=app.config['MONITOR_JITTER'],
+            restore_spread=app.config['MONITOR_RESTORE_SPREAD']
+        )
+
+        print("创建FTP连接池...")
+        connection_pool = FTPConnectionPool(
+            max_per_site=app.config['FTP_POOL_MAX_PER_SITE'],
+            idle_timeout=app.config['FTP_POOL_IDLE_TIMEOUT'],
+            acquire_timeout=app.config['FTP_POOL_ACQUIRE_TIMEOUT'],
+            default_timeout=app.config['FTP_TIMEOUT'],
+            default_chunk_size=app.config['FTP_CHUNK_SIZE'],
+            rate_limiter=rate_limiter,
+            throughput_model=throughput_model
         )
 
         print("创建任务服务...")
-        task_service = TaskService(scheduler, data_manager)
+        task_service = TaskService(
+            scheduler, data_manager, connection_pool,
+            segmented_threshold=app.config['SEGMENTED_DOWNLOAD_THRESHOLD'],
+            segmented_streams=app.config['SEGMENTED_DOWNLOAD_STREAMS'],
+            folder_concurrency=app.config['FOLDER_TRANSFER_CONCURRENCY'],
+            folder_retries=app.config['FOLDER_TRANSFER_RETRIES'],
+            folder_list_parallelism=app.config['FOLDER_LIST_PARALLELISM'],
+            verify_checksum=app.config['VERIFY_CHECKSUM'],
+            monitor_share_window=app.config['MONITOR_SHARE_WINDOW'],
+            monitor_stable_listings=app.config['MONITOR_STABLE_LISTINGS'],
+            monitor_stable_age=app.config['MONITOR_STABLE_AGE'],
+            monitor_interval=app.config['MONITOR_INTERVAL'],
+            monitor_min_interval=app.config['MONITOR_MIN_INTERVAL'],
+            monitor_max_interval=app.config['MONITOR_MAX_INTERVAL'],
+            monitor_full_scan_interval=app.config['MONITOR_FULL_SCAN_INTERVAL']
+        )
 
         print("创建连接测试服务...")
         from app.services.connection_service import ConnectionTestService
-        connection_service = ConnectionTestService(data_manager, max_concurrent_tests=3)
+        connection_service = ConnectionTestService(data_manager, max_concurrent_tests=3,
+                                                   connection_pool=connection_pool,
+                                                   test_timeout=app.config['CONNECTION_TEST_TIMEOUT'])
 
         # 将实例添加到应用上下文
         app.data_manager = data_manager
+        app.connection_pool = connection_pool
+        app.rate_limiter = rate_limiter
         app.scheduler = scheduler
         app.task_service = task_service
         app.connection_service = connection_service
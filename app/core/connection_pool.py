@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FTP连接池 - 按站点复用已登录的FTP会话
+"""
+
+import base64
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from app.core.ftp_client import FTPClient
+from app.core.rate_limiter import HierarchicalRateLimiter
+
+
+class PoolExhaustedError(Exception):
+    """站点连接数已满，等待可用会话超时（调度器将任务稍后重新排队而不是标记失败）"""
+
+
+class _SitePool:
+    """单个站点的连接池状态"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.idle = deque()       # [(client, last_used)]
+        self.in_use = 0           # 已借出的会话数
+        self.created = 0          # 累计创建的会话数
+        self.reused = 0           # 累计复用次数
+
+    @property
+    def total(self) -> int:
+        return len(self.idle) + self.in_use
+
+
+class FTPConnectionPool:
+    """FTP连接池 - 限制每站点最大连接数，借出时NOOP健康检查，空闲超时自动回收"""
+
+    def __init__(self, max_per_site: int = 4, idle_timeout: float = 300,
+                 acquire_timeout: float = 30, default_timeout: int = 30,
+                 default_chunk_size: int = 8192,
+                 client_factory: Optional[Callable[[Dict], FTPClient]] = None,
+                 rate_limiter: Optional[HierarchicalRateLimiter] = None,
+                 throughput_model=None):
+        self.max_per_site = max_per_site
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.default_timeout = default_timeout
+        self.default_chunk_size = default_chunk_size
+        self.client_factory = client_factory or self._create_client
+        self.rate_limiter = rate_limiter
+        self.throughput_model = throughput_model  # 记录各站点建立连接的耗时
+
+        self.pools = {}  # {pool_key: _SitePool}
+        self.lock = threading.RLock()
+        self.available = threading.Condition(self.lock)
+        self.running = True
+
+        # 启动空闲连接回收线程
+        self._start_reaper_thread()
+
+        print(f"FTP连接池初始化完成，每站点最大连接数: {max_per_site}，空闲超时: {idle_timeout}秒")
+
+    def _pool_key(self, site_config: Dict) -> str:
+        """生成连接池键（站点配置变化后自动使用新的会话）"""
+        return "|".join([
+            str(site_config.get('id', '')),
+            str(site_config.get('host', '')),
+            str(site_config.get('port', 21)),
+            str(site_config.get('username', '')),
+            str(site_config.get('password', ''))
+        ])
+
+    def get_site_limit(self, site_config: Dict) -> int:
+        """站点最大连接数（站点配置的max_connections优先）"""
+        return site_config.get('max_connections') or self.max_per_site
+
+    def _decrypt_password(self, encrypted: str) -> str:
+        """解密密码"""
+        try:
+            return base64.b64decode(encrypted.encode()).decode()
+        except:
+            return encrypted
+
+    def _create_client(self, site_config: Dict, timeout: Optional[float] = None) -> FTPClient:
+        """创建FTP客户端（站点配置中的密码为加密形式）"""
+        encrypted_password = site_config.get('password', '')
+        password = self._decrypt_password(encrypted_password) if encrypted_password else ''
+
+        return FTPClient(
+            host=site_config['host'],
+            port=site_config.get('port', 21),
+            username=site_config.get('username', ''),
+            password=password,
+            timeout=timeout or site_config.get('timeout', self.default_timeout),
+            chunk_size=site_config.get('chunk_size') or self.default_chunk_size
+        )
+
+    def check_login(self, site_config: Dict, timeout: Optional[float] = None) -> Optional[str]:
+        """使用一个独立的新连接验证站点能否连接并登录，成功返回None，失败返回错误信息
+
+        不借用池中的会话：池中的会话满时不需要等待，复用的会话也不能说明新的登录可以成功。
+        """
+        client = self._create_client(site_config, timeout)
+        try:
+            if client.connect():
+                return None
+            return client.last_error or "连接失败"
+        finally:
+            client.disconnect()
+
+    def _bind_rate_limit(self, client: FTPClient, site_config: Dict, task_id: Optional[str]):
+        """设置会话的限速范围（站点限速取自站点配置的rate_limit）"""
+        if self.rate_limiter is None:
+            return
+        site_id = site_config.get('id')
+        self.rate_limiter.configure_site(site_id, site_config.get('rate_limit'))
+        client.rate_limiter = self.rate_limiter
+        client.rate_site_id = site_id
+        client.rate_task_id = task_id
+
+    def acquire(self, site_config: Dict, timeout: Optional[float] = None,
+                task_id: Optional[str] = None) -> FTPClient:
+        """借出一个已登录的会话，连接失败时抛出异常
+
+        task_id为使用该会话的任务，会话传输的数据计入该任务的限速。
+        """
+        key = self._pool_key(site_config)
+        wait_timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.time() + wait_timeout
+        max_connections = self.get_site_limit(site_config)
+
+        with self.available:
+            pool = self.pools.get(key)
+            if pool is None:
+                pool = _SitePool(key)
+                self.pools[key] = pool
+
+            while True:
+                # 优先复用空闲会话（后进先出，最近使用的会话最可能仍然有效）
+                while pool.idle:
+                    client, _ = pool.idle.pop()
+                    pool.in_use += 1
+                    self.lock.release()
+                    try:
+                        healthy = client.test_connection()
+                    finally:
+                        self.lock.acquire()
+                    if healthy:
+                        pool.reused += 1
+                        client.pool_key = key
+                        self._bind_rate_limit(client, site_config, task_id)
+                        return client
+                    # 健康检查失败，丢弃该会话
+                    pool.in_use -= 1
+                    self._close_client(client)
+
+                if pool.total < max_connections:
+                    pool.in_use += 1
+                    break
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise PoolExhaustedError(f"获取FTP连接超时: {site_config.get('host')} "
+                                             f"(已达到最大连接数 {max_connections})")
+                self.available.wait(remaining)
+
+        # 在锁外建立新连接，避免阻塞其他站点
+        client = None
+        try:
+            connect_start = time.time()
+            client = self.client_factory(site_config)
+            if not client.connect():
+                raise Exception(f"无法连接到FTP服务器: {client.last_error or '连接失败'}")
+            if self.throughput_model:
+                self.throughput_model.record_connection(site_config.get('id'), time.time() - connect_start)
+        except Exception:
+            with self.available:
+                pool.in_use -= 1
+                self.available.notify()
+            raise
+
+        with self.lock:
+            pool.created += 1
+        client.pool_key = key
+        self._bind_rate_limit(client, site_config, task_id)
+        return client
+
+    def release(self, client: FTPClient, discard: bool = False):
+        """归还会话，discard为True或会话已断开时直接关闭"""
+        key = getattr(client, 'pool_key', None)
+        client.rate_task_id = None
+
+        # 恢复初始工作目录，保证下一个使用者看到一致的会话状态
+        if not discard and client.connected and client.directory_changed:
+            if not client.reset_directory():
+                discard = True
+
+        with self.available:
+            pool = self.pools.get(key)
+            if pool is None:
+                discard = True
+            else:
+                pool.in_use = max(0, pool.in_use - 1)
+                if not discard and client.connected and self.running:
+                    pool.idle.append((client, time.time()))
+                    client = None
+            self.available.notify()
+
+        if client is not None:
+            self._close_client(client)
+
+    @contextmanager
+    def session(self, site_config: Dict, timeout: Optional[float] = None,
+                task_id: Optional[str] = None):
+        """以上下文管理器形式借用会话，发生异常时丢弃该会话"""
+        client = self.acquire(site_config, timeout, task_id)
+        try:
+            yield client
+        except Exception:
+            self.release(client, discard=True)
+            raise
+        else:
+            self.release(client)
+
+    def _close_client(self, client: FTPClient):
+        """关闭会话"""
+        try:
+            client.disconnect()
+        except Exception as e:
+            print(f"关闭FTP会话失败: {e}")
+
+    def evict_idle(self) -> int:
+        """回收超过空闲时间的会话"""
+        expired = []
+        now = time.time()
+
+        with self.lock:
+            for key in list(self.pools.keys()):
+                pool = self.pools[key]
+                while pool.idle and now - pool.idle[0][1] >= self.idle_timeout:
+                    client, _ = pool.idle.popleft()
+                    expired.append(client)
+
+                # 移除空的站点池
+                if pool.total == 0:
+                    del self.pools[key]
+
+        for client in expired:
+            self._close_client(client)
+
+        if expired:
+            print(f"回收空闲FTP会话: {len(expired)} 个")
+        return len(expired)
+
+    def close_site(self, site_id: str):
+        """关闭指定站点的所有空闲会话（站点被修改或删除时调用）"""
+        closing = []
+        with self.lock:
+            for key, pool in self.pools.items():
+                if key.split('|', 1)[0] == str(site_id):
+                    closing.extend(client for client, _ in pool.idle)
+                    pool.idle.clear()
+
+        for client in closing:
+            self._close_client(client)
+
+    def close_all(self):
+        """关闭连接池"""
+        self.running = False
+        closing = []
+        with self.available:
+            for pool in self.pools.values():
+                closing.extend(client for client, _ in pool.idle)
+                pool.idle.clear()
+            self.available.notify_all()
+
+        for client in closing:
+            self._close_client(client)
+        print("FTP连接池已关闭")
+
+    def get_statistics(self) -> Dict:
+        """获取连接池统计信息"""
+        with self.lock:
+            sites = {}
+            for key, pool in self.pools.items():
+                site_id = key.split('|', 1)[0]
+                site_stats = sites.setdefault(site_id, {
+                    'idle': 0, 'in_use': 0, 'created': 0, 'reused': 0
+                })
+                site_stats['idle'] += len(pool.idle)
+                site_stats['in_use'] += pool.in_use
+                site_stats['created'] += pool.created
+                site_stats['reused'] += pool.reused
+
+            return {
+                'max_per_site': self.max_per_site,
+                'idle_timeout': self.idle_timeout,
+                'sites': sites
+            }
+
+    def _start_reaper_thread(self):
+        """启动空闲会话回收线程"""
+        interval = max(5.0, min(60.0, self.idle_timeout / 2))
+
+        def reaper_loop():
+            while self.running:
+                try:
+                    time.sleep(interval)
+                    self.evict_idle()
+                except Exception as e:
+                    print(f"回收空闲FTP会话失败: {e}")
+
+        reaper_thread = threading.Thread(target=reaper_loop, name="FTPPoolReaper", daemon=True)
+        reaper_thread.start()
@@ -5,24 +5,129 @@ FTP客户端封装
 """
 
 import ftplib
+import mmap
 import os
+import re
 import time
 import socket
+from datetime import datetime
 from typing import Optional, Callable, Dict, Any, List
 
+from app.core.integrity import HASH_ALGORITHMS, parse_hash_reply, sample_ranges
+
+# Unix风格LIST输出：权限 链接数 所有者 [组] 大小 月 日 时间/年份 文件名
+UNIX_LIST_PATTERN = re.compile(
+    r'^(?P<permissions>[\-ldcbps][\w\-]{9}\S*)\s+\d+\s+\S+\s+(?:\S+\s+)?(?P<size>\d+)\s+'
+    r'(?P<month>[A-Za-z]{3})\s+(?P<day>\d{1,2})\s+(?P<time>\d{1,2}:\d{2}|\d{4})\s(?P<name>.+)$'
+)
+
+# DOS/Windows风格LIST输出：日期 时间 <DIR>或大小 文件名
+DOS_LIST_PATTERN = re.compile(
+    r'^(?P<date>\d{2}-\d{2}-\d{2,4})\s+(?P<time>\d{1,2}:\d{2}(?:[AaPp][Mm])?)\s+'
+    r'(?P<size><DIR>|\d+)\s+(?P<name>.+)$'
+)
+
+MONTHS = {name: index for index, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}
+
+
+def parse_list_line(line: str) -> Optional[Dict]:
+    """解析一行LIST输出（支持Unix和DOS格式），无法解析或为 . / .. 时返回None"""
+    match = UNIX_LIST_PATTERN.match(line)
+    if match:
+        permissions = match.group('permissions')
+        name = match.group('name')
+        if permissions.startswith('l') and ' -> ' in name:
+            name = name.split(' -> ', 1)[0]
+        is_dir = permissions.startswith('d')
+
+        modified = None
+        try:
+            month = MONTHS[match.group('month').lower()]
+            day = int(match.group('day'))
+            if ':' in match.group('time'):
+                # 没有年份表示最近半年内的文件
+                hour, minute = map(int, match.group('time').split(':'))
+                now = datetime.now()
+                modified = datetime(now.year, month, day, hour, minute)
+                if (modified - now).days > 1:
+                    modified = modified.replace(year=now.year - 1)
+            else:
+                modified = datetime(int(match.group('time')), month, day)
+        except (KeyError, ValueError):
+            pass
+    else:
+        match = DOS_LIST_PATTERN.match(line)
+        if not match:
+            return None
+        name = match.group('name')
+        is_dir = match.group('size') == '<DIR>'
+        permissions = 'd' if is_dir else '-'
+
+        modified = None
+        for date_format in ('%m-%d-%y %I:%M%p', '%m-%d-%Y %I:%M%p', '%m-%d-%y %H:%M', '%m-%d-%Y %H:%M'):
+            try:
+                modified = datetime.strptime(f"{match.group('date')} {match.group('time').upper()}", date_format)
+                break
+            except ValueError:
+                continue
+
+    if name in ['.', '..']:
+        return None
+
+    return {
+        'name': name,
+        'size': int(match.group('size')) if not is_dir else 0,
+        'is_directory': is_dir,
+        'permissions': permissions,
+        'modified': modified.isoformat() if modified else None,
+        'raw_line': line
+    }
+
+
+class TransferAborted(Exception):
+    """进度回调返回False时用于中止数据传输"""
+    pass
+
 class FTPClient:
     """FTP客户端 - 支持连接管理、文件传输和断点续传"""
     
+    # 上传时每次交给内核发送的字节数（进度回调的间隔）
+    send_chunk_size = 4 * 1024 * 1024
+    
+    # 下载进度回调的时间间隔（秒）和字节间隔，以及填充读取缓冲区的最长等待时间（秒）
+    progress_interval = 0.5
+    progress_bytes = 4 * 1024 * 1024
+    fill_timeout = 0.2
+    
+    # 抽样校验的抽样数和每个抽样的字节数
+    verify_samples = 8
+    verify_sample_size = 64 * 1024
+    
+    # 等待服务器计算摘要的超时时间（秒），大文件计算摘要可能超过普通命令的超时
+    hash_timeout = 600
+    
     def __init__(self, host: str, port: int = 21, username: str = "", 
-                 password: str = "", timeout: int = 30):
+                 password: str = "", timeout: int = 30, chunk_size: int = 8192):
         self.host = host
         self.port = port
         self.username = username
         self.password = password
         self.timeout = timeout
+        self.chunk_size = chunk_size   # 下载读取缓冲区大小
         self.ftp = None
         self.connected = False
         self.last_error = None
+        self.home_directory = None     # 登录后的初始目录
+        self.directory_changed = False # 是否切换过工作目录（连接池归还时用于恢复）
+        self.pool_key = None           # 所属连接池键
+        self.mlsd_supported = None     # 服务器是否支持MLSD（None表示未检测）
+        self.mlst_supported = None     # 服务器是否支持MLST
+        self.hash_support = None       # 服务器支持的哈希命令 {算法: 命令}（None表示未检测）
+        self.known_directories = set() # 已确认存在的远程目录（避免重复CWD/MKD）
+        self.rate_limiter = None       # 限速器（由连接池设置）
+        self.rate_site_id = None       # 限速所属站点
+        self.rate_task_id = None       # 限速所属任务（借出时设置，归还时清除）
     
     def connect(self) -> bool:
         """连接到FTP服务器"""
@@ -38,6 +143,13 @@ class FTPClient:
             # 设置为被动模式
             self.ftp.set_pasv(True)
             
+            # 记录初始目录
+            try:
+                self.home_directory = self.ftp.pwd()
+            except Exception:
+                self.home_directory = None
+            self.directory_changed = False
+            
             self.connected = True
             self.last_error = None
             print(f"FTP连接成功: {self.host}:{self.port}")
@@ -94,26 +206,34 @@ class FTPClient:
             # 首先尝试使用SIZE命令（二进制模式）
             self.ftp.voidcmd('TYPE I')  # 切换到二进制模式
             return self.ftp.size(remote_path)
+        except ftplib.error_perm as e:
+            if str(e)[:3] not in ('500', '501', '502', '504'):
+                # 文件不存在（550等），无需再列目录确认
+                return None
+            print(f"SIZE命令失败: {e}")
+            return self._get_file_size_from_listing(remote_path)
         except Exception as e:
             print(f"SIZE命令失败: {e}")
-            # 如果SIZE命令失败，尝试通过列表目录获取文件大小
-            try:
-                # 获取文件所在目录和文件名
-                import os
-                dir_path = os.path.dirname(remote_path).replace('\\', '/') or '.'
-                filename = os.path.basename(remote_path)
+            return self._get_file_size_from_listing(remote_path)
+    
+    def _get_file_size_from_listing(self, remote_path: str) -> Optional[int]:
+        """服务器不支持SIZE命令时，通过列表目录获取文件大小"""
+        try:
+            # 获取文件所在目录和文件名
+            dir_path = os.path.dirname(remote_path).replace('\\', '/') or '.'
+            filename = os.path.basename(remote_path)
 
-                # 列出目录内容
-                files = self.list_directory(dir_path)
-                for file_info in files:
-                    if file_info['name'] == filename and not file_info['is_directory']:
-                        return file_info.get('size')
+            # 列出目录内容
+            files = self.list_directory(dir_path)
+            for file_info in files:
+                if file_info['name'] == filename and not file_info['is_directory']:
+                    return file_info.get('size')
 
-                print(f"文件不存在: {remote_path}")
-                return None
-            except Exception as e2:
-                print(f"通过目录列表获取文件大小失败: {e2}")
-                return None
+            print(f"文件不存在: {remote_path}")
+            return None
+        except Exception as e:
+            print(f"通过目录列表获取文件大小失败: {e}")
+            return None
     
     def file_exists(self, remote_path: str) -> bool:
         """检查远程文件是否存在"""
@@ -146,45 +266,109 @@ class FTPClient:
             return []
 
         try:
-            files = []
-
             # 先切换到目标目录
             if remote_path != "." and remote_path != self.get_current_directory():
                 if not self.change_directory(remote_path):
                     print(f"无法切换到目录: {remote_path}")
                     return []
 
-            def parse_line(line):
-                # 解析LIST命令的输出
-                parts = line.split()
-                if len(parts) >= 9:
-                    permissions = parts[0]
-                    size = parts[4] if parts[4].isdigit() else 0
-                    name = " ".join(parts[8:])
-
-                    # 跳过 . 和 .. 目录
-                    if name in ['.', '..']:
-                        return
-
-                    is_dir = permissions.startswith('d')
-
-                    files.append({
-                        'name': name,
-                        'size': int(size) if not is_dir else 0,
-                        'is_directory': is_dir,
-                        'permissions': permissions,
-                        'raw_line': line
-                    })
-
-            # 使用LIST命令列出当前目录内容
-            self.ftp.retrlines('LIST', parse_line)
-            return files
+            return self.list_entries(".")
 
         except Exception as e:
             print(f"列出目录失败: {e}")
             self.last_error = str(e)
             return []
     
+    def list_entries(self, remote_path: str = ".") -> List[Dict]:
+        """列出目录内容（优先使用MLSD，服务器不支持时回退到LIST），失败时抛出异常"""
+        if not self.ensure_connected():
+            raise Exception(f"FTP连接不可用: {self.last_error or self.host}")
+        
+        if self.mlsd_supported is not False:
+            try:
+                entries = self._list_mlsd(remote_path)
+                self.mlsd_supported = True
+                return entries
+            except ftplib.error_perm as e:
+                # 500/502等表示命令不支持，其他错误（如550目录不存在）直接抛出
+                if self.mlsd_supported or str(e)[:3] not in ('500', '501', '502', '504'):
+                    raise
+                print(f"服务器不支持MLSD，使用LIST: {e}")
+                self.mlsd_supported = False
+        
+        # LIST的路径参数在部分服务器上不支持空格，先切换目录
+        if remote_path not in ('', '.'):
+            self.ftp.cwd(remote_path)
+            self.directory_changed = True
+        
+        lines = []
+        self.ftp.retrlines('LIST', lines.append)
+        return [entry for entry in map(parse_list_line, lines) if entry]
+    
+    def _list_mlsd(self, remote_path: str) -> List[Dict]:
+        """使用MLSD列出目录，返回与LIST解析结果相同的格式"""
+        path = '' if remote_path in ('', '.') else remote_path
+        entries = []
+        for name, facts in self.ftp.mlsd(path, facts=['type', 'size', 'modify', 'perm', 'unix.mode']):
+            entry_type = facts.get('type', '').lower()
+            if entry_type in ('cdir', 'pdir') or name in ('.', '..'):
+                continue
+            is_dir = entry_type == 'dir'
+            
+            # modify为UTC时间 YYYYMMDDHHMMSS[.sss]
+            modified = None
+            if facts.get('modify'):
+                try:
+                    modified = datetime.strptime(facts['modify'][:14], '%Y%m%d%H%M%S').isoformat()
+                except ValueError:
+                    pass
+            
+            entries.append({
+                'name': name,
+                'size': int(facts.get('size', 0) or 0) if not is_dir else 0,
+                'is_directory': is_dir,
+                'permissions': facts.get('unix.mode') or facts.get('perm', ''),
+                'modified': modified,
+                'modified_utc': True,
+                'raw_line': ';'.join(f"{key}={value}" for key, value in facts.items()) + f"; {name}"
+            })
+        return entries
+    
+    def get_modify_time(self, remote_path: str) -> Optional[str]:
+        """使用MLST获取文件或目录的修改时间（ISO格式，与列目录结果一致），只使用控制连接
+
+        服务器不支持MLST、路径不存在或没有modify信息时返回None，连接异常时抛出。
+        """
+        if self.mlst_supported is False:
+            return None
+        if not self.ensure_connected():
+            raise Exception(f"FTP连接不可用: {self.last_error or self.host}")
+        
+        try:
+            reply = self.ftp.sendcmd(f'MLST {remote_path}')
+        except ftplib.error_perm as e:
+            if str(e)[:3] in ('500', '501', '502', '504') and not self.mlst_supported:
+                print(f"服务器不支持MLST: {e}")
+                self.mlst_supported = False
+            return None
+        self.mlst_supported = True
+        
+        # 回复的第二行为 " type=dir;modify=YYYYMMDDHHMMSS;... 路径"
+        for line in reply.splitlines()[1:]:
+            if not line.startswith(' '):
+                continue
+            facts = {}
+            for fact in line.strip().partition(' ')[0].split(';'):
+                name, _, value = fact.partition('=')
+                facts[name.lower()] = value
+            modify = facts.get('modify')
+            if modify:
+                try:
+                    return datetime.strptime(modify[:14], '%Y%m%d%H%M%S').isoformat()
+                except ValueError:
+                    return None
+        return None
+    
     def change_directory(self, remote_path: str) -> bool:
         """切换目录"""
         if not self.ensure_connected():
@@ -192,11 +376,25 @@ class FTPClient:
         
         try:
             self.ftp.cwd(remote_path)
+            self.directory_changed = True
             return True
         except Exception as e:
             print(f"切换目录失败: {e}")
             return False
     
+    def reset_directory(self) -> bool:
+        """恢复到登录后的初始目录"""
+        if not self.home_directory:
+            return False
+        
+        try:
+            self.ftp.cwd(self.home_directory)
+            self.directory_changed = False
+            return True
+        except Exception as e:
+            print(f"恢复初始目录失败: {e}")
+            return False
+    
     def get_current_directory(self) -> Optional[str]:
         """获取当前目录"""
         if not self.ensure_connected():
@@ -221,7 +419,7 @@ class FTPClient:
             return False
     
     def ensure_remote_directory(self, remote_path: str) -> bool:
-        """确保远程目录存在"""
+        """确保远程目录存在（已确认存在的目录不再检查）"""
         if not remote_path or remote_path == '/':
             return True
         
@@ -231,19 +429,174 @@ class FTPClient:
         
         for part in path_parts:
             current_path += '/' + part
+            if current_path in self.known_directories:
+                continue
             
             # 尝试切换到目录
             if not self.change_directory(current_path):
                 # 目录不存在，尝试创建
                 if not self.create_directory(current_path):
                     return False
+            self.known_directories.add(current_path)
+        
+        return True
+    
+    def _rate_chunk_size(self, max_size: int) -> int:
+        """限速时按有效速率缩小单次读写的数据量"""
+        if self.rate_limiter is None:
+            return max_size
+        return self.rate_limiter.chunk_size(self.rate_site_id, self.rate_task_id, max_size)
+    
+    def _throttle(self, nbytes: int):
+        """按全局、站点和任务限速等待"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.consume(nbytes, self.rate_site_id, self.rate_task_id)
+    
+    def _finish_aborted_transfer(self):
+        """读取被中止传输的最终响应，控制连接异常时断开（避免将失效会话归还连接池）"""
+        try:
+            self.ftp.voidresp()
+        except ftplib.Error:
+            # 426/451等中止响应，控制连接仍然可用
+            pass
+        except (OSError, EOFError) as e:
+            print(f"中止传输后控制连接异常: {e}")
+            self.disconnect()
+    
+    def get_hash_support(self) -> Dict[str, str]:
+        """通过FEAT检测服务器支持的哈希命令 {算法: 'HASH'或X命令}，同时支持时优先使用HASH"""
+        if self.hash_support is not None:
+            return self.hash_support
+        
+        support = {}
+        try:
+            features = self.ftp.sendcmd('FEAT').splitlines()[1:]
+        except ftplib.all_errors:
+            features = []
+        for line in features:
+            name, _, params = line.strip().partition(' ')
+            name = name.upper()
+            # HASH的参数为算法列表，当前选中的算法以*标记，如 "HASH SHA-256*;SHA-1;MD5"
+            hash_names = [param.strip().rstrip('*').upper() for param in params.split(';')]
+            for algorithm, (hash_name, x_command) in HASH_ALGORITHMS.items():
+                if name == 'HASH' and hash_name in hash_names:
+                    support[algorithm] = 'HASH'
+                elif name == x_command:
+                    support.setdefault(algorithm, x_command)
+        
+        self.hash_support = support
+        return support
+    
+    def preferred_hash_algorithm(self) -> Optional[str]:
+        """服务器支持的最强摘要算法，不支持哈希命令时返回None"""
+        support = self.get_hash_support()
+        for algorithm in HASH_ALGORITHMS:
+            if algorithm in support:
+                return algorithm
+        return None
+    
+    def get_remote_hash(self, remote_path: str, algorithm: str) -> Optional[str]:
+        """由服务器计算远程文件的摘要，失败时返回None"""
+        command = self.get_hash_support().get(algorithm)
+        if not command:
+            return None
+        
+        timeout = self.ftp.sock.gettimeout()
+        self.ftp.sock.settimeout(max(timeout or 0, self.hash_timeout))
+        try:
+            if command == 'HASH':
+                self.ftp.sendcmd(f'OPTS HASH {HASH_ALGORITHMS[algorithm][0]}')
+                reply = self.ftp.sendcmd(f'HASH {remote_path}')
+            else:
+                reply = self.ftp.sendcmd(f'{command} {remote_path}')
+        except ftplib.error_perm as e:
+            print(f"获取远程文件摘要失败 {remote_path}: {e}")
+            return None
+        finally:
+            self.ftp.sock.settimeout(timeout)
+        return parse_hash_reply(reply, algorithm)
+    
+    def read_range(self, remote_path: str, start: int, length: int) -> bytes:
+        """读取远程文件从start开始的length字节（REST+RETR，读够后主动关闭数据连接）"""
+        chunks = []
+        received = 0
         
+        self.ftp.voidcmd('TYPE I')
+        conn = self.ftp.transfercmd(f'RETR {remote_path}', rest=start if start > 0 else None)
+        try:
+            while received < length:
+                data = conn.recv(min(self.chunk_size, length - received))
+                if not data:
+                    break
+                chunks.append(data)
+                received += len(data)
+        finally:
+            conn.close()
+        
+        if received >= length:
+            self._finish_aborted_transfer()
+        else:
+            self.ftp.voidresp()
+        return b''.join(chunks)
+    
+    def compare_samples(self, remote_path: str, local_path: str, start: int, end: int) -> bool:
+        """抽样比对本地文件与远程文件 [start, end) 范围内的数据"""
+        with open(local_path, 'rb') as f:
+            for offset, size in sample_ranges(start, end, self.verify_samples, self.verify_sample_size):
+                f.seek(offset)
+                if self.read_range(remote_path, offset, size) != f.read(size):
+                    print(f"抽样校验不一致: {remote_path} 偏移 {offset}")
+                    return False
         return True
     
+    def verify_download(self, remote_path: str, local_path: str,
+                        algorithm: Optional[str] = None, local_digest: Optional[str] = None) -> Dict:
+        """校验下载结果：有本地摘要且服务器能计算同一算法的摘要时比对摘要，否则抽样比对
+        
+        返回 {'method', 'algorithm', 'local_digest', 'remote_digest', 'verified', 'verified_at'}。
+        """
+        result = {
+            'method': 'sampling',
+            'algorithm': None,
+            'local_digest': None,
+            'remote_digest': None,
+            'verified': False,
+            'verified_at': None
+        }
+        
+        remote_digest = self.get_remote_hash(remote_path, algorithm) if algorithm and local_digest else None
+        if remote_digest:
+            result.update({
+                'method': self.hash_support[algorithm],
+                'algorithm': algorithm,
+                'local_digest': local_digest,
+                'remote_digest': remote_digest,
+                'verified': local_digest == remote_digest
+            })
+        else:
+            # 服务器不支持哈希命令，按范围重新读取远程数据抽样比对
+            size = os.path.getsize(local_path)
+            result['samples'] = len(sample_ranges(0, size, self.verify_samples, self.verify_sample_size))
+            result['verified'] = self.compare_samples(remote_path, local_path, 0, size)
+        
+        result['verified_at'] = datetime.now().isoformat()
+        if not result['verified']:
+            print(f"完整性校验失败 ({result['method']}): {remote_path}")
+        return result
+    
     def download_file(self, remote_path: str, local_path: str, 
                      progress_callback: Optional[Callable] = None,
-                     start_byte: int = 0) -> bool:
-        """下载文件（支持断点续传）"""
+                     start_byte: int = 0, hasher=None, verify_prefix: bool = False) -> bool:
+        """下载文件（支持断点续传）
+        
+        数据先写入预分配的 <local_path>.part，完成后重命名为目标文件。中止或出错时
+        .part截断到已下载的位置，下次从该位置续传；.part大小等于远程文件大小说明
+        预分配后进程异常退出，此时从调用方提供的start_byte（如检查点）续传。
+        progress_callback返回False时中止传输并返回True，调用方通过目标文件是否存在判断是否完成。
+        
+        hasher为RunningDigest，写入数据的同时计入摘要（续传时只补齐摘要尚未覆盖的已下载部分）；
+        verify_prefix为True时续传前抽样比对已下载部分，不一致则从头下载。
+        """
         if not self.ensure_connected():
             return False
         
@@ -259,40 +612,102 @@ class FTPClient:
             if local_dir:
                 os.makedirs(local_dir, exist_ok=True)
             
+            part_path = f"{local_path}.part"
+            
             # 检查本地文件是否已存在
-            if start_byte == 0 and os.path.exists(local_path):
+            if os.path.exists(local_path):
                 local_size = os.path.getsize(local_path)
                 if local_size == remote_size:
                     print(f"文件已存在且大小相同，跳过下载: {local_path}")
+                    if hasher is not None:
+                        hasher.resume(local_path, local_size)
                     if progress_callback:
                         progress_callback(100.0, remote_size, remote_size)
                     return True
-                elif local_size < remote_size:
-                    # 支持断点续传
-                    start_byte = local_size
-                    print(f"检测到部分下载文件，从 {start_byte} 字节开始续传")
+                if local_size < remote_size and not os.path.exists(part_path):
+                    # 直接写入目标文件的部分下载，转为.part继续续传
+                    os.replace(local_path, part_path)
             
-            # 打开本地文件
-            mode = 'ab' if start_byte > 0 else 'wb'
+            # 确定续传位置
+            start = 0
+            if os.path.exists(part_path):
+                part_size = os.path.getsize(part_path)
+                start = part_size if part_size < remote_size else min(start_byte, remote_size)
+                if start > 0:
+                    print(f"检测到部分下载文件，从 {start} 字节开始续传")
+                if start > 0 and verify_prefix and not self.compare_samples(remote_path, part_path, 0, start):
+                    print(f"已下载部分与远程文件不一致，重新下载: {remote_path}")
+                    start = 0
+            if hasher is not None:
+                hasher.resume(part_path, start)
             
-            with open(local_path, mode) as local_file:
-                downloaded = start_byte
+            fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+            downloaded = start
+            completed = False
+            try:
+                # 按远程文件大小预分配磁盘空间，减少碎片并提前发现空间不足
+                if hasattr(os, 'posix_fallocate') and remote_size > start:
+                    try:
+                        os.posix_fallocate(fd, start, remote_size - start)
+                    except OSError as e:
+                        print(f"预分配磁盘空间失败: {e}")
                 
-                def callback(data):
-                    nonlocal downloaded
-                    local_file.write(data)
-                    downloaded += len(data)
-                    
-                    if progress_callback:
-                        progress = (downloaded / remote_size) * 100
-                        progress_callback(progress, downloaded, remote_size)
+                buffer = bytearray(self.chunk_size)
+                view = memoryview(buffer)
+                last_report_time = time.time()
+                last_report_bytes = start
                 
-                # 设置断点续传位置
-                if start_byte > 0:
-                    self.ftp.voidcmd(f'REST {start_byte}')
+                # 开始下载（start > 0 时先发送REST设置断点续传位置）
+                self.ftp.voidcmd('TYPE I')
+                try:
+                    with self.ftp.transfercmd(f'RETR {remote_path}', rest=start if start > 0 else None) as conn:
+                        while True:
+                            # 读满缓冲区（或等待超过填充时间）后再写入，减少系统调用次数
+                            filled = 0
+                            fill_size = self._rate_chunk_size(len(buffer))
+                            fill_deadline = time.time() + self.fill_timeout
+                            while filled < fill_size:
+                                received = conn.recv_into(view[filled:fill_size])
+                                if received == 0:
+                                    break
+                                filled += received
+                                if time.time() >= fill_deadline:
+                                    break
+                            if filled == 0:
+                                break
+                            
+                            self._write_at(fd, view[:filled], downloaded)
+                            if hasher is not None:
+                                hasher.update(view[:filled])
+                            downloaded += filled
+                            self._throttle(filled)
+                            
+                            # 按时间和字节数间隔回调进度
+                            now = time.time()
+                            if progress_callback and (now - last_report_time >= self.progress_interval or
+                                                      downloaded - last_report_bytes >= self.progress_bytes):
+                                last_report_time = now
+                                last_report_bytes = downloaded
+                                progress = (downloaded / remote_size) * 100 if remote_size else 100.0
+                                if progress_callback(progress, downloaded, remote_size) is False:
+                                    raise TransferAborted()
+                except TransferAborted:
+                    self._finish_aborted_transfer()
+                    print(f"文件下载已中止: {remote_path} ({downloaded}/{remote_size} 字节)")
+                    return True
+                self.ftp.voidresp()
                 
-                # 开始下载
-                self.ftp.retrbinary(f'RETR {remote_path}', callback)
+                os.ftruncate(fd, downloaded)
+                completed = True
+            finally:
+                if not completed:
+                    # 去掉预分配的未写入部分，保证.part大小等于已下载字节数
+                    os.ftruncate(fd, downloaded)
+                os.close(fd)
+            
+            os.replace(part_path, local_path)
+            if progress_callback:
+                progress_callback(100.0, downloaded, remote_size)
             
             print(f"文件下载完成: {remote_path} -> {local_path}")
             return True
@@ -302,10 +717,101 @@ class FTPClient:
             self.last_error = str(e)
             return False
     
+    def _write_at(self, fd: int, data: memoryview, offset: int):
+        """将数据完整写入文件的指定位置"""
+        while len(data) > 0:
+            if hasattr(os, 'pwrite'):
+                written = os.pwrite(fd, data, offset)
+            else:
+                os.lseek(fd, offset, os.SEEK_SET)
+                written = os.write(fd, data)
+            data = data[written:]
+            offset += written
+    
+    def download_range(self, remote_path: str, fd: int, start: int, end: int,
+                       progress_callback: Optional[Callable] = None) -> int:
+        """下载文件的 [start, end) 字节范围，按位置写入已打开的本地文件描述符
+        
+        使用REST+RETR从start开始读取，读到end后主动关闭数据连接。
+        progress_callback(本次写入字节数) 返回False时中止，返回本次下载的字节数。
+        """
+        if not self.ensure_connected():
+            raise Exception(f"FTP连接不可用: {self.last_error or self.host}")
+        
+        received = 0
+        position = start
+        stopped = False
+        
+        self.ftp.voidcmd('TYPE I')
+        conn = self.ftp.transfercmd(f'RETR {remote_path}', rest=start if start > 0 else None)
+        try:
+            while position < end:
+                data = conn.recv(min(self._rate_chunk_size(self.chunk_size), end - position))
+                if not data:
+                    break
+                self._write_at(fd, memoryview(data), position)
+                position += len(data)
+                received += len(data)
+                self._throttle(len(data))
+                
+                if progress_callback and progress_callback(len(data)) is False:
+                    stopped = True
+                    break
+        finally:
+            conn.close()
+        
+        if stopped or position >= end:
+            # 提前关闭数据连接，服务器可能返回426或226
+            self._finish_aborted_transfer()
+        else:
+            self.ftp.voidresp()
+            raise Exception(f"分段下载数据不完整: {remote_path} ({position}/{end} 字节)")
+        
+        return received
+    
+    def _send_file(self, conn: socket.socket, local_file, offset: int, end: int,
+                   callback: Callable[[int], None]):
+        """将本地文件的 [offset, end) 发送到数据连接
+        
+        支持os.sendfile时由内核直接从文件发送到套接字，否则使用mmap切片发送，
+        每发送send_chunk_size字节（限速时按有效速率缩小）调用一次callback(本次发送字节数)。
+        """
+        if offset >= end:
+            return
+        
+        if hasattr(os, 'sendfile'):
+            while offset < end:
+                count = min(self._rate_chunk_size(self.send_chunk_size), end - offset)
+                sent = conn.sendfile(local_file, offset, count)
+                if sent == 0:
+                    raise Exception("本地文件在上传过程中被截断")
+                offset += sent
+                self._throttle(sent)
+                callback(sent)
+            return
+        
+        with mmap.mmap(local_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                end = min(end, len(view))
+                while offset < end:
+                    count = self._rate_chunk_size(self.send_chunk_size)
+                    with view[offset:min(offset + count, end)] as chunk:
+                        conn.sendall(chunk)
+                        sent = len(chunk)
+                    offset += sent
+                    self._throttle(sent)
+                    callback(sent)
+            finally:
+                view.release()
+    
     def upload_file(self, local_path: str, remote_path: str,
                    progress_callback: Optional[Callable] = None,
                    start_byte: int = 0) -> bool:
-        """上传文件（支持断点续传）"""
+        """上传文件（支持断点续传）
+        
+        progress_callback返回False时中止传输，已上传部分保留在服务器并返回True。
+        """
         if not self.ensure_connected():
             return False
         
@@ -322,39 +828,47 @@ class FTPClient:
             if remote_dir and remote_dir != '.':
                 self.ensure_remote_directory(remote_dir)
             
-            # 检查远程文件是否已存在
-            if start_byte == 0:
-                remote_size = self.get_file_size(remote_path)
-                if remote_size is not None:
-                    if remote_size == local_size:
-                        print(f"远程文件已存在且大小相同，跳过上传: {remote_path}")
-                        if progress_callback:
-                            progress_callback(100.0, local_size, local_size)
-                        return True
-                    elif remote_size < local_size:
-                        # 支持断点续传
-                        start_byte = remote_size
-                        print(f"检测到部分上传文件，从 {start_byte} 字节开始续传")
+            # 检查远程文件是否已存在（续传位置以远程文件实际大小为准）
+            remote_size = self.get_file_size(remote_path)
+            if remote_size is not None:
+                if remote_size == local_size:
+                    print(f"远程文件已存在且大小相同，跳过上传: {remote_path}")
+                    if progress_callback:
+                        progress_callback(100.0, local_size, local_size)
+                    return True
+                elif remote_size < local_size:
+                    # 支持断点续传
+                    if remote_size != start_byte:
+                        print(f"检测到部分上传文件，从 {remote_size} 字节开始续传")
+                    start_byte = remote_size
+                else:
+                    start_byte = 0
+            else:
+                start_byte = 0
             
             with open(local_path, 'rb') as local_file:
-                # 设置断点续传位置
-                if start_byte > 0:
-                    local_file.seek(start_byte)
-                    self.ftp.voidcmd(f'REST {start_byte}')
-                
                 uploaded = start_byte
                 
-                def callback(data):
+                def callback(sent):
                     nonlocal uploaded
-                    uploaded += len(data)
+                    uploaded += sent
                     
                     if progress_callback:
                         progress = (uploaded / local_size) * 100
-                        progress_callback(progress, uploaded, local_size)
+                        if progress_callback(progress, uploaded, local_size) is False:
+                            raise TransferAborted()
                 
-                # 开始上传
+                # 开始上传（续传使用APPE从start_byte起追加到远程文件末尾）
                 cmd = 'STOR' if start_byte == 0 else 'APPE'
-                self.ftp.storbinary(f'{cmd} {remote_path}', local_file, callback=callback)
+                self.ftp.voidcmd('TYPE I')
+                try:
+                    with self.ftp.transfercmd(f'{cmd} {remote_path}') as conn:
+                        self._send_file(conn, local_file, start_byte, local_size, callback)
+                except TransferAborted:
+                    self._finish_aborted_transfer()
+                    print(f"文件上传已中止: {local_path} ({uploaded}/{local_size} 字节)")
+                    return True
+                self.ftp.voidresp()
             
             print(f"文件上传完成: {local_path} -> {remote_path}")
             return True
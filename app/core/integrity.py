@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+传输完整性校验 - 摘要计算、服务器哈希响应解析和抽样范围
+"""
+
+import hashlib
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+# 支持的摘要算法（按优先级排列）: {算法: (HASH命令中的名称, X命令)}
+HASH_ALGORITHMS = {
+    'sha256': ('SHA-256', 'XSHA256'),
+    'sha1': ('SHA-1', 'XSHA1'),
+    'md5': ('MD5', 'XMD5'),
+    'crc32': ('CRC32', 'XCRC'),
+}
+
+# 各算法十六进制摘要的长度
+DIGEST_LENGTHS = {'sha256': 64, 'sha1': 40, 'md5': 32, 'crc32': 8}
+
+HEX_PATTERN = re.compile(r'^[0-9A-Fa-f]+$')
+
+
+class CRC32Hasher:
+    """与hashlib接口一致的CRC32计算器"""
+
+    name = 'crc32'
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data):
+        self.value = zlib.crc32(data, self.value)
+
+    def hexdigest(self) -> str:
+        return f"{self.value & 0xffffffff:08x}"
+
+
+def new_hasher(algorithm: str):
+    """创建增量摘要计算器"""
+    if algorithm == 'crc32':
+        return CRC32Hasher()
+    return hashlib.new(algorithm)
+
+
+def hash_file(path: str, length: int, hasher, block_size: int = 1024 * 1024, offset: int = 0):
+    """将本地文件从offset开始的length字节计入摘要（用于续传时补齐已下载部分）"""
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    remaining = length
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while remaining > 0:
+            read = f.readinto(view[:min(block_size, remaining)])
+            if not read:
+                raise Exception(f"本地文件长度不足，无法计算摘要: {path}")
+            hasher.update(view[:read])
+            remaining -= read
+
+
+class RunningDigest:
+    """记录已计入字节数的增量摘要，续传时从已有状态继续计算，不重新读取整个已下载部分"""
+
+    def __init__(self, algorithm: str, hasher=None, offset: int = 0):
+        self.algorithm = algorithm
+        self.hasher = hasher or new_hasher(algorithm)
+        self.offset = offset  # 已计入摘要的字节数
+
+    def update(self, data):
+        self.hasher.update(data)
+        self.offset += len(data)
+
+    def hexdigest(self) -> str:
+        return self.hasher.hexdigest()
+
+    def resume(self, path: str, length: int):
+        """使摘要恰好覆盖文件的前length字节，只读取尚未计入的部分"""
+        if self.offset > length:
+            # 续传位置回退（如抽样比对不一致后从头下载），重新计算
+            self.hasher = new_hasher(self.algorithm)
+            self.offset = 0
+        if length > self.offset:
+            hash_file(path, length - self.offset, self.hasher, offset=self.offset)
+            self.offset = length
+
+    def state(self) -> Dict:
+        """可写入检查点的状态，hashlib不支持导出中间状态，只有CRC32保存计算值"""
+        return {
+            'algorithm': self.algorithm,
+            'offset': self.offset,
+            'crc': self.hasher.value if self.algorithm == 'crc32' else None
+        }
+
+    @classmethod
+    def from_state(cls, state: Optional[Dict], algorithm: str) -> Optional['RunningDigest']:
+        """从检查点状态恢复，状态不可用时返回None"""
+        if not state or state.get('algorithm') != algorithm or state.get('crc') is None:
+            return None
+        hasher = CRC32Hasher()
+        hasher.value = state['crc']
+        return cls(algorithm, hasher, state['offset'])
+
+
+def file_digest(context, path: str, length: int, algorithm: str,
+                report_interval: int = 256 * 1024 * 1024) -> str:
+    """计算本地文件前length字节的摘要（可通过调度器的run_stage在子进程中执行）
+
+    每计算report_interval字节通过context上报一次，写入检查点的hashed_bytes。
+    """
+    hasher = new_hasher(algorithm)
+    done = 0
+    while done < length:
+        chunk = min(report_interval, length - done)
+        hash_file(path, chunk, hasher, offset=done)
+        done += chunk
+        context.report(checkpoint_data={'hashed_bytes': done})
+    return hasher.hexdigest()
+
+
+def parse_hash_reply(reply: str, algorithm: str) -> Optional[str]:
+    """从HASH或X命令的响应中取出摘要
+
+    HASH响应形如 "213 SHA-256 0-49 <摘要> <文件名>"，X命令响应形如 "250 <摘要>"（可能附带文件名）。
+    只取摘要所在的字段，长度必须与算法的摘要长度一致，避免把文件名等字段当作摘要。
+    """
+    tokens = reply.split()
+    if len(tokens) >= 4 and tokens[1].upper() == HASH_ALGORITHMS[algorithm][0]:
+        field = tokens[3]
+    elif len(tokens) >= 2:
+        field = tokens[1]
+    else:
+        return None
+    if len(field) != DIGEST_LENGTHS[algorithm] or not HEX_PATTERN.match(field):
+        return None
+    return field.lower()
+
+
+def sample_ranges(start: int, end: int, count: int, size: int) -> List[Tuple[int, int]]:
+    """在 [start, end) 中均匀选取count个抽样范围 [(偏移, 长度)]，包含开头和结尾"""
+    length = end - start
+    if length <= 0:
+        return []
+    if length <= count * size:
+        # 范围较小时整段比对
+        return [(start, length)]
+
+    step = (length - size) / (count - 1) if count > 1 else 0
+    return [(start + int(step * i), size) for i in range(count)]
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程池执行器 - 在独立进程中执行计算密集的任务阶段（如摘要计算），避免占用Web服务所在进程的GIL
+"""
+
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+# 子进程中的进度队列（由进程池初始化函数设置）
+_progress_queue = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+class StageContext:
+    """任务阶段的执行上下文 - 提供与调度器相同的进度更新和让出接口
+
+    在子进程中进度通过队列发回主进程；在主进程中直接调用调度器。
+    子进程中的should_yield按时间片截止时间判断，暂停、取消等主动抢占不会传递到子进程。
+    """
+
+    def __init__(self, task_id: str, deadline: Optional[float] = None, scheduler=None):
+        self.task_id = task_id
+        self.deadline = deadline
+        self.scheduler = scheduler
+
+    def report(self, progress: Optional[float] = None, checkpoint_data: Optional[Dict] = None):
+        """更新任务进度（progress为None时只更新检查点）"""
+        self.update_task_progress(self.task_id, progress, checkpoint_data)
+
+    def update_task_progress(self, task_id: str, progress: Optional[float], checkpoint_data: Dict = None):
+        if self.scheduler is not None:
+            self.scheduler.update_task_progress(task_id, progress, checkpoint_data)
+        elif _progress_queue is not None:
+            _progress_queue.put((task_id, progress, checkpoint_data))
+
+    def should_yield(self, task_id: Optional[str] = None) -> bool:
+        if self.scheduler is not None:
+            return self.scheduler.should_yield(task_id or self.task_id)
+        return self.deadline is not None and time.time() >= self.deadline
+
+
+def _run_stage(func, task_id: str, deadline: Optional[float], args, kwargs):
+    """子进程入口：执行阶段函数 func(context, *args, **kwargs)"""
+    return func(StageContext(task_id, deadline), *args, **kwargs)
+
+
+def _run_task(func, task_id: str, timeout: float, args, kwargs):
+    """子进程入口：执行注册的任务函数 func(task_id, timeout, context, *args, **kwargs)"""
+    return func(task_id, timeout, StageContext(task_id, time.time() + timeout), *args, **kwargs)
+
+
+class ProcessStageExecutor:
+    """进程池执行器 - 函数及参数需可序列化（模块级函数，参数为基本类型、列表和字典）"""
+
+    def __init__(self, max_processes: int = 2):
+        self.max_processes = max_processes
+        # Web服务进程包含多个线程，使用spawn启动子进程避免fork时复制锁状态
+        self.context = multiprocessing.get_context('spawn')
+        self.progress_queue = self.context.Queue()
+        self.executor = None
+        self.lock = threading.Lock()
+        self.listener = None
+        self.progress_handler = None
+        self.running = False
+
+        # 统计信息
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_processes,
+                    mp_context=self.context,
+                    initializer=_init_worker,
+                    initargs=(self.progress_queue,)
+                )
+            return self.executor
+
+    def start(self, progress_handler: Callable[[str, Optional[float], Optional[Dict]], None]):
+        """启动进度监听线程，子进程上报的进度交给progress_handler(task_id, progress, checkpoint_data)处理"""
+        if self.running:
+            return
+        self.progress_handler = progress_handler
+        self.running = True
+        self.listener = threading.Thread(target=self._listen, name="ProcessStageProgress", daemon=True)
+        self.listener.start()
+        print(f"进程池执行器已启动，最多 {self.max_processes} 个进程")
+
+    def _listen(self):
+        while self.running:
+            try:
+                task_id, progress, checkpoint_data = self.progress_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+            try:
+                self.progress_handler(task_id, progress, checkpoint_data)
+            except Exception as e:
+                print(f"处理子进程进度失败 {task_id}: {e}")
+
+    def _submit(self, entry, *args):
+        self.stats['submitted'] += 1
+        try:
+            future = self._get_executor().submit(entry, *args)
+            result = future.result()
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不可再用，下次提交时重新创建
+            with self.lock:
+                self.executor = None
+            self.stats['failed'] += 1
+            raise Exception("执行进程异常退出")
+        except Exception:
+            self.stats['failed'] += 1
+            raise
+        self.stats['completed'] += 1
+        return result
+
+    def run_stage(self, task_id: str, func, *args, deadline: Optional[float] = None, **kwargs):
+        """在子进程中执行阶段函数并等待结果"""
+        return self._submit(_run_stage, func, task_id, deadline, args, kwargs)
+
+    def run_task(self, func, task_id: str, timeout: float, args, kwargs):
+        """在子进程中执行注册的任务函数并等待结果"""
+        return self._submit(_run_task, func, task_id, timeout, args, kwargs)
+
+    def get_statistics(self) -> Dict:
+        return {'max_processes': self.max_processes, **self.stats}
+
+    def shutdown(self):
+        """停止监听线程并关闭进程池"""
+        self.running = False
+        if self.listener:
+            self.listener.join(timeout=2)
+            self.listener = None
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+传输限速 - 全局、站点、任务三级令牌桶
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """令牌桶 - rate为每秒字节数（0表示不限速），允许预支令牌，由后续消费者等待补足"""
+
+    def __init__(self, rate: float = 0, burst_seconds: float = 1.0):
+        self.burst_seconds = burst_seconds
+        self.rate = max(0, rate or 0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    @property
+    def capacity(self) -> float:
+        """桶容量（最多积累burst_seconds秒的令牌）"""
+        return self.rate * self.burst_seconds
+
+    def set_rate(self, rate: float):
+        self._refill(time.monotonic())
+        self.rate = max(0, rate or 0)
+        # 速率降低时丢弃超出新容量的令牌，已预支的欠额保留
+        self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, nbytes: int, now: float) -> float:
+        """取走nbytes个令牌，返回需要等待的秒数"""
+        if self.rate == 0:
+            return 0.0
+        self._refill(now)
+        self.tokens -= nbytes
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class HierarchicalRateLimiter:
+    """三级限速器 - 每次传输的数据同时计入全局、所属站点和所属任务的令牌桶，按最慢的一级等待
+
+    站点限速可来自站点配置的rate_limit（每秒字节数），通过set_site_limit设置后以运行时设置为准。
+    """
+
+    # 每次读写的数据量不超过有效速率的该比例（秒），保证限速平滑且等待期间仍能及时响应抢占
+    chunk_seconds = 0.25
+    min_chunk_size = 4 * 1024
+
+    def __init__(self, global_rate: float = 0, burst_seconds: float = 1.0):
+        self.burst_seconds = burst_seconds
+        self.lock = threading.Lock()
+        self.global_bucket = TokenBucket(global_rate, burst_seconds)
+        self.site_buckets = {}        # {site_id: TokenBucket}
+        self.task_buckets = {}        # {task_id: TokenBucket}
+        self.runtime_sites = set()    # 通过接口设置过限速的站点（不再使用站点配置中的值）
+
+        # 统计信息
+        self.stats = {
+            'throttled_bytes': 0,
+            'throttle_wait_time': 0.0
+        }
+
+    def configure_site(self, site_id, rate: Optional[float]):
+        """按站点配置设置站点限速（运行时设置过的站点保持不变）"""
+        if site_id is None:
+            return
+        site_id = str(site_id)
+        with self.lock:
+            if site_id in self.runtime_sites:
+                return
+            self._set_bucket(self.site_buckets, site_id, rate)
+
+    def set_global_limit(self, rate: float):
+        with self.lock:
+            self.global_bucket.set_rate(rate)
+
+    def set_site_limit(self, site_id, rate: float):
+        site_id = str(site_id)
+        with self.lock:
+            self.runtime_sites.add(site_id)
+            self._set_bucket(self.site_buckets, site_id, rate)
+
+    def set_task_limit(self, task_id: str, rate: float):
+        with self.lock:
+            self._set_bucket(self.task_buckets, task_id, rate)
+
+    def remove_task(self, task_id: str):
+        """任务结束时移除其令牌桶"""
+        with self.lock:
+            self.task_buckets.pop(task_id, None)
+
+    def _set_bucket(self, buckets: Dict, key: str, rate: Optional[float]):
+        if not rate or rate <= 0:
+            buckets.pop(key, None)
+        elif key in buckets:
+            buckets[key].set_rate(rate)
+        else:
+            buckets[key] = TokenBucket(rate, self.burst_seconds)
+
+    def _buckets(self, site_id, task_id):
+        buckets = [self.global_bucket]
+        if site_id is not None and str(site_id) in self.site_buckets:
+            buckets.append(self.site_buckets[str(site_id)])
+        if task_id is not None and task_id in self.task_buckets:
+            buckets.append(self.task_buckets[task_id])
+        return buckets
+
+    def get_effective_rate(self, site_id=None, task_id=None) -> Optional[float]:
+        """获取任务可用的最大速率（每秒字节数），不限速时返回None"""
+        with self.lock:
+            rates = [bucket.rate for bucket in self._buckets(site_id, task_id) if bucket.rate > 0]
+        return min(rates) if rates else None
+
+    def chunk_size(self, site_id, task_id, max_size: int) -> int:
+        """计算单次读写的数据量"""
+        rate = self.get_effective_rate(site_id, task_id)
+        if rate is None:
+            return max_size
+        return max(self.min_chunk_size, min(max_size, int(rate * self.chunk_seconds)))
+
+    def consume(self, nbytes: int, site_id=None, task_id=None):
+        """传输nbytes字节后调用，超过任一级限速时休眠到令牌补足"""
+        if nbytes <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = 0.0
+            for bucket in self._buckets(site_id, task_id):
+                wait = max(wait, bucket.reserve(nbytes, now))
+            if wait > 0:
+                self.stats['throttled_bytes'] += nbytes
+                self.stats['throttle_wait_time'] += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def get_limits(self) -> Dict:
+        """获取当前限速配置和统计信息"""
+        with self.lock:
+            return {
+                'global': self.global_bucket.rate,
+                'sites': {site_id: bucket.rate for site_id, bucket in self.site_buckets.items()},
+                'tasks': {task_id: bucket.rate for task_id, bucket in self.task_buckets.items()},
+                'stats': dict(self.stats)
+            }
@@ -4,13 +4,20 @@
 动态时间片调度器
 """
 
+import heapq
+import itertools
+import random
 import threading
 import time
 import json
+from collections import deque
 from datetime import datetime, timedelta
 from enum import Enum
 from typing import Dict, List, Optional, Any
 
+from app.core.connection_pool import PoolExhaustedError
+from app.core.process_executor import StageContext
+
 class TaskPriority(Enum):
     HIGH = "high"
     MEDIUM = "medium"
@@ -26,19 +33,54 @@ class TaskStatus(Enum):
 class DynamicTimeSliceScheduler:
     """动态时间片调度器 - 实现全局序列轮转和动态时间片计算"""
     
-    def __init__(self, max_workers=3, data_manager=None):
+    def __init__(self, max_workers=3, data_manager=None, preemption_grace_period=10.0,
+                 rate_limiter=None, throughput_model=None, slice_overhead_ratio=0.05,
+                 max_tasks_per_site=2, worker_mode='fixed', min_workers=1,
+                 worker_idle_timeout=60.0, scale_interval=5.0, scale_up_min_gain=0.1,
+                 process_executor=None, default_monitor_interval=300, reschedule_jitter=0.1,
+                 restore_spread=60.0, pool_retry_delay=5.0):
         self.max_workers = max_workers
+        self.pool_retry_delay = pool_retry_delay  # 站点连接数已满时任务延后重新执行的时间（秒）
+        self.process_executor = process_executor  # 进程池执行器，为None时计算阶段在工作线程中执行
+        
+        # 持续任务（文件夹监控）的重新调度
+        self.default_monitor_interval = default_monitor_interval
+        self.reschedule_jitter = reschedule_jitter  # 重新调度间隔的随机浮动比例，避免大量监控同时到期
+        self.restore_spread = restore_spread        # 重启后已到期的持续任务在该时间（秒）内随机分散执行
         self.data_manager = data_manager
+        self.rate_limiter = rate_limiter  # 传输限速器，用于按有效速率计算时间片
+        self.throughput_model = throughput_model  # 吞吐模型，样本充足时按学习到的速率计算时间片
+        self.slice_overhead_ratio = slice_overhead_ratio  # 重新建立连接的耗时占时间片的最大比例
+        self.preemption_grace_period = preemption_grace_period  # 时间片结束后等待任务主动让出的宽限期（秒）
         
-        # 全局任务序列
-        self.task_sequence = []
-        self.sequence_pointer = 0
+        # 任务索引与运行队列
+        self.task_index = {}  # {task_id: task_info} 所有未结束的任务
+        # 按优先级划分的就绪队列，每个优先级内按站点分队 {priority: {site_id: deque}}
+        self.ready_queues = {priority: {} for priority in TaskPriority}
+        # 有就绪任务的站点轮转顺序，同一优先级内各站点轮流出队
+        self.site_rotation = {priority: deque() for priority in TaskPriority}
+        self.delayed_tasks = []  # 延迟任务最小堆 [(执行时间戳, 序号, task_id, 入队代号)]
+        self.queue_generation = {}  # {task_id: 入队代号} 用于惰性删除队列中的失效条目
+        self.queue_counter = itertools.count()
         self.sequence_lock = threading.RLock()
+        self.task_available = threading.Condition(self.sequence_lock)  # 有任务可执行时唤醒工作线程
         
         # 运行中的任务
         self.running_tasks = {}  # {thread_id: task_info}
         self.task_lock = threading.RLock()
         
+        # 站点准入控制：限制每个站点同时执行的任务数（未关联站点的任务不受限制）
+        self.max_tasks_per_site = max_tasks_per_site
+        self.site_task_limits = {}  # {site_id: 最大任务数} 站点单独设置的上限
+        self.site_running = {}      # {site_id: 正在执行（含孤儿执行）的任务数}
+        self.admissions = {}        # {task_id: (site_id, 准入序号)}
+        self.admission_counter = itertools.count()
+        self.save_revision = itertools.count()  # 任务副本的版本号（见_snapshot_task）
+        
+        # 协作式抢占
+        self.preemption_events = {}  # {task_id: Event} 当前执行的让出信号
+        self.orphaned_executions = {}  # {task_id: {...}} 宽限期后仍未退出的执行线程
+        
         # 基础时间片配置 (秒)
         self.base_time_slices = {
             TaskPriority.HIGH: 120,    # 2分钟
@@ -60,10 +102,25 @@ class DynamicTimeSliceScheduler:
         
         # 注册的任务函数
         self.registered_functions = {}
+        self.process_functions = set()  # 在子进程中执行的任务函数名
         
-        # 工作线程
+        # 工作线程（fixed模式保持max_workers个线程；elastic模式在min_workers~max_workers之间伸缩）
         self.workers = []
         self.running = False
+        self.worker_mode = worker_mode
+        self.min_workers = min(min_workers, max_workers)
+        self.target_workers = max_workers if worker_mode == 'fixed' else self.min_workers
+        self.worker_counter = itertools.count(1)
+        self.idle_workers = 0               # 正在等待任务的工作线程数
+        self.worker_idle_timeout = worker_idle_timeout
+        self.scale_interval = scale_interval
+        self.scale_up_min_gain = scale_up_min_gain
+        self.scaler_thread = None
+        self.slice_start_bytes = {}         # {thread_id: 本时间片开始时任务已传输的字节数}
+        self.pool_throughput = None         # 全部工作线程的合计传输速率（字节/秒，EWMA）
+        self.scale_baseline = None          # 最近一次扩容前的 (线程数, 合计速率, 扩容时间)
+        self.saturated_workers = None       # 扩容后速率不再上升时的线程数，冷却期内不再超过该数量
+        self.saturated_until = 0.0
         
         # 统计信息
         self.stats = {
@@ -72,25 +129,53 @@ class DynamicTimeSliceScheduler:
             'failed_tasks': 0,
             'total_switches': 0,
             'total_execution_time': 0,
-            'total_switch_overhead': 0
+            'total_switch_overhead': 0,
+            'preempted_executions': 0,
+            'orphaned_executions': 0,
+            'recovered_orphans': 0,
+            'transferred_bytes': 0,
+            'workers_started': 0,
+            'workers_retired': 0
         }
         
         print("动态时间片调度器初始化完成")
     
-    def register_function(self, name: str, func):
-        """注册可执行的任务函数"""
+    def register_function(self, name: str, func, out_of_process: bool = False):
+        """注册可执行的任务函数
+
+        out_of_process为True且配置了进程池时，函数在子进程中执行（需为模块级函数），
+        第三个参数为只支持update_task_progress和should_yield的执行上下文。
+        """
         self.registered_functions[name] = func
-        print(f"注册任务函数: {name}")
+        if out_of_process:
+            self.process_functions.add(name)
+        else:
+            self.process_functions.discard(name)
+        print(f"注册任务函数: {name}" + ("（子进程执行）" if out_of_process else ""))
+
+    def run_stage(self, task_id: str, func, *args, **kwargs):
+        """执行任务中计算密集的阶段 func(context, *args, **kwargs)
+
+        配置了进程池时在子进程中执行，进度经队列回到update_task_progress；否则在当前线程中执行。
+        """
+        if self.process_executor:
+            return self.process_executor.run_stage(task_id, func, *args, **kwargs)
+        return func(StageContext(task_id, scheduler=self), *args, **kwargs)
     
     def calculate_time_slice(self, priority: TaskPriority, task_type: str, 
-                           file_size: Optional[int] = None) -> float:
-        """动态计算时间片"""
+                           file_size: Optional[int] = None,
+                           effective_rate: Optional[float] = None) -> float:
+        """动态计算时间片（effective_rate为限速后的最大传输速率，字节/秒）"""
         base_slice = self.base_time_slices[priority]
         type_multiplier = self.task_type_multipliers.get(task_type, 1.0)
         
         # 根据文件大小调整
         size_multiplier = 1.0
-        if file_size:
+        if file_size and effective_rate:
+            # 限速时按预计传输时间调整，倍数范围与按大小调整相同
+            estimated_time = file_size / effective_rate
+            size_multiplier = max(0.5, min(3.0, estimated_time / (base_slice * type_multiplier)))
+        elif file_size:
             file_size_mb = file_size / (1024 * 1024)
             if file_size_mb > 500:      # >500MB
                 size_multiplier = 3.0
@@ -105,12 +190,105 @@ class DynamicTimeSliceScheduler:
         
         # 设置最小和最大限制
         return max(10.0, min(600.0, final_slice))  # 10秒-10分钟之间
+
+    def calculate_learned_time_slice(self, task: Dict) -> Optional[float]:
+        """根据吞吐模型计算时间片，样本不足时返回None（使用calculate_time_slice）
+
+        时间片取预计剩余执行时间，下限保证建立连接的耗时不超过时间片的slice_overhead_ratio，
+        上限与固定倍数计算的最大值相同（基础时间片×类型倍数×3），保证各优先级之间的公平性。
+        """
+        base_slice = self.base_time_slices[task['priority']]
+        type_multiplier = self.task_type_multipliers.get(task['task_type'], 1.0)
+        max_slice = min(600.0, base_slice * type_multiplier * 3.0)
+
+        setup_time = self.throughput_model.get_setup_time(task.get('site_id')) or 0.0
+        min_slice = max(10.0, setup_time / self.slice_overhead_ratio)
+
+        remaining = self._remaining_bytes(task)
+        if remaining is not None:
+            throughput = self.throughput_model.get_site_throughput(task.get('site_id'))
+            if not throughput:
+                return None
+            # 限速低于学习到的速率时按限速估算
+            effective_rate = self._effective_rate(task)
+            if effective_rate:
+                throughput = min(throughput, effective_rate)
+            estimated_time = remaining / throughput
+        else:
+            # 大小未知的任务（如文件夹）按同类任务的平均完成耗时估算
+            completion_time = self.throughput_model.get_completion_time(task['task_type'])
+            if completion_time is None:
+                return None
+            estimated_time = completion_time - task.get('total_execution_time', 0)
+
+        # 留出10%的余量，避免差一点完成时被切换
+        return min(max_slice, max(min_slice, estimated_time * 1.1))
+
+    def _transferred_bytes(self, task: Dict) -> int:
+        """从检查点读取任务已传输的字节数"""
+        checkpoint = task.get('checkpoint_data') or {}
+        for key in ('downloaded_bytes', 'uploaded_bytes', 'transferred_bytes'):
+            if checkpoint.get(key) is not None:
+                return checkpoint[key]
+        return 0
+
+    def _remaining_bytes(self, task: Dict) -> Optional[int]:
+        """任务剩余待传输的字节数，大小未知时返回None"""
+        total = (task.get('checkpoint_data') or {}).get('total_bytes') or task.get('file_size')
+        if not total:
+            return None
+        return max(0, total - self._transferred_bytes(task))
+
+    def _effective_rate(self, task: Dict) -> Optional[float]:
+        """获取任务当前的有效传输速率（未限速时为None）"""
+        if not self.rate_limiter:
+            return None
+        return self.rate_limiter.get_effective_rate(task.get('site_id'), task['id'])
+
+    def _update_time_slice(self, task: Dict):
+        """计算任务的时间片，吞吐模型样本不足时按固定倍数计算"""
+        time_slice = self.calculate_learned_time_slice(task) if self.throughput_model else None
+        task['time_slice_source'] = 'learned' if time_slice is not None else 'static'
+        if time_slice is None:
+            time_slice = self.calculate_time_slice(
+                task['priority'],
+                task['task_type'],
+                task.get('file_size'),
+                self._effective_rate(task)
+            )
+        task['time_slice'] = time_slice
+
+    def refresh_time_slices(self) -> int:
+        """限速调整后重新计算未结束任务的时间片（执行中的任务在下个时间片生效）"""
+        with self.sequence_lock:
+            for task in self.task_index.values():
+                self._update_time_slice(task)
+            return len(self.task_index)
+
+    def set_task_rate_limit(self, task_id: str, rate: Optional[float]) -> bool:
+        """设置任务的限速（字节/秒，0或None表示不限速）"""
+        if not self.rate_limiter:
+            return False
+        with self.sequence_lock:
+            task = self.task_index.get(task_id)
+            if not task:
+                return False
+            task['rate_limit'] = rate or None
+            self.rate_limiter.set_task_limit(task_id, rate)
+            self._update_time_slice(task)
+            snapshot = self._snapshot_task(task)
+        self._persist_task(snapshot)
+        return True
     
     def add_task(self, task_data: Dict) -> str:
         """添加任务到调度器"""
         with self.sequence_lock:
-            # 生成任务ID
-            task_id = f"task_{int(time.time() * 1000)}"
+            # 生成任务ID（同一毫秒内提交的任务顺延，避免覆盖索引）
+            timestamp_ms = int(time.time() * 1000)
+            task_id = f"task_{timestamp_ms}"
+            while task_id in self.task_index:
+                timestamp_ms += 1
+                task_id = f"task_{timestamp_ms}"
             
             # 完善任务信息
             task_info = {
@@ -135,110 +313,271 @@ class DynamicTimeSliceScheduler:
                 'created_by': task_data.get('created_by', 'system')
             }
             
+            # 站点、路径和监控间隔供限速、重新调度和页面展示使用
+            for key in ('site_id', 'site_name', 'remote_path', 'local_path', 'monitor_interval'):
+                if key in task_data:
+                    task_info[key] = task_data[key]
+            
             # 计算时间片
-            task_info['time_slice'] = self.calculate_time_slice(
-                task_info['priority'],
-                task_info['task_type'],
-                task_info['file_size']
-            )
+            self._update_time_slice(task_info)
             
-            # 插入到序列中的正确位置 (按优先级排序)
-            self._insert_task_by_priority(task_info)
-            
-            # 保存到持久化存储
-            if self.data_manager:
-                self.data_manager.save_task(task_info)
+            # 加入索引和对应优先级的就绪队列
+            self.task_index[task_id] = task_info
+            self._enqueue_task(task_info)
+            snapshot = self._snapshot_task(task_info)
             
             self.stats['total_tasks'] += 1
-            
-            print(f"添加任务: {task_id} (优先级: {task_info['priority'].value}, "
-                  f"类型: {task_info['task_type']}, 时间片: {task_info['time_slice']:.1f}秒)")
-            
-            return task_id
-    
-    def _insert_task_by_priority(self, task_info: Dict):
-        """按优先级将任务插入到序列中的正确位置"""
-        priority_order = {
-            TaskPriority.HIGH: 1,
-            TaskPriority.MEDIUM: 2,
-            TaskPriority.LOW: 3
-        }
-        
-        task_priority = priority_order[task_info['priority']]
         
-        # 找到插入位置
-        insert_index = len(self.task_sequence)
-        for i, existing_task in enumerate(self.task_sequence):
-            existing_priority = priority_order[existing_task['priority']]
-            if task_priority < existing_priority:
-                insert_index = i
-                break
+        # 在锁外保存到持久化存储
+        self._persist_task(snapshot)
         
-        self.task_sequence.insert(insert_index, task_info)
+        print(f"添加任务: {task_id} (优先级: {task_info['priority'].value}, "
+              f"类型: {task_info['task_type']}, 时间片: {task_info['time_slice']:.1f}秒)")
         
-        # 调整序列指针
-        if insert_index <= self.sequence_pointer:
-            self.sequence_pointer += 1
+        return task_id
+
+    def _snapshot_task(self, task: Dict) -> tuple:
+        """在持有锁时复制任务数据，返回 (副本, 版本号)，释放锁后由_persist_task保存
+
+        存储写入（transition级别下状态变化会同步写入整个任务文件）不能在锁内进行，否则所有工作线程的
+        出队都要等待写入完成；版本号按复制顺序递增，数据管理器丢弃比已保存版本更旧的副本。
+        """
+        task_copy = task.copy()
+        task_copy['checkpoint_data'] = dict(task.get('checkpoint_data') or {})
+        return task_copy, next(self.save_revision)
+
+    def _persist_task(self, snapshot: Optional[tuple]):
+        """保存_snapshot_task得到的任务副本（调用时不能持有task_lock或sequence_lock）"""
+        if snapshot and self.data_manager:
+            self.data_manager.save_task(snapshot[0], revision=snapshot[1])
     
-    def get_next_task_from_sequence(self) -> Optional[Dict]:
-        """从序列中获取下一个待执行的任务"""
+    def _next_execution_timestamp(self, task_info: Dict) -> Optional[float]:
+        """解析任务的下次执行时间（仅在入队时解析一次）"""
+        next_execution = task_info.get('next_execution')
+        if not next_execution:
+            return None
+        try:
+            return datetime.fromisoformat(next_execution).timestamp()
+        except (TypeError, ValueError):
+            # 时间格式错误，忽略限制
+            return None
+
+    def _enqueue_task(self, task_info: Dict):
+        """将任务放入就绪队列或延迟堆"""
         with self.sequence_lock:
-            if not self.task_sequence:
-                return None
+            task_id = task_info['id']
+            generation = self.queue_generation.get(task_id, 0) + 1
+            self.queue_generation[task_id] = generation
+
+            due_time = self._next_execution_timestamp(task_info)
+            if due_time is not None and due_time > time.time():
+                heapq.heappush(self.delayed_tasks,
+                               (due_time, next(self.queue_counter), task_id, generation))
+                # 新的最早到期任务需要让等待中的工作线程重新计算等待时间
+                if self.delayed_tasks[0][2] == task_id:
+                    self.task_available.notify()
+            else:
+                self._push_ready(task_info, generation)
+                self.task_available.notify()
+
+    def _dequeue_task(self, task_id: str):
+        """使任务在队列中的条目失效（惰性删除，出队时跳过）"""
+        with self.sequence_lock:
+            self.queue_generation.pop(task_id, None)
+
+    def _promote_due_tasks(self, now: float):
+        """将到期的延迟任务移入就绪队列"""
+        while self.delayed_tasks and self.delayed_tasks[0][0] <= now:
+            _, _, task_id, generation = heapq.heappop(self.delayed_tasks)
+            if self.queue_generation.get(task_id) != generation:
+                continue
+            task = self.task_index.get(task_id)
+            if task:
+                self._push_ready(task, generation)
+
+    def _push_ready(self, task: Dict, generation: int):
+        """放入所属优先级中该站点的就绪队列，站点首次有就绪任务时加入轮转"""
+        priority = task['priority']
+        site_id = task.get('site_id')
+        queue = self.ready_queues[priority].get(site_id)
+        if queue is None:
+            queue = self.ready_queues[priority][site_id] = deque()
+            self.site_rotation[priority].append(site_id)
+        queue.append((task['id'], generation))
+
+    def set_site_task_limit(self, site_id, limit: Optional[int]):
+        """设置站点同时执行的最大任务数（None使用默认值）"""
+        with self.sequence_lock:
+            if limit:
+                self.site_task_limits[site_id] = limit
+            else:
+                self.site_task_limits.pop(site_id, None)
+            # 上限提高后被阻塞的任务可能可以执行
+            self.task_available.notify_all()
+
+    def get_site_task_limit(self, site_id) -> int:
+        """站点同时执行的最大任务数（0表示不限制）"""
+        with self.sequence_lock:
+            return self.site_task_limits.get(site_id, self.max_tasks_per_site)
 
-            # 确保指针在有效范围内
-            if self.sequence_pointer >= len(self.task_sequence):
-                self.sequence_pointer = 0
+    def _site_full(self, site_id) -> bool:
+        """站点正在执行的任务数是否已达上限"""
+        if site_id is None:
+            return False
+        limit = self.site_task_limits.get(site_id, self.max_tasks_per_site)
+        return bool(limit) and self.site_running.get(site_id, 0) >= limit
+
+    def _admit(self, task: Dict):
+        """任务出队执行时占用所属站点的执行名额"""
+        site_id = task.get('site_id')
+        if site_id is not None:
+            self.site_running[site_id] = self.site_running.get(site_id, 0) + 1
+        self.admissions[task['id']] = (site_id, next(self.admission_counter))
+
+    def _release_admission(self, task_id: str, admission: Optional[tuple]):
+        """执行线程退出后归还站点名额（只归还本次执行占用的名额）"""
+        with self.sequence_lock:
+            if admission is None or self.admissions.get(task_id) != admission:
+                return
+            del self.admissions[task_id]
+            site_id = admission[0]
+            if site_id in self.site_running:
+                self.site_running[site_id] -= 1
+                if self.site_running[site_id] <= 0:
+                    del self.site_running[site_id]
+            # 唤醒等待该站点名额的工作线程
+            self.task_available.notify()
 
-            # 寻找下一个待执行的任务
-            attempts = 0
+    def get_next_task_from_sequence(self) -> Optional[Dict]:
+        """从运行队列中获取下一个待执行的任务
 
-            while attempts < len(self.task_sequence):
-                # 再次检查指针是否有效
-                if self.sequence_pointer >= len(self.task_sequence):
-                    self.sequence_pointer = 0
+        高优先级优先；同一优先级内各站点轮流出队，站点内按入队顺序轮转。
+        已达到并发上限的站点整体跳过，无需逐个检查其中的任务。
+        """
+        with self.sequence_lock:
+            self._promote_due_tasks(time.time())
+
+            for priority in (TaskPriority.HIGH, TaskPriority.MEDIUM, TaskPriority.LOW):
+                queues = self.ready_queues[priority]
+                rotation = self.site_rotation[priority]
+                for _ in range(len(rotation)):
+                    # 取出轮转队首的站点并移到队尾
+                    site_id = rotation[0]
+                    rotation.rotate(-1)
+                    if self._site_full(site_id):
+                        continue
+
+                    queue = queues[site_id]
+                    task = None
+                    while queue and task is None:
+                        task_id, generation = queue.popleft()
+
+                        # 跳过已失效的条目（任务被暂停、取消或重新入队）
+                        if self.queue_generation.get(task_id) != generation:
+                            continue
+
+                        del self.queue_generation[task_id]
+                        candidate = self.task_index.get(task_id)
+                        if candidate and candidate['status'] == 'pending':
+                            task = candidate
+
+                    if not queue:
+                        # 站点已没有就绪任务，移出轮转（该站点当前位于队尾）
+                        rotation.pop()
+                        del queues[site_id]
+                    if task:
+                        self._admit(task)
+                        return task
 
-                current_task = self.task_sequence[self.sequence_pointer]
+            return None
 
-                # 移动指针到下一个位置 (循环)
-                self.sequence_pointer = (self.sequence_pointer + 1) % len(self.task_sequence)
-                attempts += 1
+    def _next_wakeup_timeout(self) -> Optional[float]:
+        """计算空闲工作线程的等待时间（到最早的延迟任务到期为止，无延迟任务则一直等待）"""
+        if not self.delayed_tasks:
+            return None
+        return max(0.0, self.delayed_tasks[0][0] - time.time())
 
-                # 检查任务是否可以执行
-                if current_task['status'] == 'pending':
-                    # 检查是否有执行时间限制（用于重新调度的任务）
-                    next_execution = current_task.get('next_execution')
-                    if next_execution:
-                        try:
-                            next_time = datetime.fromisoformat(next_execution)
-                            if datetime.now() < next_time:
-                                # 还没到执行时间，跳过这个任务
-                                continue
-                        except:
-                            # 时间格式错误，忽略限制
-                            pass
+    def _wait_for_next_task(self) -> Optional[Dict]:
+        """等待并获取下一个任务
 
-                    return current_task
+        调度器停止、线程数超过目标数量、或elastic模式下空闲超过worker_idle_timeout时返回None，工作线程随即退出。
+        """
+        thread = threading.current_thread()
+        with self.task_available:
+            idle_since = time.time()
+            self.idle_workers += 1
+            try:
+                while self.running:
+                    if self._should_retire(idle_since):
+                        self.workers.remove(thread)
+                        self.stats['workers_retired'] += 1
+                        return None
+
+                    task = self.get_next_task_from_sequence()
+                    if task:
+                        return task
+
+                    timeout = self._next_wakeup_timeout()
+                    if self.worker_mode == 'elastic':
+                        if self.target_workers > self.min_workers:
+                            idle_left = max(0.0, idle_since + self.worker_idle_timeout - time.time())
+                            timeout = idle_left if timeout is None else min(timeout, idle_left)
+                        else:
+                            # 已是最小线程数，不能缩减，重新计算空闲时间（否则超时后会以0超时反复唤醒）
+                            idle_since = time.time()
+                    self.task_available.wait(timeout)
+                return None
+            finally:
+                self.idle_workers -= 1
+
+    def _should_retire(self, idle_since: float) -> bool:
+        """空闲的工作线程是否应退出（需持有task_available）"""
+        if len(self.workers) > self.target_workers:
+            return True
+        if (self.worker_mode == 'elastic' and self.target_workers > self.min_workers
+                and time.time() - idle_since >= self.worker_idle_timeout):
+            # 空闲超时，缩减一个线程
+            self.target_workers -= 1
+            print(f"工作线程空闲超过 {self.worker_idle_timeout} 秒，缩减到 {self.target_workers} 个")
+            return True
+        return False
+
+    def _spawn_worker(self):
+        """启动一个工作线程（需持有task_available）"""
+        worker = threading.Thread(
+            target=self._worker_loop,
+            name=f"TaskWorker-{next(self.worker_counter)}",
+            daemon=True
+        )
+        self.workers.append(worker)
+        self.stats['workers_started'] += 1
+        worker.start()
+
+    def _ensure_workers(self):
+        """补足工作线程到目标数量，多余的线程在空闲时自行退出（需持有task_available）"""
+        alive = [worker for worker in self.workers if worker.is_alive()]
+        self.workers[:] = alive
+        while len(self.workers) < self.target_workers:
+            self._spawn_worker()
+        self.task_available.notify_all()
 
-            return None
-    
     def start_workers(self):
         """启动工作线程"""
         if self.running:
             return
 
-        self.running = True
+        with self.task_available:
+            self.running = True
+            self._ensure_workers()
 
-        for i in range(self.max_workers):
-            worker = threading.Thread(
-                target=self._worker_loop,
-                name=f"TaskWorker-{i+1}",
-                daemon=True
-            )
-            worker.start()
-            self.workers.append(worker)
+        if self.process_executor:
+            self.process_executor.start(self.update_task_progress)
 
-        print(f"启动了 {self.max_workers} 个工作线程")
+        self.scaler_thread = threading.Thread(target=self._scaler_loop, name="WorkerScaler", daemon=True)
+        self.scaler_thread.start()
+
+        print(f"启动了 {len(self.workers)} 个工作线程（{self.worker_mode}模式，"
+              f"范围 {self.min_workers}-{self.max_workers}）")
 
         # 添加调试信息
         import time
@@ -248,15 +587,142 @@ class DynamicTimeSliceScheduler:
     
     def stop_workers(self):
         """停止工作线程"""
-        self.running = False
+        with self.task_available:
+            self.running = False
+            self.task_available.notify_all()
+            workers = list(self.workers)
         
         # 等待所有工作线程结束
-        for worker in self.workers:
+        for worker in workers:
             worker.join(timeout=5)
+        if self.scaler_thread:
+            self.scaler_thread.join(timeout=self.scale_interval + 1)
+            self.scaler_thread = None
+        if self.process_executor:
+            self.process_executor.shutdown()
         
         self.workers.clear()
         print("所有工作线程已停止")
-    
+
+    def configure_workers(self, mode: Optional[str] = None, min_workers: Optional[int] = None,
+                          max_workers: Optional[int] = None) -> Dict:
+        """运行时调整工作线程池（mode为fixed或elastic），返回调整后的状态"""
+        with self.task_available:
+            mode = mode or self.worker_mode
+            min_workers = self.min_workers if min_workers is None else int(min_workers)
+            max_workers = self.max_workers if max_workers is None else int(max_workers)
+            if mode not in ('fixed', 'elastic'):
+                raise ValueError(f"无效的线程池模式: {mode}")
+            if min_workers < 1 or max_workers < min_workers:
+                raise ValueError(f"无效的线程数范围: {min_workers}-{max_workers}")
+
+            self.worker_mode = mode
+            self.min_workers = min_workers
+            self.max_workers = max_workers
+            if mode == 'fixed':
+                self.target_workers = max_workers
+            else:
+                self.target_workers = max(min_workers, min(max_workers, self.target_workers))
+            # 范围变化后重新评估扩容效果
+            self.scale_baseline = None
+            self.saturated_workers = None
+
+            if self.running:
+                self._ensure_workers()
+            print(f"工作线程池调整为 {mode} 模式，范围 {min_workers}-{max_workers}，目标 {self.target_workers} 个")
+
+        return self.get_worker_pool()
+
+    def get_worker_pool(self) -> Dict:
+        """获取工作线程池状态"""
+        with self.task_available:
+            return {
+                'mode': self.worker_mode,
+                'min_workers': self.min_workers,
+                'max_workers': self.max_workers,
+                'target_workers': self.target_workers,
+                'workers': len(self.workers),
+                'idle_workers': self.idle_workers,
+                'busy_workers': len(self.running_tasks),
+                'ready_tasks': self._runnable_task_count(),
+                'throughput': self.pool_throughput,
+                'saturated_workers': self.saturated_workers if time.time() < self.saturated_until else None
+            }
+
+    def _runnable_task_count(self) -> int:
+        """未达到并发上限的站点中排队的任务数（包含尚未清理的失效条目，仅用于估计队列深度）"""
+        with self.sequence_lock:
+            return sum(
+                len(queue)
+                for queues in self.ready_queues.values()
+                for site_id, queue in queues.items()
+                if not self._site_full(site_id)
+            )
+
+    def _measure_transferred_bytes(self) -> int:
+        """累计传输字节数（已结束的时间片加上正在执行的时间片中已传输的部分）"""
+        with self.task_lock:
+            total = self.stats['transferred_bytes']
+            for thread_id, task in self.running_tasks.items():
+                total += max(0, self._transferred_bytes(task) - self.slice_start_bytes.get(thread_id, 0))
+            return total
+
+    def _scaler_loop(self):
+        """定期测量合计传输速率，elastic模式下按队列深度和扩容收益增加工作线程"""
+        last_bytes = self._measure_transferred_bytes()
+        last_time = time.time()
+
+        while self.running:
+            time.sleep(self.scale_interval)
+            now = time.time()
+            current_bytes = self._measure_transferred_bytes()
+            throughput = max(0, current_bytes - last_bytes) / max(now - last_time, 1e-6)
+            last_bytes, last_time = current_bytes, now
+            self.pool_throughput = (
+                throughput if self.pool_throughput is None
+                else self.pool_throughput + 0.5 * (throughput - self.pool_throughput)
+            )
+
+            if self.worker_mode != 'elastic':
+                continue
+            try:
+                self._autoscale(now)
+            except Exception as e:
+                print(f"调整工作线程数失败: {e}")
+
+    def _autoscale(self, now: float):
+        """队列中的可执行任务多于空闲线程时扩容一个线程
+
+        扩容后等待一段时间测量效果：合计速率的增幅低于scale_up_min_gain说明传输已不再受限于并发
+        （带宽或服务器已饱和），在冷却期内不再超过当前线程数。缩容由空闲线程超时自行完成。
+        """
+        with self.task_available:
+            if not self.running or self.target_workers >= self.max_workers:
+                return
+            if self._runnable_task_count() <= self.idle_workers:
+                return
+
+            baseline = self.scale_baseline
+            settle_time = self.scale_interval * 3
+            if baseline:
+                workers, baseline_throughput, scaled_at = baseline
+                if now - scaled_at < settle_time:
+                    return
+                if (baseline_throughput > 0 and self.target_workers > workers
+                        and self.pool_throughput < baseline_throughput * (1 + self.scale_up_min_gain)):
+                    self.saturated_workers = self.target_workers
+                    self.saturated_until = now + settle_time * 20
+                    self.scale_baseline = None
+                    print(f"增加到 {self.target_workers} 个工作线程后传输速率未明显上升，暂停扩容")
+                    return
+            if now < self.saturated_until and self.target_workers >= self.saturated_workers:
+                return
+
+            self.scale_baseline = (self.target_workers, self.pool_throughput or 0, now)
+            self.target_workers += 1
+            self._ensure_workers()
+            print(f"就绪任务积压，工作线程增加到 {self.target_workers} 个")
+
     def _worker_loop(self):
         """工作线程主循环"""
         thread_id = threading.current_thread().name
@@ -264,15 +730,13 @@ class DynamicTimeSliceScheduler:
 
         while self.running:
             try:
-                # 获取下一个任务
-                task = self.get_next_task_from_sequence()
+                # 等待下一个任务（由add_task/resume_task/重新调度唤醒，延迟任务到期时超时唤醒）
+                task = self._wait_for_next_task()
+                if not task:
+                    break
 
-                if task:
-                    print(f"工作线程 {thread_id} 获取到任务: {task['id']}")
-                    self._execute_task_with_timeslice(thread_id, task)
-                else:
-                    # 没有任务，休眠一下
-                    time.sleep(1.0)
+                print(f"工作线程 {thread_id} 获取到任务: {task['id']}")
+                self._execute_task_with_timeslice(thread_id, task)
             except Exception as e:
                 print(f"工作线程 {thread_id} 发生错误: {e}")
                 import traceback
@@ -289,20 +753,24 @@ class DynamicTimeSliceScheduler:
         # 记录开始执行
         with self.task_lock:
             self.running_tasks[thread_id] = task
+            self.slice_start_bytes[thread_id] = self._transferred_bytes(task)
             task['status'] = 'running'
             task['started_at'] = datetime.now().isoformat()
             task['execution_count'] += 1
             task['current_worker'] = thread_id
+            snapshot = self._snapshot_task(task)
         
         # 保存状态
-        if self.data_manager:
-            self.data_manager.save_task(task)
+        self._persist_task(snapshot)
         
         print(f"[{datetime.now().strftime('%H:%M:%S')}] {thread_id} 开始执行任务 {task_id} "
               f"(优先级: {task['priority'].value}, 时间片: {time_slice:.1f}秒, "
               f"第{task['execution_count']}次执行)")
         
         start_time = time.time()
+        start_bytes = self._transferred_bytes(task)
+        admission = self.admissions.get(task_id)
+        result = None
         
         try:
             # 获取任务函数
@@ -310,6 +778,8 @@ class DynamicTimeSliceScheduler:
             func = self.registered_functions.get(func_name)
             if not func:
                 raise ValueError(f"未注册的函数: {func_name}")
+            if func_name in self.process_functions and self.process_executor:
+                func = self._process_task_runner(func)
             
             # 执行任务
             result = self._execute_with_timeout(
@@ -320,16 +790,40 @@ class DynamicTimeSliceScheduler:
             execution_time = time.time() - start_time
             task['total_execution_time'] += execution_time
             
+            # 记录本时间片的传输速率（孤儿执行仍在传输，不计入）
+            if self.throughput_model and result != "ORPHANED":
+                self.throughput_model.record_transfer(
+                    task.get('site_id'), self._transferred_bytes(task) - start_bytes, execution_time
+                )
+            
             with self.task_lock:
-                if result == "TIMEOUT":
+                if task_id not in self.task_index:
+                    # 执行期间任务已被取消或删除，保留其最终状态
+                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {thread_id} 任务 {task_id} "
+                          f"已在执行期间被取消({execution_time:.1f}s)")
+
+                elif result == "ORPHANED":
+                    # 执行线程在宽限期内未让出，保持运行状态，待线程退出后再重新排队
+                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {thread_id} 任务 {task_id} "
+                          f"宽限期内未响应抢占，等待执行线程退出后重新排队")
+                    self.stats['total_switches'] += 1
+
+                elif result == "TIMEOUT":
                     # 时间片用完，任务未完成
                     print(f"[{datetime.now().strftime('%H:%M:%S')}] {thread_id} 任务 {task_id} "
                           f"时间片用完({execution_time:.1f}s)，重新排队")
 
-                    task['status'] = 'pending'
                     self.stats['total_switches'] += 1
                     self.stats['total_switch_overhead'] += 0.1  # 估算切换开销
 
+                    # 按剩余数据量重新计算时间片
+                    self._update_time_slice(task)
+
+                    # 执行期间被暂停的任务保持暂停，否则排到同优先级队尾
+                    if task['status'] != 'paused':
+                        task['status'] = 'pending'
+                        self._enqueue_task(task)
+
                 else:
                     # 检查是否需要重新调度（用于持续任务如文件夹监控）
                     if isinstance(result, str) and result.startswith("RESCHEDULE:"):
@@ -338,16 +832,18 @@ class DynamicTimeSliceScheduler:
                         print(f"[{datetime.now().strftime('%H:%M:%S')}] {thread_id} 任务 {task_id} "
                               f"执行完成，等待重新调度({execution_time:.1f}s): {actual_result}")
 
-                        task['status'] = 'pending'  # 重置为等待状态
                         task['result'] = actual_result
                         task['last_execution'] = datetime.now().isoformat()
 
-                        # 获取监控间隔
-                        monitor_interval = task.get('monitor_interval', 300)  # 默认5分钟
+                        # 获取监控间隔（任务函数可通过检查点的next_interval给出自适应间隔），加入随机浮动
+                        monitor_interval = self._reschedule_interval(task)
                         task['next_execution'] = (datetime.now() + timedelta(seconds=monitor_interval)).isoformat()
 
-                        # 不从序列中移除，保持在队列中等待下次执行
-                        print(f"任务 {task_id} 将在 {monitor_interval} 秒后重新执行")
+                        # 放入延迟堆，到期后重新进入就绪队列
+                        if task['status'] != 'paused':
+                            task['status'] = 'pending'  # 重置为等待状态
+                            self._enqueue_task(task)
+                        print(f"任务 {task_id} 将在 {monitor_interval:.0f} 秒后重新执行")
 
                     else:
                         # 任务完成
@@ -359,13 +855,32 @@ class DynamicTimeSliceScheduler:
                         task['result'] = result
                         task['progress'] = 100.0
 
-                        # 从序列中移除已完成的任务
+                        # 从索引中移除已完成的任务
                         self._remove_task_from_sequence(task)
 
                         self.stats['completed_tasks'] += 1
+                        if self.throughput_model:
+                            self.throughput_model.record_completion(
+                                task['task_type'], task['total_execution_time'], task['execution_count']
+                            )
                 
                 self.stats['total_execution_time'] += execution_time
                 
+        except PoolExhaustedError as e:
+            # 站点连接被其他任务占满，不算任务失败，稍后重新排队
+            execution_time = time.time() - start_time
+            task['total_execution_time'] += execution_time
+            
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] {thread_id} 任务 {task_id} "
+                  f"暂时无法获取连接，{self.pool_retry_delay:.0f}秒后重试: {e}")
+            
+            with self.task_lock:
+                if task_id in self.task_index and task['status'] != 'paused':
+                    task['status'] = 'pending'
+                    task['next_execution'] = (datetime.now() + timedelta(seconds=self.pool_retry_delay)).isoformat()
+                    self._enqueue_task(task)
+                self.stats['total_switches'] += 1
+        
         except Exception as e:
             execution_time = time.time() - start_time
             task['total_execution_time'] += execution_time
@@ -378,7 +893,7 @@ class DynamicTimeSliceScheduler:
                 task['error'] = str(e)
                 task['completed_at'] = datetime.now().isoformat()
                 
-                # 从序列中移除失败的任务
+                # 从索引中移除失败的任务
                 self._remove_task_from_sequence(task)
                 
                 self.stats['failed_tasks'] += 1
@@ -388,33 +903,48 @@ class DynamicTimeSliceScheduler:
             with self.task_lock:
                 if thread_id in self.running_tasks:
                     del self.running_tasks[thread_id]
+                # 计入本时间片传输的字节数，用于测量线程池的合计速率
+                self.stats['transferred_bytes'] += max(
+                    0, self._transferred_bytes(task) - self.slice_start_bytes.pop(thread_id, 0)
+                )
+                snapshot = self._snapshot_task(task)
+            
+            # 归还站点执行名额（孤儿执行在其线程退出后归还）
+            if result != "ORPHANED":
+                self._release_admission(task_id, admission)
             
             # 保存最终状态
-            if self.data_manager:
-                self.data_manager.save_task(task)
+            self._persist_task(snapshot)
     
+    def _reschedule_interval(self, task: Dict) -> float:
+        """持续任务下次执行前的等待时间（秒）"""
+        interval = ((task.get('checkpoint_data') or {}).get('next_interval')
+                    or task.get('monitor_interval') or self.default_monitor_interval)
+        return interval * random.uniform(1 - self.reschedule_jitter, 1 + self.reschedule_jitter)
+
+    def _process_task_runner(self, func):
+        """将任务函数包装为在子进程中执行"""
+        def run(task_id, timeout, scheduler, *args, **kwargs):
+            return self.process_executor.run_task(func, task_id, timeout, args, kwargs)
+        return run
+
     def _remove_task_from_sequence(self, task: Dict):
-        """从序列中移除任务"""
+        """从任务索引和运行队列中移除任务"""
         with self.sequence_lock:
-            if task in self.task_sequence:
-                task_index = self.task_sequence.index(task)
-                self.task_sequence.remove(task)
-
-                # 调整序列指针
-                if task_index < self.sequence_pointer:
-                    self.sequence_pointer -= 1
-
-                # 确保指针在有效范围内
-                if self.task_sequence:
-                    if self.sequence_pointer >= len(self.task_sequence):
-                        self.sequence_pointer = 0
-                else:
-                    self.sequence_pointer = 0
+            self.task_index.pop(task['id'], None)
+            self._dequeue_task(task['id'])
+        if self.rate_limiter:
+            self.rate_limiter.remove_task(task['id'])
 
     def _execute_with_timeout(self, func, task_id: str, timeout: float, *args, **kwargs):
-        """带超时的函数执行"""
+        """带超时的函数执行（时间片结束后发出让出信号，宽限期后仍未退出则记为孤儿执行）"""
         result = None
         exception = None
+        preempt_event = threading.Event()
+        exited = threading.Event()  # 执行线程已完成退出清理（在task_lock内设置）
+
+        with self.task_lock:
+            self.preemption_events[task_id] = preempt_event
 
         def target():
             nonlocal result, exception
@@ -423,93 +953,179 @@ class DynamicTimeSliceScheduler:
                 result = func(task_id, timeout, self, *args, **kwargs)
             except Exception as e:
                 exception = e
+            finally:
+                self._on_execution_exit(task_id, preempt_event, exited)
 
-        thread = threading.Thread(target=target)
+        thread = threading.Thread(target=target, name=f"TaskExec-{task_id}")
         thread.daemon = True
         thread.start()
         thread.join(timeout)
 
         if thread.is_alive():
-            # 超时了
-            return "TIMEOUT"
+            # 时间片用完，通知任务在进度回调中主动让出
+            preempt_event.set()
+            thread.join(self.preemption_grace_period)
+
+            with self.task_lock:
+                self.stats['preempted_executions'] += 1
+                # 不能用thread.is_alive()判断：线程完成退出清理后可能仍短暂存活，此时登记的孤儿永远不会被回收
+                if not exited.is_set():
+                    # 宽限期后仍在执行，登记为孤儿执行，禁止任务被再次调度
+                    self.orphaned_executions[task_id] = {
+                        'thread_name': thread.name,
+                        'preempted_at': datetime.now().isoformat(),
+                        'event': preempt_event,
+                        'admission': self.admissions.get(task_id)
+                    }
+                    self.stats['orphaned_executions'] += 1
+                    print(f"任务 {task_id} 的执行线程在 {self.preemption_grace_period} 秒宽限期内未退出，"
+                          f"当前孤儿执行数: {len(self.orphaned_executions)}")
+                    return "ORPHANED"
+
+            if exception:
+                # 抢占导致的传输中断不视为任务失败
+                print(f"任务 {task_id} 在让出过程中中断: {exception}")
+                return "TIMEOUT"
+
+            return result if result is not None else "TIMEOUT"
 
         if exception:
             raise exception
 
         return result
 
-    def update_task_progress(self, task_id: str, progress: float, checkpoint_data: Dict = None):
-        """更新任务进度"""
+    def _on_execution_exit(self, task_id: str, preempt_event: threading.Event, exited: threading.Event):
+        """执行线程退出时清理让出信号并设置exited，孤儿执行退出后将任务重新排队"""
         with self.task_lock:
-            # 在运行中的任务中查找
-            for task in self.running_tasks.values():
-                if task['id'] == task_id:
+            exited.set()
+            if self.preemption_events.get(task_id) is preempt_event:
+                del self.preemption_events[task_id]
+
+            orphan = self.orphaned_executions.get(task_id)
+            if not orphan or orphan['event'] is not preempt_event:
+                return
+
+            del self.orphaned_executions[task_id]
+            self.stats['recovered_orphans'] += 1
+            self._release_admission(task_id, orphan['admission'])
+
+            with self.sequence_lock:
+                task = self.task_index.get(task_id)
+                if not task:
+                    return
+                task['current_worker'] = None
+                if task['status'] == 'running':
+                    task['status'] = 'pending'
+                    self._enqueue_task(task)
+                snapshot = self._snapshot_task(task)
+
+        print(f"任务 {task_id} 的孤儿执行线程已退出，任务重新排队")
+        self._persist_task(snapshot)
+
+    def should_yield(self, task_id: str) -> bool:
+        """任务函数在进度回调或循环中调用，返回True时应尽快保存检查点并返回"""
+        event = self.preemption_events.get(task_id)
+        return event is not None and event.is_set()
+
+    def request_preemption(self, task_id: str) -> bool:
+        """请求正在执行的任务让出（暂停、取消时使用）"""
+        with self.task_lock:
+            event = self.preemption_events.get(task_id)
+            if event:
+                event.set()
+                return True
+            return False
+
+    def get_orphaned_executions(self) -> List[Dict]:
+        """获取孤儿执行列表"""
+        with self.task_lock:
+            return [
+                {'task_id': task_id, 'thread_name': info['thread_name'],
+                 'preempted_at': info['preempted_at']}
+                for task_id, info in self.orphaned_executions.items()
+            ]
+
+    def update_task_progress(self, task_id: str, progress: Optional[float], checkpoint_data: Dict = None):
+        """更新任务进度（progress为None时只更新检查点）"""
+        snapshot = None
+        with self.task_lock, self.sequence_lock:
+            # 在任务索引中查找（包括宽限期内仍在执行的任务）
+            task = self.task_index.get(task_id)
+            if task and task['status'] in ['running', 'paused']:
+                if progress is not None:
                     task['progress'] = progress
-                    if checkpoint_data:
-                        task['checkpoint_data'].update(checkpoint_data)
+                if checkpoint_data:
+                    task['checkpoint_data'].update(checkpoint_data)
+                snapshot = self._snapshot_task(task)
 
-                    # 保存到持久化存储
-                    if self.data_manager:
-                        self.data_manager.save_task(task)
-                    break
+        # 保存到持久化存储
+        self._persist_task(snapshot)
 
     def pause_task(self, task_id: str) -> bool:
         """暂停任务"""
         with self.task_lock, self.sequence_lock:
-            # 查找任务
-            for task in self.task_sequence:
-                if task['id'] == task_id:
-                    if task['status'] in ['pending', 'running']:
-                        task['status'] = 'paused'
-                        if self.data_manager:
-                            self.data_manager.save_task(task)
-                        return True
-            return False
+            task = self.task_index.get(task_id)
+            if task and task['status'] in ['pending', 'running']:
+                if task['status'] == 'running':
+                    self.request_preemption(task_id)
+                task['status'] = 'paused'
+                self._dequeue_task(task_id)
+                snapshot = self._snapshot_task(task)
+            else:
+                return False
+        self._persist_task(snapshot)
+        return True
 
     def resume_task(self, task_id: str) -> bool:
         """恢复任务"""
         with self.task_lock, self.sequence_lock:
-            # 查找任务
-            for task in self.task_sequence:
-                if task['id'] == task_id:
-                    if task['status'] == 'paused':
-                        task['status'] = 'pending'
-                        if self.data_manager:
-                            self.data_manager.save_task(task)
-                        return True
-            return False
+            task = self.task_index.get(task_id)
+            if task and task['status'] == 'paused':
+                task['status'] = 'pending'
+                # 仍在执行的任务由工作线程在时间片结束后重新入队
+                if not self._is_task_running(task_id) and task_id not in self.orphaned_executions:
+                    self._enqueue_task(task)
+                snapshot = self._snapshot_task(task)
+            else:
+                return False
+        self._persist_task(snapshot)
+        return True
 
     def cancel_task(self, task_id: str) -> bool:
         """取消任务"""
         with self.task_lock, self.sequence_lock:
-            # 查找并移除任务
-            for task in self.task_sequence[:]:
-                if task['id'] == task_id:
-                    task['status'] = 'failed'
-                    task['error'] = "用户取消"
-                    task['completed_at'] = datetime.now().isoformat()
-
-                    self._remove_task_from_sequence(task)
+            task = self.task_index.get(task_id)
+            if task:
+                self.request_preemption(task_id)
+                task['status'] = 'failed'
+                task['error'] = "用户取消"
+                task['completed_at'] = datetime.now().isoformat()
 
-                    if self.data_manager:
-                        self.data_manager.save_task(task)
-                    return True
-            return False
+                self._remove_task_from_sequence(task)
+                snapshot = self._snapshot_task(task)
+            else:
+                return False
+        self._persist_task(snapshot)
+        return True
+
+    def _is_task_running(self, task_id: str) -> bool:
+        """检查任务是否正在某个工作线程中执行"""
+        with self.task_lock:
+            return any(task['id'] == task_id for task in self.running_tasks.values())
 
     def delete_task(self, task_id: str) -> bool:
         """删除任务"""
         with self.task_lock, self.sequence_lock:
             # 检查任务是否正在运行
-            if task_id in self.running_tasks:
+            if self._is_task_running(task_id) or task_id in self.orphaned_executions:
                 return False  # 不能删除正在运行的任务
 
-            # 从任务序列中移除
+            # 从任务索引中移除
             found_in_sequence = False
-            for task in self.task_sequence[:]:
-                if task['id'] == task_id:
-                    self.task_sequence.remove(task)
-                    found_in_sequence = True
-                    break
+            task = self.task_index.get(task_id)
+            if task:
+                self._remove_task_from_sequence(task)
+                found_in_sequence = True
 
             # 从数据管理器中删除任务记录
             data_deleted = False
@@ -534,7 +1150,7 @@ class DynamicTimeSliceScheduler:
                     print(f"删除任务时出错: {e}")
                     data_deleted = False
 
-            # 如果在序列中找到或从数据中删除成功，则认为删除成功
+            # 如果在索引中找到或从数据中删除成功，则认为删除成功
             return found_in_sequence or data_deleted
 
     def get_task_status(self, task_id: str) -> Optional[Dict]:
@@ -542,18 +1158,18 @@ class DynamicTimeSliceScheduler:
         task_data = None
 
         # 在运行中的任务中查找
-        for task in self.running_tasks.values():
-            if task['id'] == task_id:
-                task_data = task.copy()
-                break
+        with self.task_lock:
+            for task in self.running_tasks.values():
+                if task['id'] == task_id:
+                    task_data = task.copy()
+                    break
 
-        # 在序列中查找
+        # 在任务索引中查找
         if not task_data:
             with self.sequence_lock:
-                for task in self.task_sequence:
-                    if task['id'] == task_id:
-                        task_data = task.copy()
-                        break
+                task = self.task_index.get(task_id)
+                if task:
+                    task_data = task.copy()
 
         if task_data:
             # 清理数据，确保可以JSON序列化
@@ -566,19 +1182,31 @@ class DynamicTimeSliceScheduler:
 
         return None
 
+    def find_tasks(self, func_name: str, site_id=None) -> List[Dict]:
+        """查找指定任务函数（及站点）的未结束任务，返回任务信息的引用，调用方只读"""
+        with self.sequence_lock:
+            return [
+                task for task in self.task_index.values()
+                if task['func_name'] == func_name and (site_id is None or task.get('site_id') == site_id)
+            ]
+
     def get_all_tasks(self) -> List[Dict]:
         """获取所有任务状态"""
         all_tasks = []
+        seen_ids = set()
 
         # 添加运行中的任务
         with self.task_lock:
-            all_tasks.extend(self.running_tasks.values())
+            for task in self.running_tasks.values():
+                all_tasks.append(task)
+                seen_ids.add(task['id'])
 
-        # 添加序列中的任务
+        # 添加索引中的任务
         with self.sequence_lock:
-            for task in self.task_sequence:
-                if task not in all_tasks:
+            for task_id, task in self.task_index.items():
+                if task_id not in seen_ids:
                     all_tasks.append(task)
+                    seen_ids.add(task_id)
 
         # 添加已保存的历史任务（从数据管理器获取）
         if self.data_manager:
@@ -587,8 +1215,9 @@ class DynamicTimeSliceScheduler:
                 saved_tasks = self.data_manager.get_recent_tasks(limit=100)
                 for saved_task in saved_tasks:
                     # 避免重复添加（检查ID）
-                    if not any(task['id'] == saved_task['id'] for task in all_tasks):
+                    if saved_task['id'] not in seen_ids:
                         all_tasks.append(saved_task)
+                        seen_ids.add(saved_task['id'])
             except Exception as e:
                 print(f"获取历史任务失败: {e}")
 
@@ -612,20 +1241,30 @@ class DynamicTimeSliceScheduler:
         with self.task_lock, self.sequence_lock:
             current_stats = self.stats.copy()
 
-            # 计算等待中的任务数量（处理枚举类型）
-            pending_count = 0
-            for task in self.task_sequence:
-                task_status = task.get('status')
-                if hasattr(task_status, 'value'):
-                    task_status = task_status.value
-                if task_status == 'pending':
-                    pending_count += 1
+            # 队列中的有效条目即为等待中的任务
+            pending_count = len(self.queue_generation)
+            delayed_count = sum(
+                1 for _, _, task_id, generation in self.delayed_tasks
+                if self.queue_generation.get(task_id) == generation
+            )
 
             current_stats.update({
                 'running_tasks': len(self.running_tasks),
                 'pending_tasks': pending_count,
-                'total_tasks_in_sequence': len(self.task_sequence),
-                'current_sequence_pointer': self.sequence_pointer,
+                'ready_tasks': pending_count - delayed_count,
+                'delayed_tasks': delayed_count,
+                'total_tasks_in_sequence': len(self.task_index),
+                'active_orphaned_executions': len(self.orphaned_executions),
+                'site_running_tasks': dict(self.site_running),
+                'worker_pool': self.get_worker_pool(),
+                'process_pool': self.process_executor.get_statistics() if self.process_executor else None,
+                'blocked_sites': [
+                    site_id for site_id in self.site_running
+                    if self._site_full(site_id) and any(
+                        site_id in queues for queues in self.ready_queues.values()
+                    )
+                ],
+                'throughput_model': self.throughput_model.get_statistics() if self.throughput_model else None,
                 'efficiency': (
                     (current_stats['total_execution_time'] /
                      (current_stats['total_execution_time'] + current_stats['total_switch_overhead']) * 100)
@@ -654,8 +1293,27 @@ class DynamicTimeSliceScheduler:
                     if isinstance(task_data.get('priority'), str):
                         task_data['priority'] = TaskPriority(task_data['priority'])
 
-                    # 插入到序列中
-                    self._insert_task_by_priority(task_data)
+                    # 恢复任务限速
+                    task_data.setdefault('id', task_id)
+                    if self.rate_limiter and task_data.get('rate_limit'):
+                        self.rate_limiter.set_task_limit(task_data['id'], task_data['rate_limit'])
+
+                    # 按重启前学习到的吞吐重新计算时间片
+                    if 'task_type' in task_data:
+                        self._update_time_slice(task_data)
+
+                    # 已到期的持续任务随机分散执行，避免重启后同时列目录
+                    if task_data.get('monitor_interval') and self.restore_spread > 0:
+                        due_time = self._next_execution_timestamp(task_data)
+                        if due_time is None or due_time <= time.time():
+                            spread = min(self.restore_spread, self._reschedule_interval(task_data))
+                            task_data['next_execution'] = (
+                                datetime.now() + timedelta(seconds=random.uniform(0, spread))
+                            ).isoformat()
+
+                    # 加入索引和运行队列
+                    self.task_index[task_data['id']] = task_data
+                    self._enqueue_task(task_data)
                     restored_count += 1
 
         print(f"恢复了 {restored_count} 个未完成的任务")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+吞吐模型 - 按站点学习传输速率和建立连接耗时，按任务类型学习完成耗时，供调度器计算时间片
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class ThroughputModel:
+    """吞吐模型 - 各项统计使用指数加权移动平均(EWMA)，定期持久化到JSON文件，重启后继续使用"""
+
+    VERSION = 1
+
+    # 过短或数据量过小的时间片（如文件已存在直接跳过）不计入吞吐率
+    min_sample_bytes = 1024 * 1024
+    min_sample_time = 1.0
+
+    def __init__(self, path: Optional[str] = None, alpha: float = 0.3, min_samples: int = 3,
+                 save_interval: float = 60):
+        self.path = path
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self.save_interval = save_interval
+
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # 保证同一时间只有一个线程写文件
+        self.sites = {}       # {site_id: {'bytes_per_sec', 'samples', 'setup_time', 'connections', 'updated_at'}}
+        self.task_types = {}  # {task_type: {'completion_time', 'slices', 'completions', 'updated_at'}}
+        self.dirty = False
+        self.last_save = time.time()
+
+        if path:
+            self.load()
+            atexit.register(self.save)
+
+    def _ewma(self, current: Optional[float], value: float) -> float:
+        return value if current is None else current + self.alpha * (value - current)
+
+    def _site(self, site_id) -> Dict:
+        return self.sites.setdefault(str(site_id), {
+            'bytes_per_sec': None, 'samples': 0,
+            'setup_time': None, 'connections': 0,
+            'updated_at': None
+        })
+
+    def record_transfer(self, site_id, nbytes: int, seconds: float):
+        """记录一个时间片内传输的字节数和耗时"""
+        if site_id is None or nbytes < self.min_sample_bytes or seconds < self.min_sample_time:
+            return
+        with self.lock:
+            site = self._site(site_id)
+            site['bytes_per_sec'] = self._ewma(site['bytes_per_sec'], nbytes / seconds)
+            site['samples'] += 1
+            site['updated_at'] = datetime.now().isoformat()
+            self.dirty = True
+        self._maybe_save()
+
+    def record_connection(self, site_id, seconds: float):
+        """记录建立连接（连接+登录）的耗时"""
+        if site_id is None:
+            return
+        with self.lock:
+            site = self._site(site_id)
+            site['setup_time'] = self._ewma(site['setup_time'], seconds)
+            site['connections'] += 1
+            site['updated_at'] = datetime.now().isoformat()
+            self.dirty = True
+        self._maybe_save()
+
+    def record_completion(self, task_type: str, total_time: float, slices: int):
+        """记录任务完成时的总执行时间和执行次数"""
+        with self.lock:
+            stats = self.task_types.setdefault(task_type, {
+                'completion_time': None, 'slices': None, 'completions': 0, 'updated_at': None
+            })
+            stats['completion_time'] = self._ewma(stats['completion_time'], total_time)
+            stats['slices'] = self._ewma(stats['slices'], slices)
+            stats['completions'] += 1
+            stats['updated_at'] = datetime.now().isoformat()
+            self.dirty = True
+        self._maybe_save()
+
+    def get_site_throughput(self, site_id) -> Optional[float]:
+        """站点的平均传输速率（字节/秒），样本不足时返回None"""
+        with self.lock:
+            site = self.sites.get(str(site_id))
+            if not site or site['samples'] < self.min_samples:
+                return None
+            return site['bytes_per_sec']
+
+    def get_setup_time(self, site_id) -> Optional[float]:
+        """站点建立连接的平均耗时（秒）"""
+        with self.lock:
+            site = self.sites.get(str(site_id))
+            return site['setup_time'] if site else None
+
+    def get_completion_time(self, task_type: str) -> Optional[float]:
+        """该类型任务完成所需的平均执行时间（秒），样本不足时返回None"""
+        with self.lock:
+            stats = self.task_types.get(task_type)
+            if not stats or stats['completions'] < self.min_samples:
+                return None
+            return stats['completion_time']
+
+    def get_statistics(self) -> Dict:
+        with self.lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> Dict:
+        return {
+            'sites': {site_id: dict(site) for site_id, site in self.sites.items()},
+            'task_types': {task_type: dict(stats) for task_type, stats in self.task_types.items()}
+        }
+
+    def load(self):
+        """从文件加载学习到的统计"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"加载吞吐模型失败 {self.path}: {e}")
+            return
+
+        if data.get('version') != self.VERSION:
+            return
+        with self.lock:
+            self.sites = data.get('sites', {})
+            self.task_types = data.get('task_types', {})
+        print(f"加载吞吐模型: {len(self.sites)} 个站点，{len(self.task_types)} 种任务类型")
+
+    def _maybe_save(self):
+        if self.path and time.time() - self.last_save >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """有新的统计时写入文件（临时文件+重命名）"""
+        if not self.path:
+            return
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                data = {'version': self.VERSION, **self._snapshot()}
+                self.dirty = False
+                self.last_save = time.time()
+
+            temp_file = f"{self.path}.tmp"
+            try:
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False)
+                os.replace(temp_file, self.path)
+            except OSError as e:
+                print(f"保存吞吐模型失败 {self.path}: {e}")
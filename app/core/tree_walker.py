@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+远程目录树遍历 - 基于MLSD（回退LIST）的迭代遍历，可使用多个连接池会话并行列目录
+"""
+
+import ftplib
+import threading
+from collections import deque
+from typing import Callable, Dict, Optional
+
+from app.core.connection_pool import FTPConnectionPool
+from app.core.ftp_client import FTPClient
+
+
+class RemoteTreeWalker:
+    """远程目录树遍历器 - 迭代工作队列，每列出一个目录立即输出其中的条目"""
+
+    def __init__(self, connection_pool: FTPConnectionPool, site_config: Dict,
+                 parallelism: int = 1, max_depth: Optional[int] = None,
+                 task_id: Optional[str] = None, max_session_retries: int = 2):
+        self.connection_pool = connection_pool
+        self.site_config = site_config
+        self.task_id = task_id  # 所属任务（借用的会话计入该任务的限速）
+        self.max_session_retries = max_session_retries  # 会话全部失效时换新会话继续遍历的次数
+        self.parallelism = max(1, parallelism)
+        self.max_depth = max_depth
+
+        self.lock = threading.Lock()
+        self.has_work = threading.Condition(self.lock)
+        self.pending_dirs = deque()  # [(相对路径, 深度)]
+        self.in_flight = 0           # 正在列出的目录数
+        self.stopped = False
+        self.errors = {}             # {相对路径: 错误信息}
+        self.directory_count = 0
+
+    def walk(self, root_path: str, on_entry: Callable[[str, Dict], Optional[bool]],
+             should_stop: Callable[[], bool] = lambda: False,
+             session: Optional[FTPClient] = None) -> bool:
+        """遍历root_path下的目录树，对每个条目调用on_entry(相对路径, 条目)
+
+        on_entry返回False或should_stop()返回True时停止遍历。session为调用方已借用的会话，
+        不提供时从连接池借用。根目录无法列出时抛出异常，子目录失败记录在errors中。
+        会话全部失效时换新的会话继续，连续max_session_retries次仍未完成时抛出异常。
+        返回是否完整遍历（只有停止遍历时返回False）。
+        """
+        self.root_path = root_path.rstrip('/') or '/'
+        self.on_entry = on_entry
+        self.should_stop = should_stop
+
+        own_session = session is None
+        if own_session:
+            session = self.connection_pool.acquire(self.site_config, task_id=self.task_id)
+
+        session_ok = True
+        try:
+            # 先列出根目录，根目录失败时直接抛出异常
+            self._list_directory(session, '', 0, raise_errors=True)
+
+            # 根目录下有子目录时才借用额外会话并行列目录
+            extra_sessions = []
+            with self.lock:
+                wanted = min(self.parallelism, len(self.pending_dirs)) - 1
+            while len(extra_sessions) < wanted:
+                try:
+                    extra_sessions.append(self.connection_pool.acquire(self.site_config, timeout=5,
+                                                                       task_id=self.task_id))
+                except Exception as e:
+                    print(f"并行列目录借用额外会话失败，使用 {len(extra_sessions) + 1} 个连接: {e}")
+                    break
+
+            threads = [
+                threading.Thread(target=self._walk_worker, args=(extra,), name=f"TreeWalker-{i + 1}", daemon=True)
+                for i, extra in enumerate(extra_sessions)
+            ]
+            for thread in threads:
+                thread.start()
+            session_ok = self._walk_worker(session, release=False)
+            for thread in threads:
+                thread.join()
+
+            # 会话全部失效时还有未列出的目录，换新的会话继续
+            retries = 0
+            while self._unfinished():
+                if retries >= self.max_session_retries:
+                    raise Exception(f"列目录会话多次失效，{len(self.pending_dirs)} 个目录未列出")
+                retries += 1
+                print(f"列目录会话全部失效，使用新的会话继续 ({retries}/{self.max_session_retries})")
+                self._walk_worker(self.connection_pool.acquire(self.site_config, task_id=self.task_id))
+        except Exception:
+            session_ok = False
+            raise
+        finally:
+            if own_session:
+                self.connection_pool.release(session, discard=not session_ok)
+
+        return not self.stopped and not self.pending_dirs
+
+    def _unfinished(self) -> bool:
+        with self.lock:
+            return not self.stopped and bool(self.pending_dirs)
+
+    def _stop(self):
+        with self.has_work:
+            self.stopped = True
+            self.has_work.notify_all()
+
+    def _walk_worker(self, session: FTPClient, release: bool = True) -> bool:
+        """从工作队列取出目录并列出，直到没有待列出且正在列出的目录；返回会话是否仍可用"""
+        failed = False
+        try:
+            while True:
+                with self.has_work:
+                    while not self.pending_dirs and self.in_flight > 0 and not self.stopped:
+                        self.has_work.wait(0.5)
+                    if self.stopped or not self.pending_dirs:
+                        return True
+                    rel_dir, depth = self.pending_dirs.popleft()
+                    self.in_flight += 1
+
+                try:
+                    self._list_directory(session, rel_dir, depth)
+                except Exception as e:
+                    # 会话失效后该线程退出，剩余目录由其他线程继续
+                    failed = True
+                    with self.lock:
+                        self.pending_dirs.appendleft((rel_dir, depth))
+                    print(f"列目录会话失效: {e}")
+                    return False
+                finally:
+                    with self.has_work:
+                        self.in_flight -= 1
+                        self.has_work.notify_all()
+        finally:
+            if release:
+                self.connection_pool.release(session, discard=failed)
+
+    def _list_directory(self, session: FTPClient, rel_dir: str, depth: int, raise_errors: bool = False):
+        """列出单个目录，输出条目并将子目录加入工作队列"""
+        if self.stopped or self.should_stop():
+            self._stop()
+            return
+
+        dir_path = f"{self.root_path.rstrip('/')}/{rel_dir}" if rel_dir else self.root_path
+        try:
+            entries = session.list_entries(dir_path)
+        except ftplib.error_perm as e:
+            # 目录不存在或无权限，记录后继续遍历其他目录；其他异常说明会话已失效
+            if raise_errors:
+                raise
+            print(f"列出目录失败 {dir_path}: {e}")
+            with self.lock:
+                self.errors[rel_dir] = str(e)
+            return
+
+        subdirs = []
+        with self.lock:
+            self.directory_count += 1
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry['name']}" if rel_dir else entry['name']
+            if self.on_entry(rel_path, entry) is False or self.should_stop():
+                self._stop()
+                return
+            if entry['is_directory'] and (self.max_depth is None or depth < self.max_depth):
+                subdirs.append((rel_path, depth + 1))
+
+        if subdirs:
+            with self.has_work:
+                self.pending_dirs.extend(subdirs)
+                self.has_work.notify_all()
+
+    def get_errors(self) -> Dict[str, str]:
+        """获取列出失败的子目录"""
+        with self.lock:
+            return dict(self.errors)
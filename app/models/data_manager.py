@@ -4,7 +4,8 @@
 数据持久化管理模块
 """
 
-import json
+import atexit
+import heapq
 import os
 import threading
 import time
@@ -12,38 +13,76 @@ import shutil
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 
-# 尝试导入fcntl，如果失败则设置为None（Windows系统）
-try:
-    import fcntl
-except ImportError:
-    fcntl = None
+from app.models.log_query import LogQueryEngine
+from app.models.log_writer import JSONLLogWriter
+from app.models.storage import (JSONStorage, SQLiteStorage, create_storage, import_json_data,
+                                import_monitor_states)
 
 class DataManager:
-    """数据管理器 - 负责JSON文件的读写、备份和原子操作"""
+    """数据管理器 - 负责数据的读写和备份，具体存储由可插拔的存储后端完成"""
     
-    def __init__(self, data_dir="data", backup_interval=300):
+    # 任务写入持久化级别
+    DURABILITY_SYNC = 'sync'              # 每次保存立即写入存储
+    DURABILITY_TRANSITION = 'transition'  # 状态变化时立即写入，进度更新定期合并写入
+    DURABILITY_PERIODIC = 'periodic'      # 仅定期合并写入（及进程退出时）
+    
+    def __init__(self, data_dir="data", backup_interval=300, storage_backend='json', db_path=None,
+                 task_flush_interval=5.0, task_durability='transition',
+                 log_max_size=10 * 1024 * 1024, log_flush_interval=1.0, log_compress=False):
         self.data_dir = data_dir
         self.backup_interval = backup_interval
         self.lock = threading.RLock()
         
+        # 任务写回缓存（内存中的任务数据为权威副本）
+        self.task_flush_interval = task_flush_interval
+        self.task_durability = task_durability
+        self.task_cache = {}      # {task_id: task_copy}
+        self.dirty_tasks = set()  # 尚未写入存储的任务ID
+        self.task_revisions = {}  # {task_id: 已保存的最新版本号}
+        self.flush_lock = threading.Lock()
+        
         # 确保数据目录存在
         os.makedirs(data_dir, exist_ok=True)
         os.makedirs(f"{data_dir}/logs", exist_ok=True)
         os.makedirs(f"{data_dir}/backups", exist_ok=True)
         
-        # 数据文件路径
-        self.files = {
-            'users': f"{data_dir}/users.json",
-            'sites': f"{data_dir}/ftp_sites.json",
-            'tasks': f"{data_dir}/transfer_tasks.json",
-            'monitors': f"{data_dir}/monitor_tasks.json"
-        }
+        # 创建存储后端
+        self.storage = create_storage(storage_backend, data_dir, db_path)
+        print(f"数据存储后端: {storage_backend}")
+        
+        # 新建的SQLite数据库自动导入现有JSON数据
+        if isinstance(self.storage, SQLiteStorage) and self.storage.created:
+            if os.path.exists(JSONStorage(data_dir).files['users']):
+                print("检测到现有JSON数据，导入到SQLite数据库...")
+                import_json_data(data_dir, self.storage)
+        
+        # 监控状态曾保存在独立文件中，导入到SQLite数据库
+        if isinstance(self.storage, SQLiteStorage):
+            imported = import_monitor_states(data_dir, self.storage, move=True)
+            if imported:
+                print(f"已导入 {imported} 个监控状态到SQLite数据库")
         
         # 初始化数据文件
         self._initialize_data_files()
         
-        # 启动定期备份
+        # 追加写入的JSON Lines日志
+        self.log_writer = JSONLLogWriter(
+            f"{data_dir}/logs",
+            max_segment_size=log_max_size,
+            flush_interval=log_flush_interval,
+            compress_rotated=log_compress
+        )
+        self.log_query = LogQueryEngine(self.log_writer)
+        
+        # 加载任务缓存
+        self.task_cache = dict(self.storage.load_tasks().get('tasks', {}))
+        
+        # 启动定期写回和定期备份
+        self._start_flush_thread()
         self._start_backup_thread()
+        
+        # 进程退出时写回未保存的任务
+        atexit.register(self.shutdown)
     
     def _initialize_data_files(self):
         """初始化数据文件"""
@@ -80,179 +119,120 @@ class DataManager:
             'monitors': {'monitors': [], 'monitor_counter': 0}
         }
         
-        for key, filepath in self.files.items():
-            if not os.path.exists(filepath):
-                self._atomic_write(filepath, default_data[key])
+        self.storage.initialize(default_data)
     
-    def _atomic_write(self, filepath: str, data: Dict):
-        """原子写入文件"""
-        temp_file = f"{filepath}.tmp"
-        backup_file = f"{filepath}.backup"
-        
-        try:
-            # 写入临时文件
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                # 在Unix/Linux系统上使用文件锁
-                if fcntl and hasattr(fcntl, 'flock'):
-                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            
-            # 备份原文件
-            if os.path.exists(filepath):
-                shutil.copy2(filepath, backup_file)
-            
-            # 原子重命名
-            if os.name == 'nt':  # Windows
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-            os.rename(temp_file, filepath)
-            
-        except Exception as e:
-            # 清理临时文件
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
-            raise e
-    
-    def _load_json(self, filepath: str) -> Dict:
-        """加载JSON文件"""
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            print(f"加载文件失败 {filepath}: {e}")
-            return {}
-    
-    def save_task(self, task: Dict):
-        """保存单个任务"""
-        with self.lock:
-            try:
-                # 加载现有数据
-                data = self._load_json(self.files['tasks'])
-                if 'tasks' not in data:
-                    data['tasks'] = {}
-
-                # 复制任务数据并转换枚举类型为字符串
-                task_copy = task.copy()
-                if hasattr(task_copy.get('priority'), 'value'):
-                    task_copy['priority'] = task_copy['priority'].value
-                if hasattr(task_copy.get('status'), 'value'):
-                    task_copy['status'] = task_copy['status'].value
-
-                # 更新任务
-                data['tasks'][task['id']] = task_copy
+    def save_task(self, task: Dict, revision: Optional[int] = None):
+        """保存单个任务（写入内存缓存，按持久化级别立即或定期写入存储）
+
+        revision为调用方复制任务数据时的版本号，比已保存的版本旧时（并发保存的顺序颠倒）忽略。
+        """
+        # 复制任务数据并转换枚举类型为字符串
+        task_copy = task.copy()
+        if hasattr(task_copy.get('priority'), 'value'):
+            task_copy['priority'] = task_copy['priority'].value
+        if hasattr(task_copy.get('status'), 'value'):
+            task_copy['status'] = task_copy['status'].value
+        if isinstance(task_copy.get('checkpoint_data'), dict):
+            task_copy['checkpoint_data'] = task_copy['checkpoint_data'].copy()
 
-                # 保存
-                self._atomic_write(self.files['tasks'], data)
+        with self.lock:
+            if revision is not None:
+                if revision < self.task_revisions.get(task_copy['id'], -1):
+                    return
+                self.task_revisions[task_copy['id']] = revision
+            previous = self.task_cache.get(task_copy['id'])
+            self.task_cache[task_copy['id']] = task_copy
+            self.dirty_tasks.add(task_copy['id'])
+
+            # 新任务或状态变化（如running→completed/failed/pending）时立即写入
+            status_changed = previous is None or previous.get('status') != task_copy.get('status')
+            flush_now = (self.task_durability == self.DURABILITY_SYNC or
+                         (self.task_durability == self.DURABILITY_TRANSITION and status_changed))
+
+        if flush_now:
+            self.flush_tasks()
+
+    def flush_tasks(self) -> int:
+        """将缓存中的脏任务批量写入存储"""
+        with self.flush_lock:
+            with self.lock:
+                if not self.dirty_tasks:
+                    return 0
+                dirty_ids = self.dirty_tasks
+                self.dirty_tasks = set()
+                tasks = [self.task_cache[task_id] for task_id in dirty_ids
+                         if task_id in self.task_cache]
 
+            try:
+                self.storage.save_tasks(tasks)
+                return len(tasks)
             except Exception as e:
+                # 写入失败，重新标记为脏数据等待下次写回
+                with self.lock:
+                    self.dirty_tasks.update(task['id'] for task in tasks
+                                            if task['id'] in self.task_cache)
                 print(f"保存任务失败: {e}")
                 import traceback
                 traceback.print_exc()
+                return 0
 
     def delete_task(self, task_id: str) -> bool:
         """删除单个任务"""
-        # 简化版本，直接操作文件
-        try:
-            import json
-
-            # 直接读取文件
-            with open(self.files['tasks'], 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            if 'tasks' not in data or task_id not in data['tasks']:
-                return False
-
-            # 删除任务
-            del data['tasks'][task_id]
-
-            # 直接写入文件
-            with open(self.files['tasks'], 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-
-            return True
+        with self.lock:
+            in_cache = self.task_cache.pop(task_id, None) is not None
+            self.dirty_tasks.discard(task_id)
 
+        try:
+            return self.storage.delete_task(task_id) or in_cache
         except Exception as e:
             print(f"删除任务失败: {e}")
             return False
 
     def load_tasks(self) -> Dict:
-        """加载所有任务"""
-        return self._load_json(self.files['tasks'])
+        """加载所有任务（来自内存缓存）"""
+        with self.lock:
+            return {'tasks': {task_id: task.copy() for task_id, task in self.task_cache.items()}}
 
     def get_recent_tasks(self, limit: int = 100) -> List[Dict]:
         """获取最近的任务列表"""
         try:
-            data = self._load_json(self.files['tasks'])
-            tasks = data.get('tasks', {})
-
-            # 转换为列表并按创建时间排序
+            with self.lock:
+                recent = heapq.nlargest(limit, self.task_cache.items(),
+                                        key=lambda item: item[1].get('created_at', ''))
             task_list = []
-            for task_id, task_data in tasks.items():
+            for task_id, task_data in recent:
                 task_copy = task_data.copy()
                 task_copy['id'] = task_id
                 task_list.append(task_copy)
-
-            # 按创建时间排序（最新的在前）
-            task_list.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-
-            # 限制数量
-            return task_list[:limit]
-
+            return task_list
         except Exception as e:
             print(f"获取最近任务失败: {e}")
             return []
-    
-    def delete_task(self, task_id: str):
-        """删除任务"""
-        with self.lock:
-            try:
-                data = self._load_json(self.files['tasks'])
-                if 'tasks' in data and task_id in data['tasks']:
-                    del data['tasks'][task_id]
-                    self._atomic_write(self.files['tasks'], data)
-            except Exception as e:
-                print(f"删除任务失败: {e}")
+
+    def shutdown(self):
+        """关闭数据管理器，写回所有未保存的任务和日志"""
+        flushed = self.flush_tasks()
+        if flushed:
+            print(f"退出前写回任务: {flushed} 个")
+        self.log_writer.close()
     
     def save_site(self, site: Dict):
         """保存FTP站点"""
         with self.lock:
             try:
-                data = self._load_json(self.files['sites'])
-                if 'sites' not in data:
-                    data['sites'] = []
-                
-                # 查找并更新或添加
-                updated = False
-                for i, existing_site in enumerate(data['sites']):
-                    if existing_site['id'] == site['id']:
-                        data['sites'][i] = site
-                        updated = True
-                        break
-                
-                if not updated:
-                    data['sites'].append(site)
-                    if 'site_counter' not in data:
-                        data['site_counter'] = 0
-                    data['site_counter'] += 1
-                
-                self._atomic_write(self.files['sites'], data)
-                
+                self.storage.save_record('sites', site)
             except Exception as e:
                 print(f"保存站点失败: {e}")
     
     def load_sites(self) -> List[Dict]:
         """加载所有FTP站点"""
-        data = self._load_json(self.files['sites'])
-        return data.get('sites', [])
+        return self.storage.load_records('sites')
     
     def delete_site(self, site_id: str):
         """删除FTP站点"""
         with self.lock:
             try:
-                data = self._load_json(self.files['sites'])
-                if 'sites' in data:
-                    data['sites'] = [s for s in data['sites'] if s['id'] != site_id]
-                    self._atomic_write(self.files['sites'], data)
+                self.storage.delete_record('sites', site_id)
             except Exception as e:
                 print(f"删除站点失败: {e}")
     
@@ -260,33 +240,13 @@ class DataManager:
         """保存用户"""
         with self.lock:
             try:
-                data = self._load_json(self.files['users'])
-                if 'users' not in data:
-                    data['users'] = []
-                
-                # 查找并更新或添加
-                updated = False
-                for i, existing_user in enumerate(data['users']):
-                    if existing_user['id'] == user['id']:
-                        data['users'][i] = user
-                        updated = True
-                        break
-                
-                if not updated:
-                    data['users'].append(user)
-                    if 'user_counter' not in data:
-                        data['user_counter'] = 0
-                    data['user_counter'] += 1
-                
-                self._atomic_write(self.files['users'], data)
-                
+                self.storage.save_record('users', user)
             except Exception as e:
                 print(f"保存用户失败: {e}")
     
     def load_users(self) -> List[Dict]:
         """加载所有用户"""
-        data = self._load_json(self.files['users'])
-        return data.get('users', [])
+        return self.storage.load_records('users')
     
     def find_user_by_username(self, username: str) -> Optional[Dict]:
         """根据用户名查找用户"""
@@ -308,17 +268,8 @@ class DataManager:
         """删除用户"""
         with self.lock:
             try:
-                data = self._load_json(self.files['users'])
-                if 'users' not in data:
-                    return False
-
                 # 查找要删除的用户
-                user_to_delete = None
-                for user in data['users']:
-                    if user['id'] == user_id:
-                        user_to_delete = user
-                        break
-
+                user_to_delete = self.find_user_by_id(user_id)
                 if not user_to_delete:
                     return False
 
@@ -326,11 +277,7 @@ class DataManager:
                 if user_to_delete['role'] == 'super_admin':
                     return False
 
-                # 从列表中移除用户
-                data['users'] = [u for u in data['users'] if u['id'] != user_id]
-
-                self._atomic_write(self.files['users'], data)
-                return True
+                return self.storage.delete_record('users', user_id)
 
             except Exception as e:
                 print(f"删除用户失败: {e}")
@@ -340,18 +287,14 @@ class DataManager:
         """更新用户状态"""
         with self.lock:
             try:
-                data = self._load_json(self.files['users'])
-                if 'users' not in data:
-                    return False
-
                 # 查找并更新用户状态
-                for user in data['users']:
-                    if user['id'] == user_id:
-                        user['status'] = status
-                        self._atomic_write(self.files['users'], data)
-                        return True
+                user = self.find_user_by_id(user_id)
+                if not user:
+                    return False
 
-                return False
+                user['status'] = status
+                self.storage.save_record('users', user)
+                return True
 
             except Exception as e:
                 print(f"更新用户状态失败: {e}")
@@ -361,18 +304,14 @@ class DataManager:
         """更新用户最后登录时间"""
         with self.lock:
             try:
-                data = self._load_json(self.files['users'])
-                if 'users' not in data:
-                    return False
-
                 # 查找并更新用户最后登录时间
-                for user in data['users']:
-                    if user['id'] == user_id:
-                        user['last_login'] = datetime.now().isoformat()
-                        self._atomic_write(self.files['users'], data)
-                        return True
+                user = self.find_user_by_id(user_id)
+                if not user:
+                    return False
 
-                return False
+                user['last_login'] = datetime.now().isoformat()
+                self.storage.save_record('users', user)
+                return True
 
             except Exception as e:
                 print(f"更新用户最后登录时间失败: {e}")
@@ -392,66 +331,120 @@ class DataManager:
         """保存监控任务"""
         with self.lock:
             try:
-                data = self._load_json(self.files['monitors'])
-                if 'monitors' not in data:
-                    data['monitors'] = []
-                
-                # 查找并更新或添加
-                updated = False
-                for i, existing_monitor in enumerate(data['monitors']):
-                    if existing_monitor['id'] == monitor['id']:
-                        data['monitors'][i] = monitor
-                        updated = True
-                        break
-                
-                if not updated:
-                    data['monitors'].append(monitor)
-                    if 'monitor_counter' not in data:
-                        data['monitor_counter'] = 0
-                    data['monitor_counter'] += 1
-                
-                self._atomic_write(self.files['monitors'], data)
-                
+                self.storage.save_record('monitors', monitor)
             except Exception as e:
                 print(f"保存监控任务失败: {e}")
     
     def load_monitors(self) -> List[Dict]:
         """加载所有监控任务"""
-        data = self._load_json(self.files['monitors'])
-        return data.get('monitors', [])
+        return self.storage.load_records('monitors')
+    
+    def delete_monitor(self, monitor_id: str) -> bool:
+        """删除监控任务"""
+        with self.lock:
+            try:
+                self.delete_monitor_state(monitor_id)
+                return self.storage.delete_record('monitors', monitor_id)
+            except Exception as e:
+                print(f"删除监控任务失败: {e}")
+                return False
+    
+    def load_monitor_state(self, monitor_id: str) -> Optional[Dict]:
+        """加载监控状态，尚未保存过时返回None
+
+        返回 {'signatures': {文件名: (大小, 修改时间)}, 'pending': {文件名: [大小, 修改时间, 连续相同次数]},
+        'tree': 递归监控的目录状态或None}；tree中未完成遍历的scan签名表同样按列存储。
+        """
+        try:
+            data = self.storage.load_monitor_state(monitor_id)
+            if data is None:
+                return None
+            tree = data.get('tree')
+            if tree and tree.get('scan'):
+                tree['scan']['signatures'] = self._signatures_from_columns(tree['scan']['signatures'])
+            return {
+                'signatures': self._signatures_from_columns(data),
+                'pending': data.get('pending', {}),
+                'tree': tree
+            }
+        except Exception as e:
+            print(f"加载监控签名失败 {monitor_id}: {e}")
+            return None
+    
+    def save_monitor_state(self, monitor_id: str, signatures: Dict[str, tuple], pending: Optional[Dict] = None,
+                           tree: Optional[Dict] = None):
+        """保存监控状态（签名表按列存储，不重复键名），由存储后端写入并随数据备份"""
+        data = {
+            'version': 1,
+            **self._signatures_to_columns(signatures),
+            'pending': pending or {}
+        }
+        if tree:
+            data['tree'] = dict(tree)
+            if tree.get('scan'):
+                data['tree']['scan'] = {**tree['scan'],
+                                        'signatures': self._signatures_to_columns(tree['scan']['signatures'])}
+        try:
+            self.storage.save_monitor_state(monitor_id, data)
+        except Exception as e:
+            print(f"保存监控签名失败 {monitor_id}: {e}")
+    
+    @staticmethod
+    def _signatures_to_columns(signatures: Dict[str, tuple]) -> Dict[str, List]:
+        return {
+            'names': list(signatures.keys()),
+            'sizes': [signature[0] for signature in signatures.values()],
+            'mtimes': [signature[1] for signature in signatures.values()]
+        }
+    
+    @staticmethod
+    def _signatures_from_columns(data: Dict) -> Dict[str, tuple]:
+        return dict(zip(data['names'], zip(data['sizes'], data['mtimes'])))
+    
+    def delete_monitor_state(self, monitor_id: str):
+        """删除监控状态"""
+        self.storage.delete_monitor_state(monitor_id)
     
     def write_log(self, log_type: str, log_data: Dict):
-        """写入日志"""
+        """写入日志（追加到当天的JSON Lines文件，由后台线程批量写入）"""
         try:
-            log_date = datetime.now().strftime("%Y-%m-%d")
-            log_dir = f"{self.data_dir}/logs/{log_type}"
-            os.makedirs(log_dir, exist_ok=True)
-            
-            log_file = f"{log_dir}/{log_date}.json"
-            
-            # 读取现有日志
-            logs = []
-            if os.path.exists(log_file):
-                try:
-                    with open(log_file, 'r', encoding='utf-8') as f:
-                        logs = json.load(f)
-                except:
-                    logs = []
-            
-            # 添加新日志
             log_entry = {
                 'timestamp': datetime.now().isoformat(),
                 **log_data
             }
-            logs.append(log_entry)
-            
-            # 保存日志
-            with open(log_file, 'w', encoding='utf-8') as f:
-                json.dump(logs, f, indent=2, ensure_ascii=False)
-                
+            self.log_writer.write(log_type, log_entry)
         except Exception as e:
             print(f"写入日志失败: {e}")
     
+    def read_logs(self, log_type: str, date: str, limit: int = 100) -> List[Dict]:
+        """读取某天的日志，按时间倒序排列"""
+        try:
+            return self.log_query.query(log_type, date=date, limit=limit)['logs']
+        except Exception as e:
+            print(f"读取日志失败: {e}")
+            return []
+    
+    def query_logs(self, log_type: str, date: Optional[str] = None, since: Optional[str] = None,
+                   until: Optional[str] = None, filters: Optional[Dict] = None, limit: int = 100,
+                   cursor: Optional[str] = None) -> Dict:
+        """按时间范围和条件查询日志，返回 {'logs': [...], 'next_cursor': 游标或None}"""
+        return self.log_query.query(log_type, date=date, since=since, until=until,
+                                    filters=filters, limit=limit, cursor=cursor)
+    
+    def _start_flush_thread(self):
+        """启动任务定期写回线程"""
+        def flush_loop():
+            while True:
+                try:
+                    time.sleep(self.task_flush_interval)
+                    self.flush_tasks()
+                except Exception as e:
+                    print(f"写回任务失败: {e}")
+        
+        flush_thread = threading.Thread(target=flush_loop, daemon=True)
+        flush_thread.start()
+        print(f"启动任务写回线程，间隔: {self.task_flush_interval}秒，持久化级别: {self.task_durability}")
+    
     def _start_backup_thread(self):
         """启动定期备份线程"""
         def backup_loop():
@@ -474,10 +467,11 @@ class DataManager:
             
             os.makedirs(backup_dir, exist_ok=True)
             
-            # 备份所有数据文件
-            for filename, filepath in self.files.items():
-                if os.path.exists(filepath):
-                    shutil.copy2(filepath, f"{backup_dir}/{filename}.json")
+            # 备份前写回缓存中的任务
+            self.flush_tasks()
+            
+            # 备份所有数据
+            self.storage.backup(backup_dir)
             
             print(f"创建备份: {backup_dir}")
             
@@ -511,18 +505,7 @@ class DataManager:
         """获取下一个ID"""
         with self.lock:
             try:
-                data = self._load_json(self.files[data_type])
-                counter_key = f"{data_type[:-1]}_counter"  # users -> user_counter
-                
-                if counter_key not in data:
-                    data[counter_key] = 0
-                
-                data[counter_key] += 1
-                next_id = f"{data_type[:-1]}_{data[counter_key]:06d}"
-                
-                self._atomic_write(self.files[data_type], data)
-                return next_id
-                
+                return self.storage.next_id(data_type)
             except Exception as e:
                 print(f"获取下一个ID失败: {e}")
                 return f"{data_type[:-1]}_{int(time.time())}"
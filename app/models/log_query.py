@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志查询模块 - 基于分段偏移索引的日志查询，支持时间范围、条件过滤、游标分页和倒序尾部读取
+"""
+
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.models.log_writer import JSONLLogWriter
+
+# 日志行以时间戳开头，建立索引时无需解析整行JSON
+TIMESTAMP_PATTERN = re.compile(r'"timestamp":\s*"([^"]+)"')
+
+# 支持过滤的字段
+FILTER_FIELDS = ('action', 'site_id', 'task_id', 'status')
+
+
+class LogQueryEngine:
+    """日志查询引擎 - 从分段末尾倒序读取，借助旁路索引跳过不在时间范围内的分段"""
+
+    INDEX_VERSION = 1
+    INDEX_STRIDE = 256          # 每隔多少行记录一个偏移检查点
+    READ_BLOCK_SIZE = 64 * 1024  # 倒序读取的块大小
+    MAX_DAYS = 31               # 单次查询最多跨越的天数
+
+    def __init__(self, log_writer: JSONLLogWriter):
+        self.log_writer = log_writer
+
+    def query(self, log_type: str, date: Optional[str] = None, since: Optional[str] = None,
+              until: Optional[str] = None, filters: Optional[Dict] = None, limit: int = 100,
+              cursor: Optional[str] = None) -> Dict:
+        """查询日志，按时间倒序返回 {'logs': [...], 'next_cursor': 游标或None}"""
+        filters = {k: str(v) for k, v in (filters or {}).items() if k in FILTER_FIELDS and v not in (None, '')}
+        dates = self._query_dates(date, since, until)
+        position = self._parse_cursor(cursor)
+
+        # 读取前写入队列中的日志，保证刚写入的日志可见
+        self.log_writer.flush()
+
+        logs = []
+        next_cursor = None
+        last_position = None
+        for entry_date, segment, offset, entry in self._iter_reverse(log_type, dates, since, until, position):
+            if not self._match(entry, filters):
+                continue
+            if limit > 0 and len(logs) >= limit:
+                # 还有更多结果，返回下一页游标（指向上一条已返回日志的位置）
+                next_cursor = last_position
+                break
+            logs.append(entry)
+            last_position = f"{entry_date}:{segment}:{offset}"
+
+        return {'logs': logs, 'next_cursor': next_cursor}
+
+    def tail(self, log_type: str, limit: int = 100) -> List[Dict]:
+        """读取最新的日志（最新的在前）"""
+        return self.query(log_type, limit=limit)['logs']
+
+    def _query_dates(self, date: Optional[str], since: Optional[str], until: Optional[str]) -> List[str]:
+        """计算需要查询的日期（从新到旧）"""
+        if date:
+            return [date]
+
+        end = datetime.fromisoformat(until) if until else datetime.now()
+        start = datetime.fromisoformat(since) if since else end
+        days = min((end.date() - start.date()).days, self.MAX_DAYS - 1)
+        return [(end - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(max(days, 0) + 1)]
+
+    def _parse_cursor(self, cursor: Optional[str]) -> Optional[Tuple[str, int, int]]:
+        """解析游标 "日期:分段序号:偏移"，分段序号-1表示旧的JSON数组文件"""
+        if not cursor:
+            return None
+        try:
+            date, segment, offset = cursor.rsplit(':', 2)
+            return date, int(segment), int(offset)
+        except ValueError:
+            raise Exception(f"无效的游标: {cursor}")
+
+    def _match(self, entry: Dict, filters: Dict) -> bool:
+        for field, value in filters.items():
+            actual = entry.get(field)
+            # 传输、监控和系统日志使用type字段记录操作类型
+            if field == 'action' and actual is None:
+                actual = entry.get('type')
+            if str(actual) != value:
+                return False
+        return True
+
+    def _iter_reverse(self, log_type: str, dates: List[str], since: Optional[str],
+                      until: Optional[str], position: Optional[Tuple[str, int, int]]
+                      ) -> Iterator[Tuple[str, int, int, Dict]]:
+        """按时间倒序遍历日志 (日期, 分段序号, 偏移, 日志)"""
+        for date in dates:
+            if position and date > position[0]:
+                continue
+
+            # 分段从新到旧，旧格式的JSON数组文件最早
+            segments = [(index, compressed, path)
+                        for _, index, compressed, path in self.log_writer.list_segments(log_type, date)]
+            segments.reverse()
+            legacy_file = os.path.join(self.log_writer.log_dir, log_type, f"{date}.json")
+            if os.path.exists(legacy_file):
+                segments.append((-1, False, legacy_file))
+
+            for index, compressed, path in segments:
+                end_offset = None
+                if position and date == position[0]:
+                    if index > position[1]:
+                        continue
+                    if index == position[1]:
+                        end_offset = position[2]
+
+                if index == -1:
+                    entries = self._read_legacy(path, end_offset)
+                else:
+                    index_data = self._load_index(path, compressed)
+                    # 分段不在时间范围内时直接跳过
+                    if index_data['count'] == 0:
+                        continue
+                    if since and index_data['last_ts'] < since:
+                        continue
+                    if until and index_data['first_ts'] > until:
+                        continue
+                    if until and end_offset is None:
+                        end_offset = self._seek_until(index_data, until)
+                    entries = self._read_segment_reverse(path, compressed, end_offset)
+
+                for offset, entry in entries:
+                    timestamp = entry.get('timestamp', '')
+                    if until and timestamp > until:
+                        continue
+                    if since and timestamp < since:
+                        # 日志按写入时间追加，更早的日志都不在范围内
+                        return
+                    yield date, index, offset, entry
+
+    def _read_legacy(self, path: str, end_offset: Optional[int]) -> Iterator[Tuple[int, Dict]]:
+        """倒序读取旧格式的JSON数组日志，偏移为数组下标"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                logs = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"读取日志失败 {path}: {e}")
+            return
+
+        logs.sort(key=lambda x: x.get('timestamp', ''))
+        end = len(logs) if end_offset is None else min(end_offset, len(logs))
+        for i in range(end - 1, -1, -1):
+            yield i, logs[i]
+
+    def _read_segment_reverse(self, path: str, compressed: bool,
+                              end_offset: Optional[int]) -> Iterator[Tuple[int, Dict]]:
+        """从分段末尾（或指定偏移）倒序读取日志，偏移为该行的起始字节位置"""
+        if compressed:
+            # 已压缩的分段无法随机读取，解压后在内存中倒序遍历
+            try:
+                with gzip.open(path, 'rb') as f:
+                    data = f.read()
+            except OSError as e:
+                print(f"读取日志失败 {path}: {e}")
+                return
+            lines = self._reverse_lines_in_memory(data, end_offset)
+        else:
+            lines = self._reverse_lines_from_file(path, end_offset)
+
+        for offset, line in lines:
+            try:
+                yield offset, json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                # 进程异常退出可能留下不完整的行
+                continue
+
+    def _reverse_lines_in_memory(self, data: bytes, end_offset: Optional[int]) -> Iterator[Tuple[int, bytes]]:
+        end = len(data) if end_offset is None else min(end_offset, len(data))
+        while end > 0:
+            start = data.rfind(b'\n', 0, end - 1) + 1
+            line = data[start:end].strip()
+            if line:
+                yield start, line
+            end = start
+
+    def _reverse_lines_from_file(self, path: str, end_offset: Optional[int]) -> Iterator[Tuple[int, bytes]]:
+        """按块从文件末尾向前读取，只读取需要的部分"""
+        try:
+            f = open(path, 'rb')
+        except OSError as e:
+            print(f"读取日志失败 {path}: {e}")
+            return
+
+        with f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell() if end_offset is None else min(end_offset, f.tell())
+            remainder = b''
+
+            while position > 0:
+                read_size = min(self.READ_BLOCK_SIZE, position)
+                position -= read_size
+                f.seek(position)
+                block = f.read(read_size) + remainder
+
+                # 块中第一行可能不完整，留到下一次读取
+                lines = block.split(b'\n')
+                remainder = lines[0]
+                line_end = position + len(block)
+                for line in reversed(lines[1:]):
+                    line_start = line_end - len(line)
+                    if line.strip():
+                        yield line_start, line
+                    line_end = line_start - 1
+
+            if remainder.strip():
+                yield 0, remainder
+
+    def _index_path(self, path: str) -> str:
+        return f"{path}.idx"
+
+    def _load_index(self, path: str, compressed: bool) -> Dict:
+        """加载分段的偏移索引，分段有新增内容时增量更新"""
+        index_path = self._index_path(path)
+        index_data = None
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index_data = json.load(f)
+            if index_data.get('version') != self.INDEX_VERSION:
+                index_data = None
+        except (OSError, json.JSONDecodeError):
+            index_data = None
+
+        if index_data is None:
+            index_data = {
+                'version': self.INDEX_VERSION,
+                'size': 0,
+                'count': 0,
+                'first_ts': '',
+                'last_ts': '',
+                'checkpoints': []  # [[偏移, 时间戳]]，每INDEX_STRIDE行一个
+            }
+
+        # 压缩分段不会再变化，索引建立后直接使用
+        if compressed and index_data['count'] > 0:
+            return index_data
+
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return index_data
+        if not compressed and size == index_data['size']:
+            return index_data
+        if not compressed and size < index_data['size']:
+            # 分段被截断或替换，重建索引
+            index_data.update({'size': 0, 'count': 0, 'first_ts': '', 'last_ts': '', 'checkpoints': []})
+
+        try:
+            self._extend_index(path, compressed, index_data)
+            with open(index_path, 'w', encoding='utf-8') as f:
+                json.dump(index_data, f)
+        except OSError as e:
+            print(f"更新日志索引失败 {index_path}: {e}")
+
+        return index_data
+
+    def _extend_index(self, path: str, compressed: bool, index_data: Dict):
+        """从上次索引的位置继续扫描，只索引完整的行"""
+        opener = gzip.open if compressed else open
+        with opener(path, 'rb') as f:
+            offset = index_data['size']
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # 最后一行尚未写完，下次再索引
+                    break
+                match = TIMESTAMP_PATTERN.search(line[:100].decode('utf-8', errors='ignore'))
+                if match:
+                    timestamp = match.group(1)
+                    if index_data['count'] % self.INDEX_STRIDE == 0:
+                        index_data['checkpoints'].append([offset, timestamp])
+                    if not index_data['first_ts']:
+                        index_data['first_ts'] = timestamp
+                    index_data['last_ts'] = timestamp
+                    index_data['count'] += 1
+                offset += len(line)
+            index_data['size'] = offset
+
+    def _seek_until(self, index_data: Dict, until: str) -> Optional[int]:
+        """根据检查点找到第一个晚于until的位置，从那里开始倒序读取"""
+        for offset, timestamp in index_data['checkpoints']:
+            if timestamp > until:
+                return offset
+        return None
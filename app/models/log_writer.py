@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志写入模块 - 追加写入的JSON Lines日志，按日期和大小轮转
+"""
+
+import gzip
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+from datetime import datetime
+from typing import Dict, List
+
+# 日志分段文件名：<日期>.jsonl、<日期>.<序号>.jsonl，压缩后追加.gz
+SEGMENT_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})(?:\.(\d+))?\.jsonl(\.gz)?$')
+
+
+class JSONLLogWriter:
+    """JSON Lines日志写入器 - 后台线程批量追加写入，支持大小轮转和压缩已关闭的分段"""
+
+    def __init__(self, log_dir: str, max_segment_size: int = 10 * 1024 * 1024,
+                 flush_interval: float = 1.0, compress_rotated: bool = False,
+                 max_buffered: int = 1000):
+        self.log_dir = log_dir
+        self.max_segment_size = max_segment_size
+        self.flush_interval = flush_interval
+        self.compress_rotated = compress_rotated
+        self.max_buffered = max_buffered
+
+        self.queue = queue.Queue()
+        self.write_lock = threading.Lock()
+        self.flush_event = threading.Event()
+        self.active_segments = {}  # {log_type: {'date', 'index', 'path', 'file'}}
+        self.running = True
+
+        os.makedirs(log_dir, exist_ok=True)
+        self._start_flush_thread()
+
+    def write(self, log_type: str, entry: Dict):
+        """写入一条日志（进入队列，由后台线程批量写入）"""
+        self.queue.put((log_type, entry))
+        # 缓冲过多时提前唤醒写入线程
+        if self.queue.qsize() >= self.max_buffered:
+            self.flush_event.set()
+
+    def flush(self):
+        """将队列中的日志全部写入文件"""
+        with self.write_lock:
+            batches = {}
+            while True:
+                try:
+                    log_type, entry = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batches.setdefault(log_type, []).append(entry)
+
+            for log_type, entries in batches.items():
+                try:
+                    self._append_entries(log_type, entries)
+                except Exception as e:
+                    print(f"写入日志失败: {e}")
+
+    def close(self):
+        """写入剩余日志并关闭所有分段文件"""
+        self.running = False
+        self.flush_event.set()
+        self.flush()
+        with self.write_lock:
+            for segment in self.active_segments.values():
+                segment['file'].close()
+            self.active_segments.clear()
+
+    def _append_entries(self, log_type: str, entries: List[Dict]):
+        """追加写入一批日志"""
+        for entry in entries:
+            date = entry.get('timestamp', '')[:10] or datetime.now().strftime("%Y-%m-%d")
+            segment = self._get_active_segment(log_type, date)
+            segment['file'].write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+            # 超过分段大小时轮转
+            if segment['file'].tell() >= self.max_segment_size:
+                self._rotate(log_type, next_index=segment['index'] + 1)
+
+        for segment in self.active_segments.values():
+            segment['file'].flush()
+
+    def _get_active_segment(self, log_type: str, date: str) -> Dict:
+        """获取当前写入的分段，日期变化时关闭旧分段"""
+        segment = self.active_segments.get(log_type)
+        if segment and segment['date'] == date:
+            return segment
+
+        if segment:
+            # 日期变化，关闭前一天的分段
+            self._close_segment(log_type)
+
+        # 继续写入当天最新的未压缩分段
+        index = 0
+        for _, seg_index, compressed, _ in self.list_segments(log_type, date):
+            index = seg_index + 1 if compressed else seg_index
+
+        return self._open_segment(log_type, date, index)
+
+    def _segment_path(self, log_type: str, date: str, index: int) -> str:
+        name = f"{date}.jsonl" if index == 0 else f"{date}.{index}.jsonl"
+        return os.path.join(self.log_dir, log_type, name)
+
+    def _open_segment(self, log_type: str, date: str, index: int) -> Dict:
+        path = self._segment_path(log_type, date, index)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        segment = {
+            'date': date,
+            'index': index,
+            'path': path,
+            'file': open(path, 'a', encoding='utf-8')
+        }
+        self.active_segments[log_type] = segment
+        return segment
+
+    def _close_segment(self, log_type: str):
+        """关闭分段，按配置压缩"""
+        segment = self.active_segments.pop(log_type, None)
+        if not segment:
+            return
+        segment['file'].close()
+        if self.compress_rotated:
+            self._compress_segment(segment['path'])
+
+    def _rotate(self, log_type: str, next_index: int):
+        """按大小轮转到下一个分段"""
+        date = self.active_segments[log_type]['date']
+        self._close_segment(log_type)
+        self._open_segment(log_type, date, next_index)
+
+    def _compress_segment(self, path: str):
+        """gzip压缩已关闭的分段"""
+        try:
+            with open(path, 'rb') as src, gzip.open(f"{path}.gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(path)
+            # 未压缩分段的偏移索引已失效，查询时按压缩分段重建
+            if os.path.exists(f"{path}.idx"):
+                os.remove(f"{path}.idx")
+        except Exception as e:
+            print(f"压缩日志分段失败 {path}: {e}")
+
+    def list_segments(self, log_type: str, date: str) -> List[tuple]:
+        """列出某天的日志分段 [(日期, 序号, 是否压缩, 路径)]，按写入顺序排列"""
+        type_dir = os.path.join(self.log_dir, log_type)
+        if not os.path.isdir(type_dir):
+            return []
+
+        segments = []
+        for name in os.listdir(type_dir):
+            match = SEGMENT_PATTERN.match(name)
+            if match and match.group(1) == date:
+                segments.append((date, int(match.group(2) or 0), bool(match.group(3)),
+                                 os.path.join(type_dir, name)))
+        segments.sort(key=lambda seg: seg[1])
+        return segments
+
+    def _start_flush_thread(self):
+        """启动后台写入线程"""
+        def flush_loop():
+            while self.running:
+                try:
+                    # 按间隔合并写入，缓冲过多时提前写入
+                    self.flush_event.wait(self.flush_interval)
+                    self.flush_event.clear()
+                    if not self.queue.empty():
+                        self.flush()
+                except Exception as e:
+                    print(f"日志写入线程错误: {e}")
+
+        flush_thread = threading.Thread(target=flush_loop, name="LogWriter", daemon=True)
+        flush_thread.start()
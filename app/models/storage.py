@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储后端模块 - JSON文件存储与SQLite(WAL)存储
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+# 尝试导入fcntl，如果失败则设置为None（Windows系统）
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 列表型数据集合（用户、站点、监控任务），任务为以ID为键的字典
+RECORD_COLLECTIONS = ('users', 'sites', 'monitors')
+
+
+class JSONStorage:
+    """JSON文件存储后端 - 每类数据一个文件，原子写入"""
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        self.lock = threading.RLock()
+
+        # 数据文件路径
+        self.files = {
+            'users': f"{data_dir}/users.json",
+            'sites': f"{data_dir}/ftp_sites.json",
+            'tasks': f"{data_dir}/transfer_tasks.json",
+            'monitors': f"{data_dir}/monitor_tasks.json"
+        }
+        # 监控状态（签名表）较大且频繁更新，每个监控单独一个文件
+        self.monitor_state_dir = f"{data_dir}/monitor_signatures"
+
+    def initialize(self, default_data: Dict):
+        """初始化数据文件"""
+        for key, filepath in self.files.items():
+            if not os.path.exists(filepath):
+                self._atomic_write(filepath, default_data[key])
+
+    def _atomic_write(self, filepath: str, data: Dict):
+        """原子写入文件"""
+        temp_file = f"{filepath}.tmp"
+        backup_file = f"{filepath}.backup"
+
+        try:
+            # 写入临时文件
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                # 在Unix/Linux系统上使用文件锁
+                if fcntl and hasattr(fcntl, 'flock'):
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                json.dump(data, f, indent=2, ensure_ascii=False)
+
+            # 备份原文件
+            if os.path.exists(filepath):
+                shutil.copy2(filepath, backup_file)
+
+            # 原子重命名
+            if os.name == 'nt':  # Windows
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            os.rename(temp_file, filepath)
+
+        except Exception as e:
+            # 清理临时文件
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise e
+
+    def _load_json(self, filepath: str) -> Dict:
+        """加载JSON文件"""
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            print(f"加载文件失败 {filepath}: {e}")
+            return {}
+
+    # 任务
+    def load_tasks(self) -> Dict:
+        """加载所有任务"""
+        return self._load_json(self.files['tasks'])
+
+    def save_task(self, task: Dict):
+        """保存单个任务（任务中的枚举已转换为字符串）"""
+        with self.lock:
+            data = self._load_json(self.files['tasks'])
+            if 'tasks' not in data:
+                data['tasks'] = {}
+            data['tasks'][task['id']] = task
+            self._atomic_write(self.files['tasks'], data)
+
+    def save_tasks(self, tasks: List[Dict]):
+        """批量保存任务（一次读取、一次写入）"""
+        with self.lock:
+            data = self._load_json(self.files['tasks'])
+            if 'tasks' not in data:
+                data['tasks'] = {}
+            for task in tasks:
+                data['tasks'][task['id']] = task
+            self._atomic_write(self.files['tasks'], data)
+
+    def delete_task(self, task_id: str) -> bool:
+        """删除单个任务"""
+        with self.lock:
+            data = self._load_json(self.files['tasks'])
+            if 'tasks' not in data or task_id not in data['tasks']:
+                return False
+            del data['tasks'][task_id]
+            self._atomic_write(self.files['tasks'], data)
+            return True
+
+    def get_recent_tasks(self, limit: int = 100) -> List[Dict]:
+        """获取最近的任务列表（最新的在前）"""
+        data = self._load_json(self.files['tasks'])
+        tasks = data.get('tasks', {})
+
+        task_list = []
+        for task_id, task_data in tasks.items():
+            task_copy = task_data.copy()
+            task_copy['id'] = task_id
+            task_list.append(task_copy)
+
+        task_list.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+        return task_list[:limit]
+
+    # 用户、站点、监控任务
+    def load_records(self, collection: str) -> List[Dict]:
+        """加载列表型数据"""
+        data = self._load_json(self.files[collection])
+        return data.get(collection, [])
+
+    def save_record(self, collection: str, record: Dict):
+        """保存列表型数据中的一条记录（存在则更新，否则追加）"""
+        with self.lock:
+            data = self._load_json(self.files[collection])
+            if collection not in data:
+                data[collection] = []
+
+            # 查找并更新或添加
+            updated = False
+            for i, existing in enumerate(data[collection]):
+                if existing['id'] == record['id']:
+                    data[collection][i] = record
+                    updated = True
+                    break
+
+            if not updated:
+                data[collection].append(record)
+                counter_key = f"{collection[:-1]}_counter"
+                if counter_key not in data:
+                    data[counter_key] = 0
+                data[counter_key] += 1
+
+            self._atomic_write(self.files[collection], data)
+
+    def delete_record(self, collection: str, record_id: str) -> bool:
+        """删除列表型数据中的一条记录"""
+        with self.lock:
+            data = self._load_json(self.files[collection])
+            records = data.get(collection, [])
+            remaining = [r for r in records if r['id'] != record_id]
+            if len(remaining) == len(records):
+                return False
+            data[collection] = remaining
+            self._atomic_write(self.files[collection], data)
+            return True
+
+    # 监控状态
+    def _monitor_state_file(self, monitor_id: str) -> str:
+        return os.path.join(self.monitor_state_dir, f"{monitor_id}.json")
+
+    def load_monitor_state(self, monitor_id: str) -> Optional[Dict]:
+        """加载监控状态，尚未保存过时返回None"""
+        try:
+            with open(self._monitor_state_file(monitor_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save_monitor_state(self, monitor_id: str, state: Dict):
+        """保存监控状态（紧凑格式，临时文件+重命名）"""
+        path = self._monitor_state_file(monitor_id)
+        os.makedirs(self.monitor_state_dir, exist_ok=True)
+        temp_file = f"{path}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_file, path)
+
+    def delete_monitor_state(self, monitor_id: str):
+        """删除监控状态"""
+        try:
+            os.remove(self._monitor_state_file(monitor_id))
+        except FileNotFoundError:
+            pass
+
+    def list_monitor_states(self) -> List[str]:
+        """已保存状态的监控ID"""
+        if not os.path.isdir(self.monitor_state_dir):
+            return []
+        return [name[:-5] for name in os.listdir(self.monitor_state_dir) if name.endswith('.json')]
+
+    def next_id(self, data_type: str) -> str:
+        """获取下一个ID"""
+        with self.lock:
+            data = self._load_json(self.files[data_type])
+            counter_key = f"{data_type[:-1]}_counter"  # users -> user_counter
+
+            if counter_key not in data:
+                data[counter_key] = 0
+
+            data[counter_key] += 1
+            next_id = f"{data_type[:-1]}_{data[counter_key]:06d}"
+
+            self._atomic_write(self.files[data_type], data)
+            return next_id
+
+    def backup(self, backup_dir: str):
+        """备份所有数据文件到指定目录"""
+        for filename, filepath in self.files.items():
+            if os.path.exists(filepath):
+                shutil.copy2(filepath, f"{backup_dir}/{filename}.json")
+        if os.path.isdir(self.monitor_state_dir):
+            shutil.copytree(self.monitor_state_dir, f"{backup_dir}/monitor_signatures",
+                            ignore=shutil.ignore_patterns('*.tmp'))
+
+    def close(self):
+        """关闭存储后端"""
+        pass
+
+
+class SQLiteStorage:
+    """SQLite存储后端 - WAL模式，单条记录增量写入，按状态/创建者/创建时间建立索引"""
+
+    TABLES = ('tasks', 'sites', 'users', 'monitors')
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.lock = threading.RLock()
+        self.created = not os.path.exists(db_path)
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._create_schema()
+
+    def _connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self.local.conn = conn
+        return conn
+
+    def _create_schema(self):
+        """创建数据表和索引"""
+        conn = self._connection()
+        with conn:
+            for table in self.TABLES:
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        id TEXT PRIMARY KEY,
+                        status TEXT,
+                        created_by TEXT,
+                        created_at TEXT,
+                        data TEXT NOT NULL
+                    )
+                ''')
+                for column in ('status', 'created_by', 'created_at'):
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{column} '
+                                 f'ON {table}({column})')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS monitor_states (
+                    id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            ''')
+
+    def initialize(self, default_data: Dict):
+        """初始化默认数据（仅在对应表为空时写入）"""
+        conn = self._connection()
+        for collection in RECORD_COLLECTIONS:
+            count = conn.execute(f'SELECT COUNT(*) FROM {collection}').fetchone()[0]
+            if count == 0:
+                for record in default_data[collection].get(collection, []):
+                    self.save_record(collection, record)
+
+    def _upsert(self, conn: sqlite3.Connection, table: str, record: Dict):
+        """插入或更新一条记录（保留原有行号以维持插入顺序）"""
+        conn.execute(f'''
+            INSERT INTO {table} (id, status, created_by, created_at, data)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                status = excluded.status,
+                created_by = excluded.created_by,
+                created_at = excluded.created_at,
+                data = excluded.data
+        ''', (
+            record['id'],
+            record.get('status'),
+            record.get('created_by'),
+            record.get('created_at'),
+            json.dumps(record, ensure_ascii=False)
+        ))
+
+    def _get_counter(self, conn: sqlite3.Connection, name: str) -> int:
+        row = conn.execute('SELECT value FROM counters WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else 0
+
+    def _increment_counter(self, conn: sqlite3.Connection, name: str) -> int:
+        conn.execute('''
+            INSERT INTO counters (name, value) VALUES (?, 1)
+            ON CONFLICT(name) DO UPDATE SET value = value + 1
+        ''', (name,))
+        return self._get_counter(conn, name)
+
+    def set_counter(self, name: str, value: int):
+        """设置计数器（导入数据时使用）"""
+        conn = self._connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO counters (name, value) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)
+            ''', (name, value))
+
+    # 任务
+    def load_tasks(self) -> Dict:
+        """加载所有任务"""
+        conn = self._connection()
+        tasks = {}
+        for task_id, data in conn.execute('SELECT id, data FROM tasks ORDER BY rowid'):
+            tasks[task_id] = json.loads(data)
+        return {'tasks': tasks, 'task_counter': self._get_counter(conn, 'task_counter')}
+
+    def save_task(self, task: Dict):
+        """保存单个任务（任务中的枚举已转换为字符串）"""
+        conn = self._connection()
+        with conn:
+            self._upsert(conn, 'tasks', task)
+
+    def save_tasks(self, tasks: List[Dict]):
+        """批量保存任务（单个事务）"""
+        conn = self._connection()
+        with conn:
+            for task in tasks:
+                self._upsert(conn, 'tasks', task)
+
+    def delete_task(self, task_id: str) -> bool:
+        """删除单个任务"""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+        return cursor.rowcount > 0
+
+    def get_recent_tasks(self, limit: int = 100) -> List[Dict]:
+        """获取最近的任务列表（最新的在前，使用created_at索引）"""
+        conn = self._connection()
+        rows = conn.execute('SELECT id, data FROM tasks ORDER BY created_at DESC LIMIT ?',
+                            (limit,))
+        task_list = []
+        for task_id, data in rows:
+            task = json.loads(data)
+            task['id'] = task_id
+            task_list.append(task)
+        return task_list
+
+    # 用户、站点、监控任务
+    def load_records(self, collection: str) -> List[Dict]:
+        """加载列表型数据（按插入顺序）"""
+        conn = self._connection()
+        return [json.loads(data) for (data,) in
+                conn.execute(f'SELECT data FROM {collection} ORDER BY rowid')]
+
+    def save_record(self, collection: str, record: Dict):
+        """保存列表型数据中的一条记录（存在则更新，否则追加）"""
+        conn = self._connection()
+        with conn:
+            exists = conn.execute(f'SELECT 1 FROM {collection} WHERE id = ?',
+                                  (record['id'],)).fetchone()
+            self._upsert(conn, collection, record)
+            if not exists:
+                self._increment_counter(conn, f"{collection[:-1]}_counter")
+
+    def delete_record(self, collection: str, record_id: str) -> bool:
+        """删除列表型数据中的一条记录"""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(f'DELETE FROM {collection} WHERE id = ?', (record_id,))
+        return cursor.rowcount > 0
+
+    # 监控状态
+    def load_monitor_state(self, monitor_id: str) -> Optional[Dict]:
+        """加载监控状态，尚未保存过时返回None"""
+        row = self._connection().execute('SELECT data FROM monitor_states WHERE id = ?',
+                                         (monitor_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_monitor_state(self, monitor_id: str, state: Dict):
+        """保存监控状态"""
+        conn = self._connection()
+        with conn:
+            conn.execute('''
+                INSERT INTO monitor_states (id, data) VALUES (?, ?)
+                ON CONFLICT(id) DO UPDATE SET data = excluded.data
+            ''', (monitor_id, json.dumps(state, ensure_ascii=False, separators=(',', ':'))))
+
+    def delete_monitor_state(self, monitor_id: str):
+        """删除监控状态"""
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM monitor_states WHERE id = ?', (monitor_id,))
+
+    def next_id(self, data_type: str) -> str:
+        """获取下一个ID"""
+        counter_key = f"{data_type[:-1]}_counter"  # users -> user_counter
+        conn = self._connection()
+        with self.lock, conn:
+            value = self._increment_counter(conn, counter_key)
+        return f"{data_type[:-1]}_{value:06d}"
+
+    def backup(self, backup_dir: str):
+        """使用SQLite在线备份接口备份数据库"""
+        target = sqlite3.connect(f"{backup_dir}/{os.path.basename(self.db_path)}")
+        try:
+            self._connection().backup(target)
+        finally:
+            target.close()
+
+    def close(self):
+        """关闭当前线程的数据库连接"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+def create_storage(backend: str, data_dir: str, db_path: Optional[str] = None):
+    """根据配置创建存储后端"""
+    if backend == 'sqlite':
+        return SQLiteStorage(db_path or f"{data_dir}/ftp_web.db")
+    if backend == 'json':
+        return JSONStorage(data_dir)
+    raise ValueError(f"不支持的存储后端: {backend}")
+
+
+def import_json_data(data_dir: str, storage: SQLiteStorage) -> Dict[str, int]:
+    """将现有JSON数据文件导入到SQLite存储（重复导入时按ID覆盖）"""
+    source = JSONStorage(data_dir)
+    counts = {}
+
+    # 任务
+    tasks_data = source.load_tasks()
+    tasks = tasks_data.get('tasks', {})
+    for task_id, task in tasks.items():
+        task = task.copy()
+        task.setdefault('id', task_id)
+        storage.save_task(task)
+    storage.set_counter('task_counter', tasks_data.get('task_counter', 0))
+    counts['tasks'] = len(tasks)
+
+    # 用户、站点、监控任务
+    for collection in RECORD_COLLECTIONS:
+        data = source._load_json(source.files[collection])
+        records = data.get(collection, [])
+        for record in records:
+            storage.save_record(collection, record)
+
+        # 保留原有计数器，避免新ID与已有记录冲突
+        counter_key = f"{collection[:-1]}_counter"
+        storage.set_counter(counter_key, data.get(counter_key, 0))
+        counts[collection] = len(records)
+
+    # 监控状态
+    counts['monitor_states'] = import_monitor_states(data_dir, storage)
+
+    print(f"JSON数据导入完成: {counts}")
+    return counts
+
+
+def import_monitor_states(data_dir: str, storage: SQLiteStorage, move: bool = False) -> int:
+    """将独立文件中的监控状态导入到SQLite存储（按ID覆盖）
+
+    move为True时（SQLite后端启动时使用）不覆盖数据库中已有的状态，导入后删除文件。
+    """
+    source = JSONStorage(data_dir)
+    imported = 0
+    for monitor_id in source.list_monitor_states():
+        if not move or storage.load_monitor_state(monitor_id) is None:
+            state = source.load_monitor_state(monitor_id)
+            if state is not None:
+                storage.save_monitor_state(monitor_id, state)
+                imported += 1
+        if move:
+            source.delete_monitor_state(monitor_id)
+    return imported
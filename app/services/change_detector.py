@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+变化检测 - 按文件大小和修改时间签名比较两次列目录结果
+"""
+
+import hashlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 签名: (大小, 修改时间YYYYMMDDHHMMSS)，旧版file_list迁移来的条目签名未知，大小为None
+Signature = Tuple[Optional[int], Optional[int]]
+
+
+def entry_signature(entry: Dict) -> Signature:
+    """根据列目录条目（MLSD的size/modify，或LIST解析结果）生成签名"""
+    modified = entry.get('modified')
+    mtime = None
+    if modified:
+        # ISO格式 YYYY-MM-DDTHH:MM:SS 去掉分隔符后作为整数比较，避免逐个解析日期
+        digits = modified[:19].replace('-', '').replace(':', '').replace('T', '')
+        if digits.isdigit():
+            mtime = int(digits)
+    return (entry.get('size'), mtime)
+
+
+def build_signatures(entries: Iterable[Dict], prefix: str = '') -> Dict[str, Signature]:
+    """生成 {文件名: 签名}，忽略目录"""
+    return {
+        prefix + entry['name']: entry_signature(entry)
+        for entry in entries if not entry['is_directory']
+    }
+
+
+def signature_changed(old: Signature, new: Signature) -> bool:
+    """大小变化，或两次都有修改时间且不同时视为已修改（签名未知的迁移条目不算修改）"""
+    old_size, old_mtime = old
+    new_size, new_mtime = new
+    if old_size is None:
+        return False
+    if old_size != new_size:
+        return True
+    return old_mtime is not None and new_mtime is not None and old_mtime != new_mtime
+
+
+def diff_signatures(known: Dict[str, Signature],
+                    current: Dict[str, Signature]) -> Tuple[Set[str], Set[str], Set[str]]:
+    """基于集合比较两次签名，返回 (新增, 修改, 删除) 的文件名集合"""
+    if known == current:
+        # 没有变化（最常见的情况），字典比较无需构造集合
+        return set(), set(), set()
+    added = current.keys() - known.keys()
+    deleted = known.keys() - current.keys()
+    # 签名不同的条目由集合运算筛出，只对这部分逐个判断
+    modified = {
+        name for name, signature in current.items() - known.items()
+        if name in known and signature_changed(known[name], signature)
+    }
+    return added, modified, deleted
+
+
+def migrate_file_list(file_list: List[str]) -> Dict[str, Signature]:
+    """将旧版只记录文件名的file_list转换为签名未知的签名表"""
+    return {name: (None, None) for name in file_list}
+
+
+def utc_mtimes(entries: Iterable[Dict]) -> bool:
+    """列目录结果中文件的修改时间是否都是UTC（MLSD的modify）；LIST解析的修改时间是服务器本地时间且只精确到分钟"""
+    return all(entry.get('modified_utc') for entry in entries if not entry['is_directory'])
+
+
+def select_stable(candidates: Iterable[str], current: Dict[str, Signature], pending: Dict[str, List],
+                  stable_listings: int, stable_age: float, now: datetime, mtimes_utc: bool = False,
+                  listed_at: Optional[float] = None) -> Set[str]:
+    """静止规则：返回可以下载的文件，其余记入pending {文件名: [大小, 修改时间, 连续相同次数, 列出时间]}
+
+    签名在连续stable_listings次列目录中保持不变，或修改时间早于now（UTC）超过stable_age秒（0表示不按时间判断）
+    的文件视为已写入完成。按时间判断只用于mtimes_utc（MLSD/MLST得到的UTC修改时间），LIST得到的本地时间
+    无法与UTC比较，只按列目录次数判断。listed_at为本次列表的列出时间，不比pending中记录的更新时
+    （同一份缓存的列表）不计数。pending随监控状态保存，不需要额外的服务器请求。不在候选中的pending条目被移除。
+    """
+    if not mtimes_utc:
+        stable_age = 0
+    stable = set()
+    waiting = {}
+    for name in candidates:
+        size, mtime = current[name]
+        previous = pending.get(name)
+        if previous and (previous[0], previous[1]) == (size, mtime):
+            previous_listed_at = previous[3] if len(previous) > 3 else None
+            if listed_at is not None and previous_listed_at is not None and listed_at <= previous_listed_at:
+                # 同一份列表，不是新的观察
+                count, observed_at = previous[2], previous_listed_at
+            else:
+                count, observed_at = previous[2] + 1, listed_at
+        else:
+            count, observed_at = 1, listed_at
+        if count >= stable_listings or _older_than(mtime, stable_age, now):
+            stable.add(name)
+        else:
+            waiting[name] = [size, mtime, count, observed_at]
+    pending.clear()
+    pending.update(waiting)
+    return stable
+
+
+def _older_than(mtime: Optional[int], age: float, now: datetime) -> bool:
+    if not age or mtime is None:
+        return False
+    try:
+        modified = datetime.strptime(str(mtime), '%Y%m%d%H%M%S')
+    except ValueError:
+        return False
+    return (now - modified).total_seconds() >= age
+
+
+def settled_mtime(mtime: Optional[int], now: datetime, margin: float = 2.0) -> Optional[int]:
+    """目录修改时间距now（UTC）不足margin秒时返回None：修改时间精度为秒，同一秒内的后续增删不会改变它，
+    这样的目录不记录修改时间，下次检查时仍需列出"""
+    return mtime if _older_than(mtime, margin, now) else None
+
+
+def listing_hash(entries: Iterable[Dict]) -> str:
+    """目录列表的摘要（名称、类型和签名），用于判断递归监控中的目录内容是否变化"""
+    items = sorted((entry['name'], entry['is_directory'], *entry_signature(entry)) for entry in entries)
+    return hashlib.sha1(repr(items).encode('utf-8')).hexdigest()[:16]
+
+
+def parent_directories(path: str) -> List[str]:
+    """相对路径的所有上级目录（不含根目录），如 a/b/c.txt -> [a, a/b]"""
+    parts = path.split('/')[:-1]
+    return ['/'.join(parts[:i]) for i in range(1, len(parts) + 1)]
+
+
+def in_directories(path: str, directories: Set[str], include_self: bool = False) -> bool:
+    """路径是否位于directories中某个目录之下（include_self时目录本身也算）"""
+    if not directories:
+        return False
+    if include_self and path in directories:
+        return True
+    return any(parent in directories for parent in parent_directories(path))
@@ -11,19 +11,25 @@ from datetime import datetime
 from typing import Dict, Optional
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from app.core.connection_pool import FTPConnectionPool
+
 
 class ConnectionTestService:
     """连接测试服务"""
     
-    def __init__(self, data_manager, max_concurrent_tests=5):
+    def __init__(self, data_manager, max_concurrent_tests=5, connection_pool=None, test_timeout=10):
         """
         初始化连接测试服务
         
         Args:
             data_manager: 数据管理器实例
             max_concurrent_tests: 最大并发测试数
+            connection_pool: FTP连接池实例
+            test_timeout: 连接测试超时时间（秒）
         """
         self.data_manager = data_manager
+        self.connection_pool = connection_pool or FTPConnectionPool()
+        self.test_timeout = test_timeout
         self.max_concurrent_tests = max_concurrent_tests
         self.executor = ThreadPoolExecutor(max_workers=max_concurrent_tests, thread_name_prefix="ConnectionTest")
         self.active_tests = {}  # site_id -> future
@@ -77,40 +83,19 @@ class ConnectionTestService:
             print(f"开始执行站点连接测试: {site_id}")
             start_time = time.time()
             
-            # 导入FTP客户端
-            from app.core.ftp_client import FTPClient
-            
-            # 解密密码
-            password = self._decrypt_password(site_data.get('password', ''))
-            
-            # 创建FTP客户端并测试连接
-            ftp_client = FTPClient(
-                host=site_data['host'],
-                port=site_data['port'],
-                username=site_data.get('username', ''),
-                password=password
-            )
-            
-            # 尝试连接
-            success = ftp_client.connect()
+            # 使用独立的新连接测试登录（不占用也不等待池中的会话）
+            error_msg = self.connection_pool.check_login(site_data, timeout=self.test_timeout)
+            success = error_msg is None
             connection_time = time.time() - start_time
             
             # 更新站点状态
             if success:
                 status = 'connected'
-                error_msg = None
                 print(f"站点 {site_id} 连接成功，耗时 {connection_time:.2f}秒")
             else:
                 status = 'disconnected'
-                error_msg = ftp_client.last_error or "连接失败"
                 print(f"站点 {site_id} 连接失败: {error_msg}")
             
-            # 断开连接
-            try:
-                ftp_client.disconnect()
-            except:
-                pass
-            
             # 更新站点数据
             self._update_site_status(site_id, status, connection_time, error_msg)
             
@@ -137,14 +122,6 @@ class ConnectionTestService:
             with self.test_lock:
                 self.active_tests.pop(site_id, None)
     
-    def _decrypt_password(self, encrypted: str) -> str:
-        """解密密码"""
-        try:
-            import base64
-            return base64.b64decode(encrypted.encode()).decode()
-        except:
-            return encrypted
-    
     def _update_site_status(self, site_id: str, status: str, connection_time: Optional[float], error_msg: Optional[str]):
         """更新站点状态"""
         try:
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件夹传输引擎 - 生产者将文件放入队列，多个连接池会话并行传输
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from app.core.connection_pool import FTPConnectionPool
+from app.core.integrity import RunningDigest
+from app.core.tree_walker import RemoteTreeWalker
+
+
+class FolderTransferEngine:
+    """文件夹传输引擎基类 - 管理会话、传输队列、重试和运行统计"""
+
+    action = '传输'
+
+    def __init__(self, connection_pool: FTPConnectionPool, site_config: Dict,
+                 concurrency: int = 4, max_retries: int = 3, queue_size: int = 1000,
+                 task_id: Optional[str] = None):
+        self.connection_pool = connection_pool
+        self.site_config = site_config
+        self.task_id = task_id  # 所属任务（传输计入该任务的限速）
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.queue_size = queue_size
+
+        self.lock = threading.Lock()
+        self.file_queue = queue.Queue(maxsize=queue_size)
+        self.listing_done = threading.Event()
+        self.listing_error = None
+
+        # 运行统计
+        self.total_files = 0
+        self.queued_files = 0       # 本次需要传输的文件数
+        self.completed_files = []   # 本次完成的相对路径
+        self.failed_files = {}      # {相对路径: 错误信息}
+        self.transferred_bytes = 0
+
+    def _acquire_extra_sessions(self, count: int) -> List:
+        """借用额外会话，连接数不足时使用已借到的会话"""
+        sessions = []
+        while len(sessions) < count:
+            try:
+                sessions.append(self.connection_pool.acquire(self.site_config, timeout=5,
+                                                             task_id=self.task_id))
+            except Exception as e:
+                print(f"文件夹{self.action}借用额外会话失败，使用 {len(sessions) + 1} 个连接: {e}")
+                break
+        return sessions
+
+    def _run_threads(self, threads: List[threading.Thread]):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _result(self) -> Dict:
+        """汇总本次运行结果：列表完成且本次需要传输的文件都已完成或放弃时finished为True"""
+        finished = (self.listing_done.is_set() and
+                    len(self.completed_files) + len(self.failed_files) == self.queued_files)
+        return {
+            'finished': finished,
+            'total_files': self.total_files,
+            'completed_files': list(self.completed_files),
+            'failed_files': dict(self.failed_files),
+            'transferred_bytes': self.transferred_bytes
+        }
+
+    def _put(self, item, should_stop: Callable[[], bool]) -> bool:
+        """放入有界队列，队列满时等待，需要停止时返回False"""
+        while not should_stop():
+            try:
+                self.file_queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _transfer_file(self, session, rel_path: str, should_stop: Callable[[], bool]) -> Optional[str]:
+        """传输单个文件，成功返回None，失败返回错误信息（由子类实现）"""
+        raise NotImplementedError
+
+    def _before_retry(self, session):
+        """重试前的处理（子类可覆盖）"""
+        pass
+
+    def _transfer_worker(self, session, should_stop: Callable[[], bool],
+                         on_progress: Optional[Callable[['FolderTransferEngine'], None]]):
+        """传输线程：从队列取出文件并传输，失败时重试"""
+        try:
+            while not should_stop():
+                try:
+                    rel_path, size = self.file_queue.get(timeout=0.2)
+                except queue.Empty:
+                    if self.listing_done.is_set() and self.file_queue.empty():
+                        return
+                    continue
+
+                error = None
+                for attempt in range(self.max_retries + 1):
+                    if should_stop():
+                        return
+                    if attempt > 0:
+                        print(f"重试{self.action} ({attempt}/{self.max_retries}): {rel_path}")
+                        time.sleep(min(2 ** (attempt - 1), 10))
+                        if not session.connected:
+                            # 会话已失效，换一个新的会话
+                            self.connection_pool.release(session, discard=True)
+                            session = None
+                            try:
+                                session = self.connection_pool.acquire(self.site_config, task_id=self.task_id)
+                            except Exception as e:
+                                with self.lock:
+                                    self.failed_files[rel_path] = str(e)
+                                return
+                        self._before_retry(session)
+
+                    try:
+                        error = self._transfer_file(session, rel_path, should_stop)
+                    except Exception as e:
+                        error = str(e)
+
+                    if error is None:
+                        break
+
+                if should_stop():
+                    # 时间片用完时文件可能只传输了一部分，下个时间片续传
+                    return
+
+                with self.lock:
+                    if error is None:
+                        self.completed_files.append(rel_path)
+                        self.transferred_bytes += size
+                    else:
+                        print(f"{self.action}文件失败: {rel_path}: {error}")
+                        self.failed_files[rel_path] = error
+
+                if on_progress:
+                    on_progress(self)
+        finally:
+            if session is not None:
+                self.connection_pool.release(session)
+
+
+class FolderDownloadEngine(FolderTransferEngine):
+    """文件夹并行下载引擎 - 列表线程递归遍历远程目录并将文件放入有界队列，K个会话并行下载"""
+
+    action = '下载'
+
+    def __init__(self, connection_pool: FTPConnectionPool, site_config: Dict,
+                 concurrency: int = 4, max_retries: int = 3, queue_size: int = 1000,
+                 list_parallelism: int = 1, task_id: Optional[str] = None,
+                 verify_checksum: bool = False):
+        super().__init__(connection_pool, site_config, concurrency, max_retries, queue_size, task_id)
+        self.list_parallelism = list_parallelism
+        self.verify_checksum = verify_checksum  # 下载完成后校验完整性，失败的文件按重试次数重新下载
+
+    def run(self, remote_path: str, local_path: str, skip_files: Set[str],
+            should_stop: Callable[[], bool],
+            on_progress: Optional[Callable[['FolderTransferEngine'], None]] = None) -> Dict:
+        """执行下载直到全部完成或should_stop()返回True
+
+        skip_files为已完成（或已放弃）的相对路径，返回本次运行的汇总信息。
+        """
+        self.remote_path = remote_path
+        self.local_path = local_path
+
+        # 列表会话获取失败时直接抛出异常，列表完成后该会话也参与下载
+        list_session = self.connection_pool.acquire(self.site_config, task_id=self.task_id)
+        sessions = self._acquire_extra_sessions(self.concurrency - 1)
+
+        threads = [threading.Thread(
+            target=self._list_and_download,
+            args=(list_session, skip_files, should_stop, on_progress),
+            name="FolderLister", daemon=True
+        )]
+        threads.extend(
+            threading.Thread(
+                target=self._transfer_worker,
+                args=(session, should_stop, on_progress),
+                name=f"FolderWorker-{i + 1}", daemon=True
+            )
+            for i, session in enumerate(sessions)
+        )
+        self._run_threads(threads)
+
+        if self.listing_error:
+            raise Exception(f"列出远程目录失败: {self.listing_error}")
+
+        return self._result()
+
+    def _list_and_download(self, session, skip_files: Set[str], should_stop: Callable[[], bool],
+                           on_progress: Optional[Callable[['FolderTransferEngine'], None]]):
+        """列表线程：列出全部文件后转为下载线程"""
+        try:
+            self._list_files(session, skip_files, should_stop)
+        except Exception as e:
+            self.listing_error = str(e)
+            self.listing_done.set()
+            self.connection_pool.release(session, discard=True)
+            return
+
+        self._transfer_worker(session, should_stop, on_progress)
+
+    def _list_files(self, session, skip_files: Set[str], should_stop: Callable[[], bool]):
+        """遍历远程目录树，边遍历边将待下载文件放入队列"""
+        def on_entry(rel_path, entry):
+            if entry['is_directory']:
+                return True
+            with self.lock:
+                self.total_files += 1
+                if rel_path in skip_files:
+                    return True
+                self.queued_files += 1
+            return self._put((rel_path, entry.get('size', 0)), should_stop)
+
+        walker = RemoteTreeWalker(self.connection_pool, self.site_config,
+                                  parallelism=self.list_parallelism, task_id=self.task_id)
+        complete = walker.walk(self.remote_path, on_entry, should_stop=should_stop, session=session)
+
+        # 无法列出的子目录记为失败条目（以/结尾）
+        with self.lock:
+            for rel_dir, error in walker.get_errors().items():
+                self.failed_files[f"{rel_dir}/"] = error
+                self.queued_files += 1
+
+        if complete:
+            self.listing_done.set()
+
+    def _transfer_file(self, session, rel_path: str, should_stop: Callable[[], bool]) -> Optional[str]:
+        remote_file_path = f"{self.remote_path.rstrip('/')}/{rel_path}"
+        local_file_path = os.path.join(self.local_path, *rel_path.split('/'))
+        algorithm = session.preferred_hash_algorithm() if self.verify_checksum else None
+        hasher = RunningDigest(algorithm) if algorithm else None
+        success = session.download_file(
+            remote_file_path, local_file_path,
+            progress_callback=lambda *_: not should_stop(),
+            hasher=hasher,
+            verify_prefix=self.verify_checksum
+        )
+        if not success:
+            return session.last_error or "下载失败"
+
+        # 中止的下载没有生成目标文件，下个时间片续传后再校验
+        if self.verify_checksum and os.path.exists(local_file_path):
+            result = session.verify_download(remote_file_path, local_file_path, algorithm,
+                                             hasher.hexdigest() if hasher else None)
+            if not result['verified']:
+                os.remove(local_file_path)
+                return f"完整性校验失败({result['method']})"
+        return None
+
+
+class FolderUploadEngine(FolderTransferEngine):
+    """文件夹并行上传引擎 - 按上传清单预先创建远程目录，K个会话并行上传"""
+
+    action = '上传'
+
+    @staticmethod
+    def build_manifest(local_path: str) -> Dict:
+        """扫描本地文件夹生成上传清单（相对路径统一使用/分隔，父目录排在子目录之前）"""
+        files = []
+        directories = []
+        for root, dirs, names in os.walk(local_path):
+            dirs.sort()
+            rel_root = os.path.relpath(root, local_path).replace(os.sep, '/')
+            if rel_root != '.':
+                directories.append(rel_root)
+            for name in sorted(names):
+                rel_path = name if rel_root == '.' else f"{rel_root}/{name}"
+                try:
+                    size = os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    continue
+                files.append([rel_path, size])
+        return {'files': files, 'directories': directories}
+
+    def run(self, local_path: str, remote_path: str, manifest: Dict, skip_files: Set[str],
+            should_stop: Callable[[], bool],
+            on_progress: Optional[Callable[['FolderTransferEngine'], None]] = None,
+            directories_ready: bool = False) -> Dict:
+        """按清单上传直到全部完成或should_stop()返回True
+
+        directories_ready为True表示远程目录已在之前的时间片中创建，
+        返回结果中的directories_ready供调用方保存到检查点。
+        """
+        self.local_path = local_path
+        self.remote_path = remote_path.rstrip('/') or '/'
+
+        main_session = self.connection_pool.acquire(self.site_config, task_id=self.task_id)
+
+        # 先用一个会话按层级创建全部远程目录，之后各上传线程不再逐级检查目录
+        try:
+            if not directories_ready:
+                base = self.remote_path.rstrip('/')
+                for rel_dir in [''] + manifest['directories']:
+                    if should_stop():
+                        break
+                    remote_dir = f"{base}/{rel_dir}" if rel_dir else self.remote_path
+                    if not main_session.ensure_remote_directory(remote_dir):
+                        raise Exception(f"无法创建远程目录: {remote_dir}")
+                else:
+                    directories_ready = True
+        except Exception:
+            self.connection_pool.release(main_session, discard=not main_session.connected)
+            raise
+
+        sessions = [main_session]
+        if directories_ready:
+            sessions.extend(self._acquire_extra_sessions(self.concurrency - 1))
+            # 目录已由主会话创建，其他会话共享已知目录
+            for session in sessions[1:]:
+                session.known_directories.update(main_session.known_directories)
+
+            # 清单已在内存中，使用不限长度的队列
+            self.file_queue = queue.Queue()
+            for rel_path, size in manifest['files']:
+                self.total_files += 1
+                if rel_path not in skip_files:
+                    self.queued_files += 1
+                    self.file_queue.put((rel_path, size))
+            self.listing_done.set()
+
+        threads = [
+            threading.Thread(
+                target=self._transfer_worker,
+                args=(session, should_stop, on_progress),
+                name=f"FolderUploader-{i + 1}", daemon=True
+            )
+            for i, session in enumerate(sessions)
+        ]
+        self._run_threads(threads)
+
+        result = self._result()
+        result['directories_ready'] = directories_ready
+        return result
+
+    def _before_retry(self, session):
+        # 远程目录可能已被删除，重试前清空已知目录缓存
+        session.known_directories.clear()
+
+    def _transfer_file(self, session, rel_path: str, should_stop: Callable[[], bool]) -> Optional[str]:
+        local_file_path = os.path.join(self.local_path, *rel_path.split('/'))
+        remote_file_path = f"{self.remote_path.rstrip('/')}/{rel_path}"
+        success = session.upload_file(
+            local_file_path, remote_file_path,
+            progress_callback=lambda *_: not should_stop()
+        )
+        return None if success else (session.last_error or "上传失败")
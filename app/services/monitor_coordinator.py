@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监控协调器 - 同一站点的文件夹监控共享列目录结果
+"""
+
+import ftplib
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.core.connection_pool import FTPConnectionPool
+
+
+class MonitorCoordinator:
+    """监控协调器 - 按站点分组即将到期的监控，每个周期每个目录只列一次
+
+    某个监控需要列目录时，借用一个会话把同一站点在share_window秒内到期的所有监控目录一起列出，
+    结果缓存share_window秒，其他监控（包括监控同一目录的多个监控）直接使用缓存，
+    列目录次数随目录数而不是监控数增长。每个监控只使用比它上次使用过的结果更新的缓存，
+    否则重新列出，同一个监控不会两次得到同一份列表。share_window应小于监控的最小检查间隔。
+    """
+
+    def __init__(self, connection_pool: FTPConnectionPool, scheduler, share_window: float = 20):
+        self.connection_pool = connection_pool
+        self.scheduler = scheduler
+        self.share_window = share_window
+
+        self.lock = threading.Lock()
+        self.site_locks = {}  # {site_id: Lock} 同一站点同一时间只有一个监控在列目录
+        self.listings = {}    # {(site_id, 目录): {'entries', 'error', 'listed_at'}}
+        self.consumed = {}    # {(task_id, site_id, 目录): listed_at} 每个监控上次使用的列表时间
+
+        # 统计信息
+        self.stats = {
+            'cycles': 0,         # 借用会话批量列目录的次数
+            'listings': 0,       # 实际列出的目录数
+            'shared_hits': 0     # 使用其他监控列出结果的次数
+        }
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return path.rstrip('/') or '/'
+
+    def _site_lock(self, site_id) -> threading.Lock:
+        with self.lock:
+            return self.site_locks.setdefault(site_id, threading.Lock())
+
+    def get_listing(self, site_config: Dict, remote_path: str,
+                    task_id: Optional[str] = None) -> Tuple[List[Dict], float]:
+        """获取目录列表，返回 (条目, 列出时间)；本周期内已由其他监控列出时直接返回，目录无法列出时抛出异常"""
+        site_id = site_config['id']
+        key = (site_id, self._normalize(remote_path))
+
+        with self._site_lock(site_id):
+            listing = self._fresh_listing(key, task_id)
+            if listing is None:
+                self._list_due_directories(site_config, key[1], task_id)
+                listing = self.listings[key]
+            else:
+                with self.lock:
+                    self.stats['shared_hits'] += 1
+            self._consume(key, task_id, listing)
+
+        if listing['error']:
+            raise Exception(f"列出目录失败 {remote_path}: {listing['error']}")
+        return listing['entries'], listing['listed_at']
+
+    def list_directory(self, client, site_config: Dict, remote_path: str,
+                       task_id: Optional[str] = None) -> Tuple[List[Dict], float]:
+        """使用调用方已借用的会话列出目录（递归监控遍历子目录），返回 (条目, 列出时间)，本周期内已由其他监控列出时直接返回缓存
+
+        目录不存在或无权限时抛出ftplib.error_perm，与会话的list_entries一致。
+        """
+        site_id = site_config['id']
+        key = (site_id, self._normalize(remote_path))
+        listing = self._fresh_listing(key, task_id)
+        if listing is None:
+            self._list_one(client, site_id, key[1])
+            with self.lock:
+                listing = self.listings[key]
+        else:
+            with self.lock:
+                self.stats['shared_hits'] += 1
+        self._consume(key, task_id, listing)
+
+        if listing['error']:
+            raise ftplib.error_perm(listing['error'])
+        return listing['entries'], listing['listed_at']
+
+    def _fresh_listing(self, key, task_id: Optional[str] = None) -> Optional[Dict]:
+        """共享窗口内且比task_id上次使用的结果更新的缓存"""
+        with self.lock:
+            listing = self.listings.get(key)
+            consumed = self.consumed.get((task_id,) + key) if task_id is not None else None
+        if not listing or time.time() - listing['listed_at'] >= self.share_window:
+            return None
+        if consumed is not None and listing['listed_at'] <= consumed:
+            return None
+        return listing
+
+    def _consume(self, key, task_id: Optional[str], listing: Dict):
+        """记录监控使用过的列表"""
+        if task_id is not None:
+            with self.lock:
+                self.consumed[(task_id,) + key] = listing['listed_at']
+
+    def _due_directories(self, site_id, now: float) -> List[str]:
+        """同一站点在共享窗口内到期的其他监控目录"""
+        deadline = now + self.share_window
+        paths = set()
+        for task in self.scheduler.find_tasks('folder_monitor', site_id):
+            if task.get('status') == 'paused' or not task.get('remote_path'):
+                continue
+            next_execution = task.get('next_execution')
+            if next_execution:
+                try:
+                    if datetime.fromisoformat(next_execution).timestamp() > deadline:
+                        continue
+                except ValueError:
+                    pass
+            paths.add(self._normalize(task['remote_path']))
+        return sorted(paths)
+
+    def _list_due_directories(self, site_config: Dict, remote_path: str, task_id: Optional[str]):
+        """借用一个会话，先列出请求的目录，再顺带列出同一站点即将到期的其他监控目录"""
+        site_id = site_config['id']
+        now = time.time()
+        others = [
+            path for path in self._due_directories(site_id, now)
+            if path != remote_path and self._fresh_listing((site_id, path)) is None
+        ]
+
+        client = self.connection_pool.acquire(site_config, task_id=task_id)
+        failed = False
+        try:
+            with self.lock:
+                self.stats['cycles'] += 1
+            # 请求的目录因会话失效而失败时异常直接抛出
+            self._list_one(client, site_id, remote_path)
+            for path in others:
+                try:
+                    self._list_one(client, site_id, path)
+                except Exception as e:
+                    # 会话失效，剩余目录由各自的监控自行列出
+                    print(f"批量列目录中断 {path}: {e}")
+                    failed = True
+                    break
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.connection_pool.release(client, discard=failed)
+
+        self._prune(now)
+        if others:
+            print(f"站点 {site_id} 批量列出 {len(others) + 1} 个监控目录")
+
+    def _list_one(self, client, site_id, path: str):
+        """列出单个目录并缓存结果，目录不存在或无权限时缓存错误"""
+        try:
+            entries, error = client.list_entries(path), None
+        except ftplib.error_perm as e:
+            entries, error = [], str(e)
+        with self.lock:
+            self.listings[(site_id, path)] = {'entries': entries, 'error': error, 'listed_at': time.time()}
+            self.stats['listings'] += 1
+
+    def _prune(self, now: float):
+        """清理过期的列表缓存"""
+        with self.lock:
+            expired = [
+                key for key, listing in self.listings.items()
+                if now - listing['listed_at'] >= self.share_window * 2
+            ]
+            for key in expired:
+                del self.listings[key]
+            # 对应的缓存已清理，之后的列表一定更新，不再需要记录
+            for key in [key for key, listed_at in self.consumed.items()
+                        if now - listed_at >= self.share_window * 2]:
+                del self.consumed[key]
+
+    def get_statistics(self) -> Dict:
+        with self.lock:
+            return {**self.stats, 'cached_directories': len(self.listings)}
+
+
+def next_poll_interval(previous: float, changes: int, pending: int, min_interval: float,
+                       max_interval: float, backoff: float = 2.0, burst_size: int = 10) -> float:
+    """自适应轮询间隔：没有变化时按backoff倍数逐步放慢，有变化时加快，一次出现大量变化或有文件
+    等待写入完成时直接使用最小间隔；结果限制在 [min_interval, max_interval]。
+    """
+    if pending or changes >= burst_size:
+        interval = min_interval
+    elif changes:
+        interval = previous / backoff
+    else:
+        interval = previous * backoff
+    return max(min_interval, min(max_interval, interval))
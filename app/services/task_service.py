@@ -4,19 +4,67 @@
 任务服务层 - 实现各种FTP任务函数
 """
 
+import errno
+import ftplib
 import os
+import queue
+import threading
 import time
 import glob
-from datetime import datetime
-from typing import Dict, List, Optional, Any
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Any, Tuple
 from app.core.ftp_client import FTPClient
+from app.core.connection_pool import FTPConnectionPool
+from app.core.integrity import RunningDigest, file_digest
+from app.services.folder_transfer import FolderDownloadEngine, FolderUploadEngine
+from app.services.change_detector import (build_signatures, diff_signatures, entry_signature, in_directories,
+                                          listing_hash, migrate_file_list, select_stable, settled_mtime,
+                                          utc_mtimes)
+from app.services.monitor_coordinator import MonitorCoordinator, next_poll_interval
 
 class TaskService:
     """任务服务 - 管理和执行各种FTP任务"""
     
-    def __init__(self, scheduler, data_manager):
+    def __init__(self, scheduler, data_manager, connection_pool=None,
+                 segmented_threshold: int = 64 * 1024 * 1024, segmented_streams: int = 4,
+                 folder_concurrency: int = 4, folder_retries: int = 3,
+                 folder_list_parallelism: int = 1, verify_checksum: bool = False,
+                 monitor_share_window: float = 20, monitor_stable_listings: int = 2,
+                 monitor_stable_age: float = 60, monitor_interval: int = 300,
+                 monitor_min_interval: int = 30, monitor_max_interval: int = 1800,
+                 monitor_full_scan_interval: float = 3600):
         self.scheduler = scheduler
         self.data_manager = data_manager
+        self.connection_pool = connection_pool or FTPConnectionPool()
+        
+        # 大文件分段多连接下载（需要os.pwrite按位置写入）
+        self.segmented_threshold = segmented_threshold
+        self.segmented_streams = segmented_streams
+        
+        # 文件夹并行传输
+        self.folder_concurrency = folder_concurrency
+        self.folder_retries = folder_retries
+        self.folder_list_parallelism = folder_list_parallelism
+        
+        # 下载完成后校验完整性（站点可通过verify_checksum覆盖）
+        self.verify_checksum = verify_checksum
+        self.download_digests = {}  # {task_id: RunningDigest} 时间片之间保留的下载摘要状态
+        
+        # 同一站点的文件夹监控共享列目录结果
+        self.monitor_coordinator = MonitorCoordinator(self.connection_pool, scheduler, monitor_share_window)
+        self.monitor_states = {}  # {monitor_id: {'signatures', 'pending', 'tree'}} 监控状态缓存
+        
+        # 静止规则：签名连续stable_listings次不变或修改时间早于stable_age秒的文件才下载（监控可单独设置）
+        self.monitor_stable_listings = monitor_stable_listings
+        self.monitor_stable_age = monitor_stable_age
+        
+        # 自适应轮询：默认检查间隔及上下限（监控可通过min_interval/max_interval单独设置）
+        self.monitor_interval = monitor_interval
+        self.monitor_min_interval = monitor_min_interval
+        self.monitor_max_interval = monitor_max_interval
+        
+        # 递归监控：修改时间未变化的目录不再列出，每隔该时间（秒）完整列出一次以发现原地改写的文件
+        self.monitor_full_scan_interval = monitor_full_scan_interval
     
     def register_all_functions(self):
         """注册所有任务函数"""
@@ -28,36 +76,35 @@ class TaskService:
         self.scheduler.register_function('connection_test', self.connection_test_task)
         print("所有任务函数注册完成")
     
+    def _apply_site_limits(self, site_config: Dict):
+        """按站点配置的max_tasks设置该站点同时执行的任务数上限
+
+        每个任务至少需要一个会话，上限不超过站点最大连接数（未限制时即为最大连接数），
+        避免准入的任务因连接池已满而等待。
+        """
+        max_connections = self.connection_pool.get_site_limit(site_config)
+        limit = site_config.get('max_tasks') or self.scheduler.max_tasks_per_site
+        self.scheduler.set_site_task_limit(site_config['id'], min(limit, max_connections) if limit else max_connections)
+
+    def _session_budget(self, site_config: Dict) -> int:
+        """单个任务可同时使用的会话数：站点最大连接数按同时执行的任务数均分（至少1个）
+
+        分段下载、文件夹并行传输等借用多个会话的任务按此限制，同一站点准入的其他任务总能借到会话。
+        """
+        max_connections = self.connection_pool.get_site_limit(site_config)
+        tasks = self.scheduler.get_site_task_limit(site_config['id']) or max_connections
+        return max(1, max_connections // tasks)
+
     def restore_unfinished_tasks(self):
         """恢复未完成的任务"""
         try:
+            for site_config in self.data_manager.load_sites():
+                self._apply_site_limits(site_config)
             tasks_data = self.data_manager.load_tasks()
             self.scheduler.restore_tasks(tasks_data)
         except Exception as e:
             print(f"恢复任务失败: {e}")
     
-    def create_ftp_client(self, site_config: Dict) -> FTPClient:
-        """创建FTP客户端"""
-        # 解密密码
-        encrypted_password = site_config.get('password', '')
-        password = self._decrypt_password(encrypted_password) if encrypted_password else ''
-
-        return FTPClient(
-            host=site_config['host'],
-            port=site_config.get('port', 21),
-            username=site_config.get('username', ''),
-            password=password,
-            timeout=site_config.get('timeout', 30)
-        )
-
-    def _decrypt_password(self, encrypted: str) -> str:
-        """解密密码"""
-        try:
-            import base64
-            return base64.b64decode(encrypted.encode()).decode()
-        except:
-            return encrypted
-
     def _validate_local_path(self, local_path: str) -> str:
         """验证并处理本地路径"""
         import os
@@ -128,28 +175,25 @@ class TaskService:
         checkpoint = task.get('checkpoint_data', {}) if task else {}
         start_byte = checkpoint.get('downloaded_bytes', 0)
 
-        # 创建FTP客户端
-        ftp_client = self.create_ftp_client(site_config)
-        
-        if not ftp_client.connect():
-            error_msg = ftp_client.last_error or "连接失败"
-            print(f"FTP连接失败: {error_msg}")
-            raise Exception(f"无法连接到FTP服务器: {error_msg}")
+        # 从连接池借用FTP会话
+        ftp_client = self.connection_pool.acquire(site_config, task_id=task_id)
 
-        print(f"FTP连接成功: {site_config['host']}:{site_config.get('port', 21)}")
+        print(f"获取FTP会话成功: {site_config['host']}:{site_config.get('port', 21)}")
         
         try:
             start_time = time.time()
+            digest = None
             
             def progress_callback(progress, downloaded, total):
-                # 检查是否超时
-                if time.time() - start_time >= time_slice:
+                # 检查是否超时或调度器要求让出
+                if scheduler.should_yield(task_id) or time.time() - start_time >= time_slice:
                     return False  # 停止传输
                 
                 # 更新进度
                 scheduler.update_task_progress(task_id, progress, {
                     'downloaded_bytes': downloaded,
                     'total_bytes': total,
+                    'digest_state': digest.state() if digest else None,
                     'last_update': datetime.now().isoformat()
                 })
                 return True
@@ -162,11 +206,36 @@ class TaskService:
             print(f"远程文件大小: {remote_size} 字节")
             print(f"开始下载: {remote_path} -> {local_file_path}")
 
+            verify = site_config.get('verify_checksum', self.verify_checksum)
+
+            # 大文件使用分段多连接下载（已开始的单连接下载继续单连接续传）
+            streams = min(site_config.get('download_streams') or self.segmented_streams,
+                          self._session_budget(site_config))
+            if self._use_segmented_download(checkpoint, local_file_path, remote_size, streams):
+                result = self._segmented_download(
+                    task_id, time_slice, scheduler, site_config, ftp_client,
+                    remote_path, local_file_path, remote_size, checkpoint, streams, verify
+                )
+                # 预分配失败时返回None，改用单连接顺序下载
+                if result is not None:
+                    return result
+
+            # 服务器支持哈希命令时边写入边计算本地摘要，否则完成后抽样比对
+            algorithm = ftp_client.preferred_hash_algorithm() if verify else None
+            if algorithm:
+                # 续传时从上个时间片（或检查点）的摘要状态继续，没有状态时才重新计算已下载部分
+                digest = self.download_digests.pop(task_id, None)
+                if digest is None or digest.algorithm != algorithm:
+                    digest = (RunningDigest.from_state(checkpoint.get('digest_state'), algorithm)
+                              or RunningDigest(algorithm))
+
             # 执行下载
             success = ftp_client.download_file(
                 remote_path, local_file_path,
                 progress_callback=progress_callback,
-                start_byte=start_byte
+                start_byte=start_byte,
+                hasher=digest,
+                verify_prefix=verify
             )
 
             print(f"下载结果: {success}")
@@ -175,21 +244,32 @@ class TaskService:
                 # 检查文件是否完整下载
                 if os.path.exists(local_file_path):
                     local_size = os.path.getsize(local_file_path)
-                    remote_size = ftp_client.get_file_size(remote_path)
 
-                    if remote_size and local_size >= remote_size:
+                    if local_size >= remote_size:
                         # 下载完成
+                        integrity = None
+                        if verify:
+                            integrity = self._verify_download(
+                                task_id, scheduler, ftp_client, remote_path, local_file_path,
+                                algorithm, digest.hexdigest() if digest else None
+                            )
                         self._log_transfer('download', {
                             'task_id': task_id,
                             'remote_path': remote_path,
                             'local_path': local_file_path,
                             'file_size': local_size,
+                            'integrity': integrity['method'] if integrity else None,
                             'status': 'completed'
                         })
                         return f"文件下载完成: {local_file_path}"
                     else:
                         # 部分下载，需要继续
                         return "TIMEOUT"
+                elif os.path.exists(f"{local_file_path}.part"):
+                    # 下载被中止，下个时间片从.part续传，保留摘要状态
+                    if digest is not None:
+                        self.download_digests[task_id] = digest
+                    return "TIMEOUT"
                 else:
                     raise Exception(f"下载失败，本地文件不存在: {local_file_path}")
             else:
@@ -197,8 +277,226 @@ class TaskService:
                 raise Exception(f"下载失败: {error_msg}")
                 
         finally:
-            ftp_client.disconnect()
+            self.connection_pool.release(ftp_client)
     
+    def _verify_download(self, task_id: str, scheduler, ftp_client: FTPClient, remote_path: str,
+                         local_file_path: str, algorithm: Optional[str] = None,
+                         local_digest: Optional[str] = None) -> Dict:
+        """校验下载完成的文件，结果写入检查点；校验失败时删除本地文件并抛出异常"""
+        if not ftp_client.ensure_connected():
+            raise Exception(f"完整性校验失败，FTP连接不可用: {ftp_client.last_error}")
+
+        result = ftp_client.verify_download(remote_path, local_file_path, algorithm, local_digest)
+        if result['verified']:
+            scheduler.update_task_progress(task_id, 100.0, {'integrity': result})
+            return result
+
+        os.remove(local_file_path)
+        scheduler.update_task_progress(task_id, 0, {
+            'integrity': result,
+            'downloaded_bytes': 0,
+            'segments': None
+        })
+        self._log_transfer('download', {
+            'task_id': task_id,
+            'remote_path': remote_path,
+            'local_path': local_file_path,
+            'integrity': result['method'],
+            'status': 'corrupted'
+        })
+        raise Exception(f"完整性校验失败({result['method']}): {remote_path}")
+
+    def _use_segmented_download(self, checkpoint: Dict, local_file_path: str,
+                                remote_size: int, streams: int) -> bool:
+        """判断是否使用分段下载"""
+        if not hasattr(os, 'pwrite'):
+            return False
+        if checkpoint.get('segments') and os.path.exists(f"{local_file_path}.part"):
+            return True
+        return (streams > 1 and remote_size >= self.segmented_threshold
+                and not os.path.exists(local_file_path)
+                and not os.path.exists(f"{local_file_path}.part"))
+
+    def _plan_segments(self, total_size: int, streams: int) -> List[Dict]:
+        """将文件划分为多个字节范围，position为该分段下一个待下载字节"""
+        segment_size = -(-total_size // streams)
+        segments = []
+        for start in range(0, total_size, segment_size):
+            end = min(start + segment_size, total_size)
+            segments.append({'start': start, 'end': end, 'position': start})
+        return segments
+
+    def _segmented_download(self, task_id: str, time_slice: float, scheduler, site_config: Dict,
+                            ftp_client: FTPClient, remote_path: str, local_file_path: str,
+                            remote_size: int, checkpoint: Dict, streams: int,
+                            verify: bool = False) -> Optional[str]:
+        """分段多连接下载：每个分段使用REST+RETR独立下载，按位置写入预分配的.part文件
+
+        预分配失败时删除.part文件并返回None，由调用方改用单连接顺序下载。
+        """
+        part_path = f"{local_file_path}.part"
+        segments = checkpoint.get('segments')
+
+        # 远程文件变化或临时文件丢失时重新规划分段
+        if (not segments or checkpoint.get('total_bytes') != remote_size
+                or not os.path.exists(part_path)):
+            segments = self._plan_segments(remote_size, streams)
+            fd = os.open(part_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                self._preallocate(fd, remote_size)
+            except OSError as e:
+                # 预分配失败（空间不足等），删除临时文件，由调用方改用单连接顺序下载
+                os.close(fd)
+                os.remove(part_path)
+                print(f"分段下载预分配失败，改用单连接下载: {e}")
+                return None
+            print(f"分段下载: {remote_path}，{len(segments)} 个分段")
+        else:
+            # 检查点中的分段列表不可原地修改，复制后使用
+            segments = [dict(segment) for segment in segments]
+            if verify:
+                # 抽样比对各分段已下载的部分，不一致的分段从头下载
+                for segment in segments:
+                    if (segment['position'] > segment['start'] and not ftp_client.compare_samples(
+                            remote_path, part_path, segment['start'], segment['position'])):
+                        print(f"分段 [{segment['start']}-{segment['end']}] 已下载部分不一致，重新下载")
+                        segment['position'] = segment['start']
+            fd = os.open(part_path, os.O_RDWR)
+            print(f"继续分段下载: {remote_path}")
+
+        try:
+            return self._download_segments(task_id, time_slice, scheduler, site_config, ftp_client, remote_path,
+                                           local_file_path, remote_size, segments, streams, verify, fd)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _preallocate(fd: int, size: int):
+        """预分配文件空间，文件系统不支持posix_fallocate时扩展文件大小（稀疏文件）"""
+        try:
+            os.posix_fallocate(fd, 0, size)
+        except AttributeError:
+            os.ftruncate(fd, size)
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                raise
+            os.ftruncate(fd, size)
+
+    def _download_segments(self, task_id: str, time_slice: float, scheduler, site_config: Dict,
+                           ftp_client: FTPClient, remote_path: str, local_file_path: str, remote_size: int,
+                           segments: List[Dict], streams: int, verify: bool, fd: int) -> str:
+        """使用多个连接下载各分段，按位置写入已打开的.part文件描述符fd（由调用方关闭）"""
+        part_path = f"{local_file_path}.part"
+        start_time = time.time()
+        lock = threading.Lock()
+        pending = queue.Queue()
+        for index, segment in enumerate(segments):
+            if segment['position'] < segment['end']:
+                pending.put(index)
+
+        errors = []
+        last_report = [0.0]
+        slice_bytes = [0]
+
+        def should_stop():
+            return scheduler.should_yield(task_id) or time.time() - start_time >= time_slice
+
+        def report_progress(force=False):
+            with lock:
+                now = time.time()
+                if not force and now - last_report[0] < 0.5:
+                    return
+                last_report[0] = now
+                downloaded = sum(segment['position'] - segment['start'] for segment in segments)
+                snapshot = [dict(segment) for segment in segments]
+            scheduler.update_task_progress(task_id, downloaded / remote_size * 100 if remote_size else 100.0, {
+                'downloaded_bytes': downloaded,
+                'total_bytes': remote_size,
+                'segments': snapshot,
+                'last_update': datetime.now().isoformat()
+            })
+
+        def worker(client, failed):
+            while not should_stop():
+                try:
+                    index = pending.get_nowait()
+                except queue.Empty:
+                    return
+                segment = segments[index]
+
+                def on_data(size):
+                    with lock:
+                        segment['position'] += size
+                        slice_bytes[0] += size
+                    report_progress()
+                    return not should_stop()
+
+                try:
+                    client.download_range(remote_path, fd, segment['position'], segment['end'], on_data)
+                except Exception as e:
+                    # 该连接失败，分段交给其他连接继续
+                    print(f"分段下载失败 [{segment['start']}-{segment['end']}]: {e}")
+                    errors.append(str(e))
+                    failed.append(client)
+                    pending.put(index)
+                    return
+
+        # 主会话之外再从连接池借用会话，连接数不足时使用已有会话
+        clients = [ftp_client]
+        wanted = min(streams, pending.qsize())
+        while len(clients) < wanted:
+            try:
+                clients.append(self.connection_pool.acquire(site_config, timeout=5, task_id=task_id))
+            except Exception as e:
+                print(f"分段下载借用额外会话失败，使用 {len(clients)} 个连接: {e}")
+                break
+
+        failed = []
+        try:
+            threads = [threading.Thread(target=worker, args=(client, failed), daemon=True)
+                       for client in clients]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            for client in clients[1:]:
+                self.connection_pool.release(client, discard=client in failed)
+            if ftp_client in failed:
+                ftp_client.disconnect()
+
+        report_progress(force=True)
+
+        if all(segment['position'] >= segment['end'] for segment in segments):
+            os.replace(part_path, local_file_path)
+            integrity = None
+            if verify:
+                # 分段按位置乱序写入，无法边写入边计算摘要，完成后对整个文件计算一次
+                algorithm = ftp_client.preferred_hash_algorithm() if ftp_client.ensure_connected() else None
+                local_digest = None
+                if algorithm:
+                    # 整个文件的摘要计算较耗CPU，配置了进程池时在子进程中执行
+                    local_digest = scheduler.run_stage(task_id, file_digest, local_file_path,
+                                                       remote_size, algorithm)
+                integrity = self._verify_download(task_id, scheduler, ftp_client, remote_path,
+                                                  local_file_path, algorithm, local_digest)
+            self._log_transfer('download', {
+                'task_id': task_id,
+                'remote_path': remote_path,
+                'local_path': local_file_path,
+                'file_size': remote_size,
+                'segments': len(segments),
+                'integrity': integrity['method'] if integrity else None,
+                'status': 'completed'
+            })
+            return f"文件下载完成: {local_file_path}"
+
+        if errors and slice_bytes[0] == 0:
+            raise Exception(f"分段下载失败: {errors[-1]}")
+
+        # 部分分段未完成，下一个时间片继续
+        return "TIMEOUT"
+
     def file_upload_task(self, task_id: str, time_slice: float, scheduler,
                         site_config: Dict, local_path: str, remote_path: str) -> str:
         """文件上传任务"""
@@ -212,19 +510,16 @@ class TaskService:
         checkpoint = task.get('checkpoint_data', {}) if task else {}
         start_byte = checkpoint.get('uploaded_bytes', 0)
         
-        # 创建FTP客户端
-        ftp_client = self.create_ftp_client(site_config)
-        
-        if not ftp_client.connect():
-            raise Exception(f"无法连接到FTP服务器: {ftp_client.last_error}")
+        # 从连接池借用FTP会话
+        ftp_client = self.connection_pool.acquire(site_config, task_id=task_id)
         
         try:
             start_time = time.time()
             local_size = os.path.getsize(local_path)
             
             def progress_callback(progress, uploaded, total):
-                # 检查是否超时
-                if time.time() - start_time >= time_slice:
+                # 检查是否超时或调度器要求让出
+                if scheduler.should_yield(task_id) or time.time() - start_time >= time_slice:
                     return False  # 停止传输
                 
                 # 更新进度
@@ -263,86 +558,87 @@ class TaskService:
                 raise Exception(f"上传失败: {ftp_client.last_error}")
                 
         finally:
-            ftp_client.disconnect()
+            self.connection_pool.release(ftp_client)
     
     def folder_download_task(self, task_id: str, time_slice: float, scheduler,
                            site_config: Dict, remote_path: str, local_path: str) -> str:
-        """文件夹下载任务"""
+        """文件夹下载任务（递归下载子目录，多个会话并行下载）"""
         print(f"开始文件夹下载任务: {remote_path} -> {local_path}")
         
         # 获取任务的检查点数据
         task = scheduler.get_task_status(task_id)
         checkpoint = task.get('checkpoint_data', {}) if task else {}
-        processed_files = checkpoint.get('processed_files', [])
+        processed_files = list(checkpoint.get('processed_files', []))
+        failed_files = dict(checkpoint.get('failed_files', {}))
+        transferred_bytes = checkpoint.get('transferred_bytes', 0)
         
-        # 创建FTP客户端
-        ftp_client = self.create_ftp_client(site_config)
+        start_time = time.time()
+        last_report = [0.0]
         
-        if not ftp_client.connect():
-            raise Exception(f"无法连接到FTP服务器: {ftp_client.last_error}")
+        def should_stop():
+            return scheduler.should_yield(task_id) or time.time() - start_time >= time_slice
         
-        try:
-            start_time = time.time()
-            
-            # 获取远程目录文件列表
-            files = ftp_client.list_directory(remote_path)
-            total_files = len([f for f in files if not f['is_directory']])
-            
-            if total_files == 0:
-                return "文件夹为空或无文件需要下载"
-            
-            downloaded_count = len(processed_files)
-            
-            for file_info in files:
-                # 检查时间片
-                if time.time() - start_time >= time_slice:
-                    return "TIMEOUT"
-                
-                if file_info['is_directory']:
-                    continue
-                
-                file_name = file_info['name']
-                if file_name in processed_files:
-                    continue
-                
-                remote_file_path = f"{remote_path.rstrip('/')}/{file_name}"
-                local_file_path = os.path.join(local_path, file_name)
-                
-                # 下载单个文件
-                success = ftp_client.download_file(remote_file_path, local_file_path)
-                
-                if success:
-                    processed_files.append(file_name)
-                    downloaded_count += 1
-                    
-                    # 更新进度
-                    progress = (downloaded_count / total_files) * 100
-                    scheduler.update_task_progress(task_id, progress, {
-                        'processed_files': processed_files,
-                        'downloaded_count': downloaded_count,
-                        'total_files': total_files
-                    })
-                else:
-                    print(f"下载文件失败: {remote_file_path}")
-            
-            if downloaded_count >= total_files:
-                self._log_transfer('folder_download', {
-                    'task_id': task_id,
-                    'remote_path': remote_path,
-                    'local_path': local_path,
-                    'file_count': downloaded_count,
-                    'status': 'completed'
-                })
-                return f"文件夹下载完成: {downloaded_count} 个文件"
-            else:
-                return "TIMEOUT"
-                
-        finally:
-            ftp_client.disconnect()
+        def report_progress(engine, force=False):
+            now = time.time()
+            if not force and now - last_report[0] < 0.5:
+                return
+            last_report[0] = now
+            with engine.lock:
+                done = processed_files + engine.completed_files
+                failed = {**failed_files, **engine.failed_files}
+                total_files = max(engine.total_files, len(done) + len(failed))
+                transferred = transferred_bytes + engine.transferred_bytes
+            progress = (len(done) + len(failed)) / total_files * 100 if total_files else 0
+            scheduler.update_task_progress(task_id, progress, {
+                'processed_files': done,
+                'failed_files': failed,
+                'downloaded_count': len(done),
+                'total_files': total_files,
+                'transferred_bytes': transferred
+            })
+        
+        # 并发会话数不超过该任务的会话配额（列目录的额外会话使用配额中剩余的部分）
+        budget = self._session_budget(site_config)
+        concurrency = min(site_config.get('transfer_concurrency') or self.folder_concurrency, budget)
+        engine = FolderDownloadEngine(
+            self.connection_pool, site_config,
+            concurrency=concurrency, max_retries=self.folder_retries,
+            list_parallelism=max(1, min(self.folder_list_parallelism, budget - concurrency + 1)), task_id=task_id,
+            verify_checksum=site_config.get('verify_checksum', self.verify_checksum)
+        )
+        result = engine.run(
+            remote_path, local_path,
+            skip_files=set(processed_files) | set(failed_files),
+            should_stop=should_stop,
+            on_progress=report_progress
+        )
+        report_progress(engine, force=True)
+        
+        if not result['finished']:
+            return "TIMEOUT"
+        
+        downloaded_count = len(processed_files) + len(result['completed_files'])
+        failed_count = len(failed_files) + len(result['failed_files'])
+        if downloaded_count == 0 and failed_count == 0:
+            return "文件夹为空或无文件需要下载"
+        if downloaded_count == 0:
+            raise Exception(f"文件夹下载失败: {failed_count} 个文件下载失败")
+        
+        self._log_transfer('folder_download', {
+            'task_id': task_id,
+            'remote_path': remote_path,
+            'local_path': local_path,
+            'file_count': downloaded_count,
+            'failed_count': failed_count,
+            'status': 'completed'
+        })
+        if failed_count:
+            return f"文件夹下载完成: {downloaded_count} 个文件，{failed_count} 个文件失败"
+        return f"文件夹下载完成: {downloaded_count} 个文件"
     
     def folder_upload_task(self, task_id: str, time_slice: float, scheduler,
                           site_config: Dict, local_path: str, remote_path: str) -> str:
-        """文件夹上传任务"""
+        """文件夹上传任务（按上传清单并行上传）"""
         print(f"开始文件夹上传任务: {local_path} -> {remote_path}")
         
         if not os.path.exists(local_path):
@@ -351,73 +647,82 @@ class TaskService:
         # 获取任务的检查点数据
         task = scheduler.get_task_status(task_id)
         checkpoint = task.get('checkpoint_data', {}) if task else {}
-        processed_files = checkpoint.get('processed_files', [])
+        processed_files = list(checkpoint.get('processed_files', []))
+        failed_files = dict(checkpoint.get('failed_files', {}))
+        transferred_bytes = checkpoint.get('transferred_bytes', 0)
         
-        # 创建FTP客户端
-        ftp_client = self.create_ftp_client(site_config)
+        # 上传清单只在第一个时间片生成，之后从检查点读取，不再重复扫描本地目录
+        manifest = checkpoint.get('manifest')
+        if not manifest:
+            manifest = FolderUploadEngine.build_manifest(local_path)
+            scheduler.update_task_progress(task_id, 0, {
+                'manifest': manifest,
+                'total_files': len(manifest['files'])
+            })
         
-        if not ftp_client.connect():
-            raise Exception(f"无法连接到FTP服务器: {ftp_client.last_error}")
+        total_files = len(manifest['files'])
+        if total_files == 0:
+            return "文件夹为空或无文件需要上传"
         
-        try:
-            start_time = time.time()
-            
-            # 获取本地文件列表
-            local_files = []
-            for root, dirs, files in os.walk(local_path):
-                for file in files:
-                    local_file_path = os.path.join(root, file)
-                    rel_path = os.path.relpath(local_file_path, local_path)
-                    local_files.append((local_file_path, rel_path))
-            
-            total_files = len(local_files)
-            if total_files == 0:
-                return "文件夹为空或无文件需要上传"
-            
-            uploaded_count = len(processed_files)
-            
-            for local_file_path, rel_path in local_files:
-                # 检查时间片
-                if time.time() - start_time >= time_slice:
-                    return "TIMEOUT"
-                
-                if rel_path in processed_files:
-                    continue
-                
-                remote_file_path = f"{remote_path.rstrip('/')}/{rel_path.replace(os.sep, '/')}"
-                
-                # 上传单个文件
-                success = ftp_client.upload_file(local_file_path, remote_file_path)
-                
-                if success:
-                    processed_files.append(rel_path)
-                    uploaded_count += 1
-                    
-                    # 更新进度
-                    progress = (uploaded_count / total_files) * 100
-                    scheduler.update_task_progress(task_id, progress, {
-                        'processed_files': processed_files,
-                        'uploaded_count': uploaded_count,
-                        'total_files': total_files
-                    })
-                else:
-                    print(f"上传文件失败: {local_file_path}")
-            
-            if uploaded_count >= total_files:
-                self._log_transfer('folder_upload', {
-                    'task_id': task_id,
-                    'local_path': local_path,
-                    'remote_path': remote_path,
-                    'file_count': uploaded_count,
-                    'status': 'completed'
-                })
-                return f"文件夹上传完成: {uploaded_count} 个文件"
-            else:
-                return "TIMEOUT"
-                
-        finally:
-            ftp_client.disconnect()
-
+        start_time = time.time()
+        last_report = [0.0]
+        
+        def should_stop():
+            return scheduler.should_yield(task_id) or time.time() - start_time >= time_slice
+        
+        def report_progress(engine, force=False, extra=None):
+            now = time.time()
+            if not force and now - last_report[0] < 0.5:
+                return
+            last_report[0] = now
+            with engine.lock:
+                done = processed_files + engine.completed_files
+                failed = {**failed_files, **engine.failed_files}
+                transferred = transferred_bytes + engine.transferred_bytes
+            scheduler.update_task_progress(task_id, (len(done) + len(failed)) / total_files * 100, {
+                'processed_files': done,
+                'failed_files': failed,
+                'uploaded_count': len(done),
+                'total_files': total_files,
+                'transferred_bytes': transferred,
+                **(extra or {})
+            })
+        
+        concurrency = min(site_config.get('transfer_concurrency') or self.folder_concurrency,
+                          self._session_budget(site_config))
+        engine = FolderUploadEngine(
+            self.connection_pool, site_config,
+            concurrency=concurrency, max_retries=self.folder_retries, task_id=task_id
+        )
+        result = engine.run(
+            local_path, remote_path, manifest,
+            skip_files=set(processed_files) | set(failed_files),
+            should_stop=should_stop,
+            on_progress=report_progress,
+            directories_ready=checkpoint.get('directories_ready', False)
+        )
+        report_progress(engine, force=True, extra={'directories_ready': result['directories_ready']})
+        
+        if not result['finished']:
+            return "TIMEOUT"
+        
+        uploaded_count = len(processed_files) + len(result['completed_files'])
+        failed_count = len(failed_files) + len(result['failed_files'])
+        if uploaded_count == 0:
+            raise Exception(f"文件夹上传失败: {failed_count} 个文件上传失败")
+        
+        self._log_transfer('folder_upload', {
+            'task_id': task_id,
+            'local_path': local_path,
+            'remote_path': remote_path,
+            'file_count': uploaded_count,
+            'failed_count': failed_count,
+            'status': 'completed'
+        })
+        if failed_count:
+            return f"文件夹上传完成: {uploaded_count} 个文件，{failed_count} 个文件失败"
+        return f"文件夹上传完成: {uploaded_count} 个文件"
+    
     def folder_monitor_task(self, task_id: str, time_slice: float, scheduler,
                            monitor_config: Dict) -> str:
         """文件夹监控任务 - 整体下载文件夹并监控新文件"""
@@ -438,56 +743,95 @@ class TaskService:
         os.makedirs(local_folder_path, exist_ok=True)
         print(f"本地文件夹路径: {local_folder_path}")
 
-        # 获取监控任务的历史文件列表
+        # 获取监控的文件签名表（从未保存过时为首次运行）
         monitor_id = monitor_config.get('monitor_id')
-        monitors = self.data_manager.load_monitors()
-
-        known_files = []
-        is_first_run = True
-        for monitor in monitors:
-            if monitor.get('id') == monitor_id:
-                known_files = monitor.get('file_list', [])
-                is_first_run = len(known_files) == 0
-                break
-
-        # 创建FTP客户端
-        ftp_client = self.create_ftp_client(site_config)
+        monitor = next((m for m in self.data_manager.load_monitors() if m.get('id') == monitor_id), None)
+        state = self._get_monitor_state(monitor_id, monitor)
+        known = state['signatures'] if state else None
+        previous_pending = state['pending'] if state else {}
+        previous_tree = (state or {}).get('tree') or {}
+        pending = dict(previous_pending)
+        # 首次运行的递归遍历暂停时已保存空签名表，由遍历进度记录是否为首次运行
+        is_first_run = known is None or (previous_tree.get('scan') or {}).get('first_run', False)
+        start_time = time.time()
 
-        if not ftp_client.connect():
-            raise Exception(f"无法连接到FTP服务器: {ftp_client.last_error}")
+        # 递归监控及遍历深度（监控记录中的设置可通过接口修改，优先使用）
+        recursive = (monitor or {}).get('recursive', monitor_config.get('recursive', False))
+        max_depth = (monitor or {}).get('max_depth', monitor_config.get('max_depth'))
+        tree = None
 
+        # 获取当前远程目录文件列表（同一站点的监控共享列目录结果）
         try:
-            # 获取当前远程目录文件列表
-            current_files = ftp_client.list_directory(remote_path)
-            current_file_names = [f['name'] for f in current_files if not f['is_directory']]
-
-            # 确定要下载的文件
-            files_to_download = []
-            if is_first_run:
-                # 首次运行：下载所有匹配的文件
-                print("首次运行，下载整个文件夹")
-                for file_name in current_file_names:
-                    import fnmatch
-                    if fnmatch.fnmatch(file_name, file_pattern):
-                        files_to_download.append(file_name)
+            if recursive:
+                scan = self._scan_monitor_tree(
+                    task_id, scheduler, site_config, remote_path, monitor_id, state, max_depth,
+                    should_stop=lambda: scheduler.should_yield(task_id) or time.time() - start_time >= time_slice
+                )
+                if scan is None:
+                    # 遍历在时间片边界暂停，游标已保存，下个时间片从游标继续
+                    return "TIMEOUT"
+                current, tree, mtimes_utc, listed_at = scan
             else:
-                # 后续运行：只下载新增的文件
-                print("监控模式，检查新增文件")
-                for file_name in current_file_names:
-                    if file_name not in known_files:
-                        import fnmatch
-                        if fnmatch.fnmatch(file_name, file_pattern):
-                            files_to_download.append(file_name)
+                entries, listed_at = self.monitor_coordinator.get_listing(site_config, remote_path, task_id)
+                current, mtimes_utc = build_signatures(entries), utc_mtimes(entries)
+        except Exception as e:
+            # 列目录失败不结束监控，按没有变化放慢检查，下次检查时重试（递归遍历从保存的游标继续）
+            print(f"监控列目录失败: {e}")
+            self._update_poll_interval(task_id, scheduler, monitor_config, monitor, 0, 0)
+            return f"RESCHEDULE:列目录失败，下次检查时重试: {e}"
+
+        # 确定要下载的文件（新增及大小/修改时间变化的文件）
+        import fnmatch
+        if is_first_run:
+            print("首次运行，下载整个文件夹")
+            added, modified, deleted = set(current), set(), set()
+        else:
+            print("监控模式，检查新增和修改的文件")
+            added, modified, deleted = diff_signatures(known, current)
+        candidates = [name for name in added | modified if fnmatch.fnmatch(name, file_pattern)]
+
+        # 静止规则：仍在写入的文件（签名尚未稳定且修改时间较新）暂不下载，记入pending等待下次检查
+        files_to_download = sorted(select_stable(
+            candidates, current, pending,
+            monitor_config.get('stable_listings', self.monitor_stable_listings),
+            monitor_config.get('stable_age', self.monitor_stable_age),
+            datetime.now(timezone.utc).replace(tzinfo=None),
+            mtimes_utc, listed_at
+        ))
+        if pending:
+            print(f"{len(pending)} 个文件仍在变化，等待写入完成后下载")
+        if deleted:
+            print(f"远程已删除 {len(deleted)} 个文件（保留本地文件）")
+
+        # 有文件需要下载时才借用FTP会话
+        ftp_client = None
+        failed_names = set()
+
+        def settle(unfinished):
+            """下载失败、尚未下载和等待写入完成的文件保留原签名（新文件不记录），下次检查时仍作为变化的文件处理；
+            递归监控中这些文件所在的目录不记录修改时间，下次检查时重新列出"""
+            signatures = current
+            for name in unfinished | failed_names | pending.keys():
+                if known and name in known:
+                    signatures[name] = known[name]
+                else:
+                    signatures.pop(name, None)
+                record = tree['directories'].get(name.rpartition('/')[0]) if tree is not None else None
+                if record:
+                    tree['directories'][name.rpartition('/')[0]] = [record[0], None]
+            return signatures
 
+        try:
             # 直接在监控任务中下载文件
             downloaded_files = 0
             failed_files = 0
-            start_time = time.time()
 
-            for file_name in files_to_download:
-                # 检查时间片
-                if time.time() - start_time >= time_slice:
-                    # 时间片用完，更新进度并返回TIMEOUT
+            for index, file_name in enumerate(files_to_download):
+                # 检查时间片（时间片包含遍历目录的时间，每个时间片至少处理一个文件）
+                attempted = downloaded_files + failed_files
+                if scheduler.should_yield(task_id) or (attempted and time.time() - start_time >= time_slice):
+                    # 时间片用完，保存已下载文件的签名，更新进度并返回TIMEOUT
+                    self._save_monitor_state(monitor_id, settle(set(files_to_download[index:])), pending, tree)
                     progress = (downloaded_files / len(files_to_download)) * 100 if files_to_download else 100
                     scheduler.update_task_progress(task_id, progress, {
                         'downloaded_files': downloaded_files,
@@ -498,22 +842,39 @@ class TaskService:
                     return "TIMEOUT"
 
                 remote_file_path = f"{remote_path.rstrip('/')}/{file_name}"
-                local_file_path = os.path.join(local_folder_path, file_name)
+                local_file_path = os.path.join(local_folder_path, *file_name.split('/'))
 
                 # 直接下载文件
                 try:
-                    success = ftp_client.download_file(remote_file_path, local_file_path)
+                    if ftp_client is None:
+                        ftp_client = self.connection_pool.acquire(site_config, task_id=task_id)
+                    if file_name in modified:
+                        # 同名文件被改写，删除旧的本地文件后重新下载（大小相同时不会被当作已存在而跳过）
+                        for stale_path in (local_file_path, f"{local_file_path}.part"):
+                            if os.path.exists(stale_path):
+                                os.remove(stale_path)
+                    success = ftp_client.download_file(
+                        remote_file_path, local_file_path,
+                        progress_callback=lambda *_: not scheduler.should_yield(task_id)
+                    )
+                    if scheduler.should_yield(task_id):
+                        self._save_monitor_state(monitor_id, settle(set(files_to_download[index:])), pending, tree)
+                        return "TIMEOUT"
                     if success:
                         downloaded_files += 1
                         if is_first_run:
                             print(f"首次下载文件成功: {file_name}")
+                        elif file_name in modified:
+                            print(f"监控下载修改的文件成功: {file_name}")
                         else:
                             print(f"监控下载新文件成功: {file_name}")
                     else:
                         failed_files += 1
+                        failed_names.add(file_name)
                         print(f"下载文件失败: {file_name}")
                 except Exception as e:
                     failed_files += 1
+                    failed_names.add(file_name)
                     print(f"下载文件异常: {file_name} - {e}")
 
                 # 更新进度
@@ -525,14 +886,25 @@ class TaskService:
                     'failed_files': failed_files
                 })
 
-            # 更新监控任务的文件列表
-            if files_to_download or is_first_run:
-                for monitor in monitors:
-                    if monitor.get('id') == monitor_id:
-                        monitor['file_list'] = current_file_names
-                        monitor['last_check'] = datetime.now().isoformat()
-                        self.data_manager.save_monitor(monitor)
-                        break
+            # 有变化、目录状态变化或刚从file_list迁移时保存状态
+            signatures = settle(set())
+            if (is_first_run or added or modified or deleted or pending != previous_pending
+                    or (monitor and 'file_list' in monitor) or (tree is not None and tree != previous_tree)):
+                self._save_monitor_state(monitor_id, signatures, pending, tree)
+
+                if monitor:
+                    monitor.pop('file_list', None)  # 旧版文件名列表已迁移到签名表
+                    monitor['file_count'] = len(signatures)
+                    monitor['last_changes'] = {
+                        'added': len(added), 'modified': len(modified), 'deleted': len(deleted)
+                    }
+                    monitor['last_check'] = datetime.now().isoformat()
+                    self.data_manager.save_monitor(monitor)
+
+            # 按本次发现的变化调整下次检查的间隔
+            next_interval = self._update_poll_interval(
+                task_id, scheduler, monitor_config, monitor, len(added) + len(modified), len(pending)
+            )
 
             # 记录监控日志
             self._log_monitor('folder_monitor', {
@@ -541,9 +913,15 @@ class TaskService:
                 'local_path': local_folder_path,
                 'is_first_run': is_first_run,
                 'files_to_download': len(files_to_download),
+                'pending_files': len(pending),
+                'new_files': len(added),
+                'modified_files': len(modified),
+                'deleted_files': len(deleted),
                 'downloaded_files': downloaded_files,
                 'failed_files': failed_files,
-                'total_files': len(current_file_names)
+                'total_files': len(current),
+                'directories': len(tree['directories']) if tree else None,
+                'next_interval': next_interval
             })
 
             # 文件夹监控任务需要持续运行，返回特殊状态
@@ -551,63 +929,198 @@ class TaskService:
             if is_first_run:
                 message = f"首次监控完成: 下载整个文件夹，成功 {downloaded_files} 个，失败 {failed_files} 个，共 {len(files_to_download)} 个文件"
             else:
-                message = f"监控完成: 发现 {len(files_to_download)} 个新文件，成功下载 {downloaded_files} 个，失败 {failed_files} 个"
+                message = (f"监控完成: 发现 {len(added)} 个新文件、{len(modified)} 个修改、{len(deleted)} 个删除，"
+                           f"成功下载 {downloaded_files} 个，失败 {failed_files} 个")
+            if pending:
+                message += f"，{len(pending)} 个文件等待写入完成"
 
             # 返回RESCHEDULE表示需要重新调度此任务（持续监控）
             return "RESCHEDULE:" + message
 
         finally:
-            ftp_client.disconnect()
+            if ftp_client is not None:
+                self.connection_pool.release(ftp_client)
+
+    def _update_poll_interval(self, task_id: str, scheduler, monitor_config: Dict, monitor: Optional[Dict],
+                              changes: int, pending: int) -> float:
+        """计算自适应轮询间隔并写入检查点的next_interval，调度器按该值重新调度
+
+        基准间隔取监控记录的check_interval（可通过接口修改），上下限可由监控的min_interval/max_interval设置。
+        """
+        monitor = monitor or {}
+        base = monitor.get('check_interval') or monitor_config.get('monitor_interval') or self.monitor_interval
+        min_interval = monitor.get('min_interval') or monitor_config.get('min_interval') or min(base, self.monitor_min_interval)
+        max_interval = monitor.get('max_interval') or monitor_config.get('max_interval') or max(base, self.monitor_max_interval)
+
+        task = scheduler.get_task_status(task_id)
+        previous = (task.get('checkpoint_data') or {}).get('next_interval') if task else None
+        interval = next_poll_interval(previous or base, changes, pending, min_interval, max_interval)
+        scheduler.update_task_progress(task_id, None, {'next_interval': interval})
+        return interval
+
+    def _scan_monitor_tree(self, task_id: str, scheduler, site_config: Dict, remote_path: str,
+                           monitor_id: Optional[str], state: Optional[Dict], max_depth: Optional[int],
+                           should_stop) -> Optional[Tuple[Dict, Dict, bool, Optional[float]]]:
+        """递归监控：遍历目录树，返回 (全部文件的签名表, 目录状态, 列出的修改时间是否都是UTC, 最早的列出时间)；
+        遍历暂停时保存游标并返回None
+
+        目录状态 {'directories': {相对目录: [列表摘要, 修改时间]}, 'full_scan_at': 上次完整遍历时间}。
+        已记录的目录先用MLST（只使用控制连接）获取修改时间，与记录相同时不再列出，沿用上次该目录中文件的签名，
+        子目录按各自的记录继续检查；服务器不提供目录修改时间时总是列出。目录修改时间只反映直接条目的增删，
+        文件原地改写由每monitor_full_scan_interval秒一次的完整遍历发现。
+        遍历进度（待检查目录的游标、已得到的签名等）保存在scan中，时间片用完或会话失效后从游标继续。
+        """
+        known = state['signatures'] if state else None
+        tree = (state or {}).get('tree') or {}
+        known_dirs = tree.get('directories', {}) if known is not None else {}
+        scan = tree.get('scan')
+        root = remote_path.rstrip('/')
+
+        # 已记录目录的子目录（目录未变化时不列出，按记录继续检查其子目录）
+        children = {}
+        for rel_dir in known_dirs:
+            if rel_dir:
+                children.setdefault(rel_dir.rpartition('/')[0], []).append(rel_dir)
+
+        def can_descend(depth):
+            return max_depth is None or depth < max_depth
+
+        def record_directory(rel_dir, depth, entries, mtime, listed_at):
+            prefix = f"{rel_dir}/" if rel_dir else ''
+            scan['signatures'].update(build_signatures(entries, prefix))
+            scan['mtimes_utc'] = scan.get('mtimes_utc', True) and utc_mtimes(entries)
+            scan['listed_at'] = min(scan.get('listed_at') or listed_at, listed_at)
+            now = datetime.now(timezone.utc).replace(tzinfo=None)
+            scan['directories'][rel_dir] = [listing_hash(entries), settled_mtime(mtime, now)]
+            if can_descend(depth):
+                scan['cursor'].extend(
+                    [prefix + entry['name'], depth + 1] for entry in entries if entry['is_directory']
+                )
+
+        if scan is None:
+            # 开始新一轮遍历，根目录由协调器列出（与同一站点的其他监控共享）
+            full_scan = not known_dirs or time.time() - (tree.get('full_scan_at') or 0) >= self.monitor_full_scan_interval
+            scan = {'cursor': [], 'signatures': {}, 'directories': {}, 'skipped': [], 'errors': [],
+                    'full_scan': full_scan, 'first_run': known is None, 'started_at': time.time()}
+            entries, listed_at = self.monitor_coordinator.get_listing(site_config, remote_path, task_id)
+            record_directory('', 0, entries, None, listed_at)
+        else:
+            print(f"从游标继续遍历: 已检查 {len(scan['directories'])} 个目录，剩余 {len(scan['cursor'])} 个")
+
+        client = None
+        failed = False
+        checked = 0
+        try:
+            while scan['cursor']:
+                # 每个时间片至少检查一个目录，保证遍历有进展
+                if checked and should_stop():
+                    # 时间片用完，保存遍历进度，下个时间片从游标继续
+                    self._save_monitor_state(monitor_id, known or {}, state['pending'] if state else {},
+                                             {**tree, 'scan': scan})
+                    scheduler.update_task_progress(task_id, None, {
+                        'scanned_directories': len(scan['directories']),
+                        'remaining_directories': len(scan['cursor'])
+                    })
+                    return None
+
+                rel_dir, depth = scan['cursor'][0]
+                dir_path = f"{root}/{rel_dir}"
+                if client is None:
+                    client = self.connection_pool.acquire(site_config, task_id=task_id)
+
+                mtime = entry_signature({'modified': client.get_modify_time(dir_path)})[1]
+                previous = known_dirs.get(rel_dir)
+                if not scan['full_scan'] and previous and mtime is not None and previous[1] == mtime:
+                    # 目录的直接条目没有增删，不再列出
+                    scan['directories'][rel_dir] = previous
+                    scan['skipped'].append(rel_dir)
+                    if can_descend(depth):
+                        scan['cursor'].extend([child, depth + 1] for child in children.get(rel_dir, []))
+                else:
+                    try:
+                        entries, listed_at = self.monitor_coordinator.list_directory(client, site_config, dir_path,
+                                                                                     task_id)
+                    except ftplib.error_perm as e:
+                        # 目录不存在或无权限，沿用上次的签名和子目录记录，不记录修改时间，下次检查时重试
+                        print(f"列出目录失败 {dir_path}: {e}")
+                        scan['errors'].append(rel_dir)
+                        scan['directories'][rel_dir] = [previous[0] if previous else None, None]
+                    else:
+                        record_directory(rel_dir, depth, entries, mtime, listed_at)
+                scan['cursor'].pop(0)
+                checked += 1
+        except Exception:
+            # 会话失效，保存遍历进度，下次检查时从游标继续
+            failed = True
+            self._save_monitor_state(monitor_id, known or {}, state['pending'] if state else {},
+                                     {**tree, 'scan': scan})
+            raise
+        finally:
+            if client is not None:
+                self.connection_pool.release(client, discard=failed)
+
+        # 未列出的目录沿用上次记录的签名（无法列出的目录包括其子目录的签名和目录记录）
+        skipped = set(scan['skipped'])
+        errors = set(scan['errors'])
+        current = scan['signatures']
+        for name, signature in (known or {}).items():
+            if name.rpartition('/')[0] in skipped or in_directories(name, errors):
+                current.setdefault(name, signature)
+        for rel_dir, record in known_dirs.items():
+            if in_directories(rel_dir, errors):
+                scan['directories'].setdefault(rel_dir, record)
+
+        changed = sum(
+            1 for rel_dir, record in scan['directories'].items()
+            if rel_dir not in skipped and rel_dir not in errors and known_dirs.get(rel_dir, [None])[0] != record[0]
+        )
+        print(f"递归遍历完成: 共 {len(scan['directories'])} 个目录，{len(skipped)} 个未变化未列出，"
+              f"{changed} 个有变化，{len(errors)} 个无法列出")
+        return current, {
+            'directories': scan['directories'],
+            'full_scan_at': scan['started_at'] if scan['full_scan'] else tree.get('full_scan_at')
+        }, scan.get('mtimes_utc', True), scan.get('listed_at')
+
+    def _get_monitor_state(self, monitor_id: Optional[str], monitor: Optional[Dict]) -> Optional[Dict]:
+        """获取监控状态（签名表和等待写入完成的文件，内存缓存，首次从文件加载，旧版file_list自动迁移）"""
+        if monitor_id in self.monitor_states:
+            return self.monitor_states[monitor_id]
+
+        state = self.data_manager.load_monitor_state(monitor_id) if monitor_id else None
+        if state is None and monitor and monitor.get('file_list'):
+            print(f"迁移监控 {monitor_id} 的文件列表到签名表: {len(monitor['file_list'])} 个文件")
+            state = {'signatures': migrate_file_list(monitor['file_list']), 'pending': {}}
+        if state is not None and monitor_id:
+            self.monitor_states[monitor_id] = state
+        return state
+
+    def _save_monitor_state(self, monitor_id: Optional[str], signatures: Dict, pending: Dict,
+                            tree: Optional[Dict] = None):
+        """更新缓存并持久化监控状态（tree为递归监控的目录状态和遍历游标）"""
+        if not monitor_id:
+            return
+        self.monitor_states[monitor_id] = {'signatures': signatures, 'pending': dict(pending), 'tree': tree}
+        self.data_manager.save_monitor_state(monitor_id, signatures, pending, tree)
 
     def connection_test_task(self, task_id: str, time_slice: float, scheduler,
                            site_config: Dict) -> str:
         """连接测试任务"""
         print(f"开始连接测试: {site_config['host']}")
 
-        # 创建FTP客户端
-        ftp_client = self.create_ftp_client(site_config)
-
         start_time = time.time()
 
-        if ftp_client.connect():
-            # 测试基本操作
-            try:
-                current_dir = ftp_client.get_current_directory()
-                files = ftp_client.list_directory()
-
-                connection_time = time.time() - start_time
-
-                # 更新站点状态
-                sites = self.data_manager.load_sites()
-                for site in sites:
-                    if site['id'] == site_config.get('id'):
-                        site['status'] = 'connected'
-                        site['last_check'] = datetime.now().isoformat()
-                        site['connection_time'] = connection_time
-                        self.data_manager.save_site(site)
-                        break
-
-                self._log_system('connection_test', {
-                    'site_id': site_config.get('id'),
-                    'host': site_config['host'],
-                    'status': 'success',
-                    'connection_time': connection_time,
-                    'current_dir': current_dir,
-                    'file_count': len(files)
-                })
-
-                return f"连接测试成功: {site_config['host']} (耗时: {connection_time:.2f}秒)"
-
-            finally:
-                ftp_client.disconnect()
-        else:
+        # 从连接池借用FTP会话
+        try:
+            ftp_client = self.connection_pool.acquire(site_config, task_id=task_id)
+        except Exception as e:
             # 连接失败
+            error_msg = str(e)
             sites = self.data_manager.load_sites()
             for site in sites:
                 if site['id'] == site_config.get('id'):
                     site['status'] = 'disconnected'
                     site['last_check'] = datetime.now().isoformat()
-                    site['last_error'] = ftp_client.last_error
+                    site['last_error'] = error_msg
                     self.data_manager.save_site(site)
                     break
 
@@ -615,10 +1128,41 @@ class TaskService:
                 'site_id': site_config.get('id'),
                 'host': site_config['host'],
                 'status': 'failed',
-                'error': ftp_client.last_error
+                'error': error_msg
+            })
+
+            raise Exception(f"连接测试失败: {error_msg}")
+
+        # 测试基本操作
+        try:
+            current_dir = ftp_client.get_current_directory()
+            files = ftp_client.list_directory()
+
+            connection_time = time.time() - start_time
+
+            # 更新站点状态
+            sites = self.data_manager.load_sites()
+            for site in sites:
+                if site['id'] == site_config.get('id'):
+                    site['status'] = 'connected'
+                    site['last_check'] = datetime.now().isoformat()
+                    site['connection_time'] = connection_time
+                    self.data_manager.save_site(site)
+                    break
+
+            self._log_system('connection_test', {
+                'site_id': site_config.get('id'),
+                'host': site_config['host'],
+                'status': 'success',
+                'connection_time': connection_time,
+                'current_dir': current_dir,
+                'file_count': len(files)
             })
 
-            raise Exception(f"连接测试失败: {ftp_client.last_error}")
+            return f"连接测试成功: {site_config['host']} (耗时: {connection_time:.2f}秒)"
+
+        finally:
+            self.connection_pool.release(ftp_client)
 
     def _log_transfer(self, log_type: str, data: Dict):
         """记录传输日志"""
@@ -683,15 +1227,14 @@ class TaskService:
 
         # 尝试获取文件大小
         try:
-            ftp_client = self.create_ftp_client(site_config)
-            if ftp_client.connect():
+            with self.connection_pool.session(site_config) as ftp_client:
                 file_size = ftp_client.get_file_size(remote_path)
                 if file_size:
                     task_data['file_size'] = file_size
-                ftp_client.disconnect()
         except:
             pass
 
+        self._apply_site_limits(site_config)
         return self.scheduler.add_task(task_data)
 
     def submit_file_upload(self, site_id: str, local_path: str, remote_path: str,
@@ -718,9 +1261,14 @@ class TaskService:
             'priority': priority,
             'task_type': 'file_upload',
             'file_size': os.path.getsize(local_path),
-            'created_by': created_by
+            'created_by': created_by,
+            'site_id': site_id,
+            'site_name': site_config.get('name', site_config.get('host', '未知站点')),
+            'remote_path': remote_path,
+            'local_path': local_path
         }
 
+        self._apply_site_limits(site_config)
         return self.scheduler.add_task(task_data)
 
     def submit_folder_download(self, site_id: str, remote_path: str, local_path: str,
@@ -753,6 +1301,7 @@ class TaskService:
             'local_path': validated_path
         }
 
+        self._apply_site_limits(site_config)
         return self.scheduler.add_task(task_data)
 
     def submit_folder_upload(self, site_id: str, local_path: str, remote_path: str,
@@ -778,15 +1327,24 @@ class TaskService:
             'args': [site_config, local_path, remote_path],
             'priority': priority,
             'task_type': 'folder_upload',
-            'created_by': created_by
+            'created_by': created_by,
+            'site_id': site_id,
+            'site_name': site_config.get('name', site_config.get('host', '未知站点')),
+            'remote_path': remote_path,
+            'local_path': local_path
         }
 
+        self._apply_site_limits(site_config)
         return self.scheduler.add_task(task_data)
 
     def submit_folder_monitor(self, site_id: str, remote_path: str, local_path: str,
-                            monitor_interval: int = 300, file_filter: str = '',
+                            monitor_interval: Optional[int] = None, file_filter: str = '',
+                            recursive: bool = False, max_depth: Optional[int] = None,
                             priority: str = 'medium', created_by: str = 'user') -> str:
-        """提交文件夹监控任务"""
+        """提交文件夹监控任务（monitor_interval为基准检查间隔，实际间隔按目录变化自适应调整；
+        recursive时监控子目录，max_depth限制遍历深度）"""
+        monitor_interval = monitor_interval or self.monitor_interval
+
         # 验证本地路径
         validated_path = self._validate_local_path(local_path)
 
@@ -812,9 +1370,10 @@ class TaskService:
             'priority': priority,
             'file_pattern': file_filter or '*',
             'check_interval': monitor_interval,
+            'recursive': recursive,
+            'max_depth': max_depth,
             'status': 'active',
             'last_check': None,
-            'file_list': [],  # 空列表表示首次运行
             'created_by': created_by,
             'created_at': datetime.now().isoformat()
         }
@@ -830,6 +1389,8 @@ class TaskService:
             'local_path': validated_path,
             'file_pattern': file_filter or '*',
             'monitor_interval': monitor_interval,
+            'recursive': recursive,
+            'max_depth': max_depth,
             'priority': priority
         }
 
@@ -847,6 +1408,7 @@ class TaskService:
             'local_path': validated_path
         }
 
+        self._apply_site_limits(site_config)
         return self.scheduler.add_task(task_data)
 
     def submit_connection_test(self, site_id: str, created_by: str = 'user') -> str:
@@ -8,7 +8,7 @@ import os
 from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app, session
 from flask_socketio import emit
-from app.views.auth import login_required
+from app.views.auth import login_required, admin_required
 from app import socketio
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
@@ -49,10 +49,11 @@ def create_monitor():
             'local_path': data['local_path'],
             'priority': data.get('priority', 'medium'),
             'file_pattern': data.get('file_pattern', '*'),
-            'check_interval': data.get('check_interval', 60),
+            'check_interval': data.get('check_interval') or current_app.config['MONITOR_INTERVAL'],
+            'recursive': bool(data.get('recursive', False)),
+            'max_depth': data.get('max_depth'),
             'status': 'active',
             'last_check': None,
-            'file_list': [],
             'created_by': session.get('username', 'unknown'),
             'created_at': datetime.now().isoformat()
         }
@@ -87,7 +88,8 @@ def update_monitor(monitor_id):
         
         # 更新字段
         updatable_fields = ['name', 'remote_path', 'local_path', 'priority', 
-                           'file_pattern', 'check_interval', 'status']
+                           'file_pattern', 'check_interval', 'min_interval', 'max_interval',
+                           'recursive', 'max_depth', 'status']
         for field in updatable_fields:
             if field in data:
                 monitor[field] = data[field]
@@ -110,19 +112,9 @@ def update_monitor(monitor_id):
 def delete_monitor(monitor_id):
     """删除监控任务"""
     try:
-        monitors = current_app.data_manager.load_monitors()
-        
-        # 过滤掉要删除的监控任务
-        updated_monitors = [m for m in monitors if m['id'] != monitor_id]
-        
-        if len(updated_monitors) == len(monitors):
+        if not current_app.data_manager.delete_monitor(monitor_id):
             return jsonify({'error': '监控任务不存在'}), 404
         
-        # 保存更新后的监控列表
-        data = current_app.data_manager._load_json(current_app.data_manager.files['monitors'])
-        data['monitors'] = updated_monitors
-        current_app.data_manager._atomic_write(current_app.data_manager.files['monitors'], data)
-        
         return jsonify({'message': '监控任务删除成功'})
         
     except Exception as e:
@@ -192,31 +184,116 @@ def get_logs(log_type):
             return jsonify({'error': '无效的日志类型'}), 400
         
         # 获取查询参数
-        date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
+        since = request.args.get('since')
+        until = request.args.get('until')
+        date = request.args.get('date')
+        if not date and not since and not until:
+            date = datetime.now().strftime('%Y-%m-%d')
         limit = int(request.args.get('limit', 100))
+        cursor = request.args.get('cursor')
+        filters = {field: request.args.get(field)
+                   for field in ['action', 'site_id', 'task_id', 'status']
+                   if request.args.get(field)}
         
-        # 构建日志文件路径
-        log_file = f"{current_app.config['DATA_DIR']}/logs/{log_type}/{date}.json"
+        # 从日志末尾倒序读取（兼容旧的JSON数组文件和JSON Lines分段文件）
+        result = current_app.data_manager.query_logs(
+            log_type, date=date, since=since, until=until,
+            filters=filters, limit=limit, cursor=cursor
+        )
         
-        if not os.path.exists(log_file):
-            return jsonify({'logs': []})
+        return jsonify(result)
         
-        # 读取日志文件
-        import json
-        with open(log_file, 'r', encoding='utf-8') as f:
-            logs = json.load(f)
-        
-        # 按时间倒序排列
-        logs.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+    except Exception as e:
+        return jsonify({'error': f'获取日志失败: {str(e)}'}), 500
+
+@api_bp.route('/rate-limits', methods=['GET'])
+@login_required
+def get_rate_limits():
+    """获取传输限速配置（字节/秒，0表示不限速）"""
+    try:
+        return jsonify(current_app.rate_limiter.get_limits())
+    except Exception as e:
+        return jsonify({'error': f'获取限速配置失败: {str(e)}'}), 500
+
+@api_bp.route('/rate-limits', methods=['PUT'])
+@admin_required
+def update_rate_limits():
+    """调整传输限速，立即对进行中的传输生效
+
+    请求体: {"global": 速率, "sites": {站点ID: 速率}, "tasks": {任务ID: 速率}}，速率为字节/秒，0表示不限速
+    """
+    try:
+        data = request.get_json() or {}
+        rate_limiter = current_app.rate_limiter
+        
+        def parse_rate(value):
+            rate = float(value or 0)
+            if rate < 0:
+                raise ValueError(f'无效的速率: {value}')
+            return rate
+        
+        if 'global' in data:
+            rate_limiter.set_global_limit(parse_rate(data['global']))
+        
+        # 站点限速同时保存到站点配置，重启后继续生效
+        sites = {site['id']: site for site in current_app.data_manager.load_sites()}
+        for site_id, value in (data.get('sites') or {}).items():
+            if site_id not in sites:
+                return jsonify({'error': f'站点不存在: {site_id}'}), 404
+            rate = parse_rate(value)
+            rate_limiter.set_site_limit(site_id, rate)
+            sites[site_id]['rate_limit'] = rate or None
+            current_app.data_manager.save_site(sites[site_id])
+        
+        for task_id, value in (data.get('tasks') or {}).items():
+            if not current_app.scheduler.set_task_rate_limit(task_id, parse_rate(value)):
+                return jsonify({'error': f'任务不存在或已结束: {task_id}'}), 404
+        
+        # 按新的有效速率重新计算时间片
+        current_app.scheduler.refresh_time_slices()
         
-        # 限制数量
-        if limit > 0:
-            logs = logs[:limit]
+        return jsonify({
+            'message': '限速配置已更新',
+            'limits': rate_limiter.get_limits()
+        })
         
-        return jsonify({'logs': logs})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'更新限速配置失败: {str(e)}'}), 500
+
+@api_bp.route('/worker-pool', methods=['GET'])
+@login_required
+def get_worker_pool():
+    """获取工作线程池状态"""
+    try:
+        return jsonify(current_app.scheduler.get_worker_pool())
+    except Exception as e:
+        return jsonify({'error': f'获取工作线程池状态失败: {str(e)}'}), 500
+
+@api_bp.route('/worker-pool', methods=['PUT'])
+@admin_required
+def update_worker_pool():
+    """调整工作线程池，立即生效（重启后恢复为配置文件中的设置）
+
+    请求体: {"mode": "fixed" 或 "elastic", "min_workers": 数量, "max_workers": 数量}，fixed模式保持max_workers个线程
+    """
+    try:
+        data = request.get_json() or {}
+        pool = current_app.scheduler.configure_workers(
+            mode=data.get('mode'),
+            min_workers=data.get('min_workers'),
+            max_workers=data.get('max_workers')
+        )
+        return jsonify({
+            'message': '工作线程池已更新',
+            'pool': pool
+        })
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': f'获取日志失败: {str(e)}'}), 500
+        return jsonify({'error': f'更新工作线程池失败: {str(e)}'}), 500
 
 @api_bp.route('/upload', methods=['POST'])
 @login_required
@@ -299,6 +376,7 @@ def broadcast_system_status():
         status = {
             'scheduler_running': current_app.scheduler.running,
             'worker_count': len(current_app.scheduler.workers),
+            'worker_pool': current_app.scheduler.get_worker_pool(),
             'timestamp': datetime.now().isoformat()
         }
         
@@ -154,6 +154,7 @@ def get_system_status():
             'process_memory_mb': process_memory,
             'scheduler_running': scheduler_running,
             'worker_count': worker_count,
+            'worker_pool': current_app.scheduler.get_worker_pool(),
             'uptime': 'N/A'  # 可以添加启动时间计算
         })
         
@@ -166,6 +167,7 @@ def get_system_status():
             'process_memory_mb': 0,
             'scheduler_running': current_app.scheduler.running,
             'worker_count': len(current_app.scheduler.workers),
+            'worker_pool': current_app.scheduler.get_worker_pool(),
             'uptime': 'N/A'
         })
     except Exception as e:
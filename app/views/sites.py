@@ -15,15 +15,6 @@ def encrypt_password(password: str) -> str:
     """简单的密码加密（实际项目中应使用更安全的加密方法）"""
     return base64.b64encode(password.encode()).decode()
 
-def decrypt_password(encrypted: str) -> str:
-    """解密密码"""
-    try:
-        return base64.b64decode(encrypted.encode()).decode()
-    except:
-        return encrypted
-
-  # 如果解密失败，返回原文
-
 @sites_bp.route('/')
 @login_required
 @check_user_status
@@ -195,6 +186,9 @@ def update_site(site_id):
         # 保存更新
         current_app.data_manager.save_site(site)
 
+        # 关闭使用旧配置的空闲会话
+        current_app.connection_pool.close_site(site_id)
+
         # 记录操作日志
         current_app.data_manager.write_log('operations', {
             'action': 'update_site',
@@ -234,6 +228,7 @@ def delete_site(site_id):
 
         # 删除站点
         current_app.data_manager.delete_site(site_id)
+        current_app.connection_pool.close_site(site_id)
 
         # 记录操作日志
         current_app.data_manager.write_log('operations', {
@@ -334,26 +329,17 @@ def browse_site_directory(site_id):
         site_config = None
         for site in sites:
             if site['id'] == site_id:
-                site_config = site.copy()
-                # 解密密码
-                site_config['password'] = decrypt_password(site_config.get('password', ''))
+                site_config = site
                 break
         
         if not site_config:
             return jsonify({'error': '站点不存在'}), 404
         
-        # 创建FTP客户端并浏览目录
-        from app.core.ftp_client import FTPClient
-        ftp_client = FTPClient(
-            host=site_config['host'],
-            port=site_config.get('port', 21),
-            username=site_config.get('username', ''),
-            password=site_config.get('password', ''),
-            timeout=30
-        )
-        
-        if not ftp_client.connect():
-            return jsonify({'error': f'连接失败: {ftp_client.last_error}'}), 500
+        # 从连接池借用FTP会话浏览目录
+        try:
+            ftp_client = current_app.connection_pool.acquire(site_config)
+        except Exception as e:
+            return jsonify({'error': f'连接失败: {str(e)}'}), 500
         
         try:
             # 获取目录列表
@@ -371,7 +357,7 @@ def browse_site_directory(site_id):
             })
             
         finally:
-            ftp_client.disconnect()
+            current_app.connection_pool.release(ftp_client)
         
     except Exception as e:
         return jsonify({'error': f'浏览目录失败: {str(e)}'}), 500
@@ -248,7 +248,7 @@ def create_task():
                 created_by=session.get('username', 'unknown')
             )
         elif task_type == 'folder_monitor':
-            monitor_interval = data.get('monitor_interval', 300)
+            monitor_interval = data.get('monitor_interval') or current_app.config['MONITOR_INTERVAL']
             file_filter = data.get('file_filter', '')
 
             task_id = current_app.task_service.submit_folder_monitor(
@@ -257,6 +257,8 @@ def create_task():
                 local_path=local_path,
                 monitor_interval=monitor_interval,
                 file_filter=file_filter,
+                recursive=bool(data.get('recursive', False)),
+                max_depth=data.get('max_depth'),
                 priority=priority,
                 created_by=session.get('username', 'unknown')
             )
@@ -9,9 +9,27 @@ class Config:
     DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
     BACKUP_INTERVAL = 300  # 备份间隔（秒）
     MAX_BACKUPS = 10       # 最大备份数量
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')  # 存储后端：json 或 sqlite
+    SQLITE_DB_PATH = os.path.join(DATA_DIR, 'ftp_web.db')        # SQLite数据库文件
+    TASK_FLUSH_INTERVAL = 5         # 任务进度合并写入间隔（秒）
+    TASK_DURABILITY = 'transition'  # 任务持久化级别：sync / transition / periodic
     
     # 任务调度配置
-    MAX_WORKERS = 3        # 最大工作线程数
+    WORKER_POOL_MODE = 'fixed'  # 工作线程池模式：fixed（固定MAX_WORKERS个）或 elastic（按负载在MIN_WORKERS~MAX_WORKERS间伸缩）
+    MIN_WORKERS = 2        # elastic模式下保留的最少工作线程数
+    MAX_WORKERS = 3        # 最大工作线程数（elastic模式可调大，如8）
+    WORKER_IDLE_TIMEOUT = 60      # elastic模式下线程空闲超过该时间（秒）后退出
+    WORKER_SCALE_INTERVAL = 5     # 测量传输速率、评估扩容的间隔（秒）
+    WORKER_SCALE_MIN_GAIN = 0.1   # 扩容后合计速率至少提升的比例，低于该值时暂停扩容
+    PROCESS_POOL_WORKERS = 0      # 执行摘要计算等CPU密集阶段的子进程数（0表示在工作线程中执行）
+    PREEMPTION_GRACE_PERIOD = 10  # 时间片结束后等待任务主动让出的宽限期（秒）
+    
+    # 吞吐学习配置（按站点传输速率和建立连接耗时计算时间片，样本不足时使用下面的固定倍数）
+    ADAPTIVE_TIME_SLICES = True   # 是否按学习到的吞吐计算时间片
+    THROUGHPUT_MODEL_FILE = os.path.join(DATA_DIR, 'throughput_model.json')
+    THROUGHPUT_EWMA_ALPHA = 0.3   # 指数加权移动平均的权重（越大越偏向最近的样本）
+    THROUGHPUT_MIN_SAMPLES = 3    # 使用学习结果前至少需要的样本数
+    SLICE_OVERHEAD_RATIO = 0.05   # 重新建立连接的耗时占时间片的最大比例
     
     # 基础时间片配置（秒）
     BASE_TIME_SLICES = {
@@ -32,16 +50,51 @@ class Config:
         'log_cleanup': 0.3         # 日志清理
     }
     
+    # 站点并发配置（同一优先级内各站点轮流执行，达到上限的站点暂不调度）
+    MAX_TASKS_PER_SITE = 2  # 每个站点同时执行的最大任务数（0表示不限制，站点可通过max_tasks覆盖）
+    
     # FTP配置
     FTP_TIMEOUT = 30       # FTP连接超时（秒）
-    FTP_CHUNK_SIZE = 8192  # 传输块大小
+    FTP_CHUNK_SIZE = 256 * 1024  # 下载读取缓冲区大小（站点可通过chunk_size覆盖）
+    
+    # FTP连接池配置
+    FTP_POOL_MAX_PER_SITE = 4      # 每个站点最大连接数
+    FTP_POOL_IDLE_TIMEOUT = 300    # 空闲会话回收时间（秒）
+    FTP_POOL_ACQUIRE_TIMEOUT = 60  # 等待可用连接的超时时间（秒）
+    CONNECTION_TEST_TIMEOUT = 10   # 连接测试使用独立的新连接，连接和登录的超时时间（秒）
+    
+    # 传输限速配置（全局、站点、任务三级令牌桶，可通过 /api/rate-limits 在运行时调整）
+    RATE_LIMIT_GLOBAL = 0        # 全局限速（字节/秒，0表示不限速；站点可通过rate_limit设置站点限速）
+    RATE_LIMIT_BURST = 1.0       # 令牌桶最多积累的秒数（允许的突发量）
+    
+    # 分段下载配置（大文件拆分为多个字节范围，通过多个连接并行下载）
+    SEGMENTED_DOWNLOAD_THRESHOLD = 64 * 1024 * 1024  # 超过该大小的文件使用分段下载
+    SEGMENTED_DOWNLOAD_STREAMS = 4                   # 分段数/并发连接数（站点可通过download_streams覆盖）
+    
+    # 文件夹并行传输配置
+    FOLDER_TRANSFER_CONCURRENCY = 4  # 每个文件夹任务的并发连接数（站点可通过transfer_concurrency覆盖）
+    FOLDER_TRANSFER_RETRIES = 3      # 单个文件失败后的重试次数
+    FOLDER_LIST_PARALLELISM = 1      # 并行列目录的连接数（1表示单连接遍历）
+    
+    # 完整性校验配置（服务器支持HASH/XSHA256/XMD5/XCRC时比对摘要，否则按范围重新读取抽样比对）
+    VERIFY_CHECKSUM = False          # 下载完成后校验完整性（站点可通过verify_checksum覆盖）
     
     # 监控配置
-    MONITOR_INTERVAL = 60  # 监控检查间隔（秒）
+    MONITOR_INTERVAL = 60  # 监控检查间隔（秒），监控未指定时使用，作为自适应间隔的基准
+    MONITOR_MIN_INTERVAL = 30    # 自适应检查间隔的默认下限（秒），监控可通过min_interval覆盖
+    MONITOR_MAX_INTERVAL = 1800  # 自适应检查间隔的默认上限（秒），监控可通过max_interval覆盖
+    MONITOR_JITTER = 0.1         # 重新调度间隔的随机浮动比例
+    MONITOR_RESTORE_SPREAD = 60  # 重启后已到期的监控在该时间（秒）内分散执行
+    MONITOR_SHARE_WINDOW = 20  # 同一站点在该时间（秒）内到期的监控共用一次列目录结果（应小于MONITOR_MIN_INTERVAL×(1-MONITOR_JITTER)）
+    MONITOR_STABLE_LISTINGS = 2  # 文件大小/修改时间连续多少次检查不变后才下载（1表示发现即下载）
+    MONITOR_STABLE_AGE = 60      # 修改时间早于该时间（秒）的文件视为已写入完成（0表示只按检查次数判断）
+    MONITOR_FULL_SCAN_INTERVAL = 3600  # 递归监控不列出修改时间未变化的目录，每隔该时间（秒）完整列出一次
     
     # 日志配置
     LOG_LEVEL = 'INFO'
-    LOG_MAX_SIZE = 10 * 1024 * 1024  # 10MB
+    LOG_MAX_SIZE = 10 * 1024 * 1024  # 10MB，单个日志分段的最大大小，超过后轮转
+    LOG_FLUSH_INTERVAL = 1  # 日志批量写入间隔（秒）
+    LOG_COMPRESS_ROTATED = False  # 是否gzip压缩已轮转的日志分段
     LOG_BACKUP_COUNT = 5
     
     # 上传配置
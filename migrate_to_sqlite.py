@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储迁移脚本
+将现有JSON数据文件一次性导入到SQLite(WAL)数据库
+"""
+
+import os
+import sys
+
+from config import Config
+from app.models.storage import JSONStorage, SQLiteStorage, import_json_data
+
+def main():
+    """主函数"""
+    print("=== FTP Web System 存储迁移工具 (JSON -> SQLite) ===")
+    print()
+
+    data_dir = Config.DATA_DIR
+    db_path = sys.argv[1] if len(sys.argv) > 1 else Config.SQLITE_DB_PATH
+
+    if not os.path.exists(JSONStorage(data_dir).files['users']):
+        print(f"❌ 未找到JSON数据文件: {data_dir}")
+        sys.exit(1)
+
+    print(f"数据目录: {data_dir}")
+    print(f"目标数据库: {db_path}")
+
+    storage = SQLiteStorage(db_path)
+    counts = import_json_data(data_dir, storage)
+    storage.close()
+
+    print()
+    print("✅ 数据迁移成功完成！")
+    for collection, count in counts.items():
+        print(f"  {collection}: {count}")
+    print()
+    print("设置环境变量 STORAGE_BACKEND=sqlite 后重启系统即可使用SQLite存储")
+
+if __name__ == '__main__':
+    main()
@@ -284,6 +284,56 @@ function updateSystemStatusDisplay(status) {
     if (workerCount) {
         workerCount.textContent = status.worker_count;
     }
+    
+    // 更新工作线程池
+    if (status.worker_pool) {
+        updateWorkerPoolDisplay(status.worker_pool);
+    }
+}
+
+// 更新工作线程池显示
+function updateWorkerPoolDisplay(pool) {
+    const info = document.getElementById('worker-pool-info');
+    if (info) {
+        const modeText = pool.mode === 'elastic' ? `弹性 ${pool.min_workers}-${pool.max_workers}` : '固定';
+        info.textContent = `${modeText}，忙碌 ${pool.busy_workers}，就绪任务 ${pool.ready_tasks}`;
+    }
+    
+    // 正在编辑时不覆盖输入
+    const form = ['worker-pool-mode', 'worker-pool-min', 'worker-pool-max'].map(id => document.getElementById(id));
+    if (form.some(element => !element) || form.includes(document.activeElement)) {
+        return;
+    }
+    form[0].value = pool.mode;
+    form[1].value = pool.min_workers;
+    form[2].value = pool.max_workers;
+}
+
+// 调整工作线程池
+async function updateWorkerPool() {
+    const minWorkers = parseInt(document.getElementById('worker-pool-min').value, 10);
+    const maxWorkers = parseInt(document.getElementById('worker-pool-max').value, 10);
+    if (!minWorkers || !maxWorkers || minWorkers < 1 || maxWorkers < minWorkers) {
+        showToast('error', '请输入有效的线程数范围');
+        return;
+    }
+    
+    try {
+        const data = await apiRequest('/api/worker-pool', {
+            method: 'PUT',
+            body: JSON.stringify({
+                mode: document.getElementById('worker-pool-mode').value,
+                min_workers: minWorkers,
+                max_workers: maxWorkers
+            })
+        });
+        updateWorkerPoolDisplay(data.pool);
+        showToast('success', data.message);
+        loadSystemStatus();
+    } catch (error) {
+        console.error('Failed to update worker pool:', error);
+        showToast('error', '调整工作线程池失败: ' + error.message);
+    }
 }
 
 // 更新进度条
@@ -628,6 +678,10 @@ window.updateSystemStatus = function(status) {
     if (workerCount) {
         workerCount.textContent = status.worker_count;
     }
+    
+    if (status.worker_pool) {
+        updateWorkerPoolDisplay(status.worker_pool);
+    }
 };
 
 // 获取状态徽章
@@ -194,6 +194,7 @@ function showFTPBrowserModal() {
     document.getElementById('autoStart').checked = true;
     document.getElementById('monitorInterval').value = 300;
     document.getElementById('fileFilter').value = '';
+    document.getElementById('monitorRecursive').checked = false;
     document.getElementById('monitorConfig').style.display = 'none';
 
     // 重置按钮状态
@@ -840,6 +841,7 @@ async function createTaskFromBrowser() {
             if (taskType === 'folder_monitor') {
                 taskData.monitor_interval = parseInt(document.getElementById('monitorInterval').value) || 300;
                 taskData.file_filter = document.getElementById('fileFilter').value || '';
+                taskData.recursive = document.getElementById('monitorRecursive').checked;
             }
             
             // 验证任务类型和选择的项目类型是否匹配
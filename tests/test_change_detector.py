@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+变化检测测试
+"""
+
+import os
+import sys
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.ftp_client import parse_list_line
+from app.services.change_detector import (build_signatures, diff_signatures, in_directories, listing_hash,
+                                          migrate_file_list, parent_directories, select_stable, settled_mtime,
+                                          utc_mtimes)
+
+
+NOW = datetime(2024, 5, 1, 12, 0, 0)
+
+
+class DiffSignaturesTest(unittest.TestCase):
+    """签名比较测试"""
+
+    def test_added_modified_deleted(self):
+        known = {'a.txt': (1, 20240501100000), 'b.txt': (2, 20240501100000), 'c.txt': (3, 20240501100000)}
+        current = {'a.txt': (1, 20240501100000), 'b.txt': (2, 20240501100500), 'd.txt': (4, 20240501100000)}
+        self.assertEqual(diff_signatures(known, current), ({'d.txt'}, {'b.txt'}, {'c.txt'}))
+
+    def test_size_change_without_mtime_is_modified(self):
+        self.assertEqual(diff_signatures({'a.txt': (1, None)}, {'a.txt': (2, None)}), (set(), {'a.txt'}, set()))
+
+    def test_missing_mtime_is_not_modified(self):
+        self.assertEqual(diff_signatures({'a.txt': (1, None)}, {'a.txt': (1, 20240501100000)}), (set(), set(), set()))
+
+    def test_migrated_entries_are_not_modified(self):
+        known = migrate_file_list(['a.txt'])
+        self.assertEqual(diff_signatures(known, {'a.txt': (5, 20240501100000)}), (set(), set(), set()))
+
+    def test_build_signatures_skips_directories(self):
+        entries = [
+            {'name': 'a.txt', 'size': 1, 'is_directory': False, 'modified': '2024-05-01T10:00:00'},
+            {'name': 'sub', 'size': 0, 'is_directory': True, 'modified': '2024-05-01T10:00:00'}
+        ]
+        self.assertEqual(build_signatures(entries, 'dir/'), {'dir/a.txt': (1, 20240501100000)})
+
+
+class DirectoryStateTest(unittest.TestCase):
+    """递归监控目录状态测试"""
+
+    def test_recent_directory_mtime_is_not_settled(self):
+        self.assertIsNone(settled_mtime(20240501115959, NOW))
+        self.assertEqual(settled_mtime(20240501115900, NOW), 20240501115900)
+        self.assertIsNone(settled_mtime(None, NOW))
+
+    def test_listing_hash_ignores_order_and_tracks_changes(self):
+        a = {'name': 'a.txt', 'size': 1, 'is_directory': False, 'modified': '2024-05-01T10:00:00'}
+        b = {'name': 'b', 'size': 0, 'is_directory': True, 'modified': None}
+        self.assertEqual(listing_hash([a, b]), listing_hash([b, a]))
+        self.assertNotEqual(listing_hash([a, b]), listing_hash([dict(a, size=2), b]))
+
+    def test_parent_directories(self):
+        self.assertEqual(parent_directories('a/b/c.txt'), ['a', 'a/b'])
+        self.assertEqual(parent_directories('c.txt'), [])
+        self.assertTrue(in_directories('a/b/c.txt', {'a'}))
+        self.assertFalse(in_directories('a', {'a'}))
+        self.assertTrue(in_directories('a', {'a'}, include_self=True))
+
+
+class StableRuleTest(unittest.TestCase):
+    """静止规则测试"""
+
+    def test_old_utc_mtime_is_stable_on_first_listing(self):
+        current = {'a.txt': (10, 20240501110000)}
+        pending = {}
+        stable = select_stable(['a.txt'], current, pending, 3, 60, NOW, mtimes_utc=True)
+        self.assertEqual(stable, {'a.txt'})
+        self.assertEqual(pending, {})
+
+    def test_list_mtime_requires_listing_count(self):
+        # LIST的修改时间是服务器本地时间，即使看起来很旧也不能按时间判断
+        current = {'a.txt': (10, 20240501110000)}
+        pending = {}
+        for _ in range(2):
+            self.assertEqual(select_stable(['a.txt'], current, pending, 3, 60, NOW), set())
+        self.assertEqual(pending, {'a.txt': [10, 20240501110000, 2, None]})
+        self.assertEqual(select_stable(['a.txt'], current, pending, 3, 60, NOW), {'a.txt'})
+        self.assertEqual(pending, {})
+
+    def test_same_listing_is_counted_once(self):
+        # 同一份缓存的列表重复传入时不算新的观察，文件保持等待
+        current = {'a.txt': (10, 20240501115950)}
+        pending = {}
+        self.assertEqual(select_stable(['a.txt'], current, pending, 2, 60, NOW, listed_at=100.0), set())
+        self.assertEqual(select_stable(['a.txt'], current, pending, 2, 60, NOW, listed_at=100.0), set())
+        self.assertEqual(pending, {'a.txt': [10, 20240501115950, 1, 100.0]})
+        self.assertEqual(select_stable(['a.txt'], current, pending, 2, 60, NOW, listed_at=130.0), {'a.txt'})
+
+    def test_pending_without_listed_at_still_counts(self):
+        # 旧版本保存的pending条目没有列出时间
+        pending = {'a.txt': [10, 20240501115950, 1]}
+        current = {'a.txt': (10, 20240501115950)}
+        self.assertEqual(select_stable(['a.txt'], current, pending, 2, 60, NOW, listed_at=100.0), {'a.txt'})
+
+    def test_changed_signature_resets_count(self):
+        pending = {'a.txt': [10, 20240501115900, 2]}
+        current = {'a.txt': (20, 20240501115950)}
+        self.assertEqual(select_stable(['a.txt'], current, pending, 3, 60, NOW, mtimes_utc=True), set())
+        self.assertEqual(pending, {'a.txt': [20, 20240501115950, 1, None]})
+
+    def test_utc_mtimes_by_listing_source(self):
+        mlsd_entries = [
+            {'name': 'a.txt', 'size': 1, 'is_directory': False, 'modified': '2024-05-01T11:00:00', 'modified_utc': True},
+            {'name': 'sub', 'size': 0, 'is_directory': True, 'modified': None}
+        ]
+        list_entries = [parse_list_line('-rw-r--r--   1 ftp ftp   1 May 01 11:00 a.txt')]
+        self.assertTrue(utc_mtimes(mlsd_entries))
+        self.assertFalse(utc_mtimes(list_entries))
+        self.assertEqual(build_signatures(mlsd_entries), {'a.txt': (1, 20240501110000)})
+
+
+if __name__ == '__main__':
+    unittest.main()
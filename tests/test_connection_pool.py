@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FTP连接池测试
+"""
+
+import ftplib
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.connection_pool import FTPConnectionPool, PoolExhaustedError
+from app.core.ftp_client import FTPClient
+
+
+SITE = {'id': 'site_1', 'host': 'ftp.example.com', 'port': 21, 'username': 'user', 'password': ''}
+
+
+class FakeFTP:
+    """记录命令的控制连接，broken为True时NOOP失败"""
+
+    def __init__(self):
+        self.commands = []
+        self.broken = False
+
+    def voidcmd(self, cmd):
+        self.commands.append(cmd)
+        if self.broken:
+            raise ftplib.error_temp('421 Timeout')
+        return '200 OK'
+
+    def quit(self):
+        self.commands.append('QUIT')
+
+
+class FakeClient(FTPClient):
+    """不建立网络连接的FTP客户端"""
+
+    def connect(self) -> bool:
+        self.ftp = FakeFTP()
+        self.connected = True
+        return True
+
+
+def create_client(site_config):
+    return FakeClient(site_config['host'], site_config.get('port', 21))
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    """会话复用、NOOP健康检查、空闲回收和每站点连接数限制"""
+
+    def setUp(self):
+        self.pool = FTPConnectionPool(max_per_site=2, idle_timeout=60, acquire_timeout=0.2,
+                                      client_factory=create_client)
+        self.addCleanup(self.pool.close_all)
+
+    def test_released_session_is_reused_after_noop(self):
+        client = self.pool.acquire(SITE)
+        self.pool.release(client)
+        self.assertIs(self.pool.acquire(SITE), client)
+        self.assertEqual(client.ftp.commands, ['NOOP'])
+        stats = self.pool.get_statistics()['sites']['site_1']
+        self.assertEqual((stats['created'], stats['reused'], stats['in_use']), (1, 1, 1))
+
+    def test_failed_health_check_discards_session(self):
+        client = self.pool.acquire(SITE)
+        self.pool.release(client)
+        client.ftp.broken = True
+        replacement = self.pool.acquire(SITE)
+        self.assertIsNot(replacement, client)
+        self.assertFalse(client.connected)
+        self.assertEqual(self.pool.get_statistics()['sites']['site_1']['in_use'], 1)
+
+    def test_idle_sessions_are_reaped(self):
+        client = self.pool.acquire(SITE)
+        ftp = client.ftp
+        self.pool.release(client)
+        self.assertEqual(self.pool.evict_idle(), 0)
+
+        self.pool.idle_timeout = 0
+        self.assertEqual(self.pool.evict_idle(), 1)
+        self.assertEqual(ftp.commands, ['QUIT'])
+        self.assertFalse(client.connected)
+        self.assertEqual(self.pool.get_statistics()['sites'], {})
+
+    def test_per_site_limit(self):
+        first = self.pool.acquire(SITE)
+        self.pool.acquire(SITE)
+        with self.assertRaises(PoolExhaustedError):
+            self.pool.acquire(SITE)
+
+        # 其他站点不受影响
+        other = self.pool.acquire(dict(SITE, id='site_2'))
+        self.assertIsNot(other, first)
+
+    def test_site_max_connections_overrides_default(self):
+        site = dict(SITE, max_connections=1)
+        self.pool.acquire(site)
+        with self.assertRaises(PoolExhaustedError):
+            self.pool.acquire(site)
+
+    def test_waiter_gets_released_session(self):
+        first = self.pool.acquire(SITE)
+        self.pool.acquire(SITE)
+        threading.Timer(0.05, self.pool.release, (first,)).start()
+        start = time.time()
+        self.assertIs(self.pool.acquire(SITE, timeout=2), first)
+        self.assertLess(time.time() - start, 1)
+
+    def test_discarded_session_frees_slot(self):
+        client = self.pool.acquire(SITE)
+        self.pool.acquire(SITE)
+        self.pool.release(client, discard=True)
+        self.assertIsNot(self.pool.acquire(SITE), client)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据管理器任务写回测试
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.data_manager import DataManager
+
+
+class CountingStorage:
+    """包装存储后端，记录每次批量写入的任务"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.writes = []
+
+    def save_tasks(self, tasks):
+        self.writes.append([(task['id'], task['status']) for task in tasks])
+        self.storage.save_tasks(tasks)
+
+    def __getattr__(self, name):
+        return getattr(self.storage, name)
+
+
+def make_task(status='pending', progress=0.0):
+    return {'id': 'task_1', 'status': status, 'progress': progress, 'checkpoint_data': {}}
+
+
+class TaskDurabilityTest(unittest.TestCase):
+    """各持久化级别的写入时机"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def create_manager(self, durability):
+        manager = DataManager(self.data_dir, backup_interval=3600, task_flush_interval=3600,
+                              task_durability=durability)
+        self.addCleanup(manager.shutdown)
+        manager.storage = CountingStorage(manager.storage)
+        return manager
+
+    def test_sync_writes_every_save(self):
+        manager = self.create_manager(DataManager.DURABILITY_SYNC)
+        manager.save_task(make_task())
+        manager.save_task(make_task(progress=0.5))
+        self.assertEqual(len(manager.storage.writes), 2)
+
+    def test_transition_writes_only_status_changes(self):
+        manager = self.create_manager(DataManager.DURABILITY_TRANSITION)
+        manager.save_task(make_task())
+        manager.save_task(make_task(progress=0.5))
+        manager.save_task(make_task(progress=0.6))
+        self.assertEqual(manager.storage.writes, [[('task_1', 'pending')]])
+
+        manager.save_task(make_task('running', 0.7))
+        self.assertEqual(manager.storage.writes[-1], [('task_1', 'running')])
+        self.assertEqual(manager.flush_tasks(), 0)
+
+    def test_periodic_coalesces_until_flush(self):
+        manager = self.create_manager(DataManager.DURABILITY_PERIODIC)
+        for progress in (0.1, 0.2, 0.3):
+            manager.save_task(make_task('running', progress))
+        self.assertEqual(manager.storage.writes, [])
+        self.assertEqual(manager.flush_tasks(), 1)
+        self.assertEqual(manager.storage.load_tasks()['tasks']['task_1']['progress'], 0.3)
+
+    def test_older_revision_is_ignored(self):
+        manager = self.create_manager(DataManager.DURABILITY_PERIODIC)
+        manager.save_task(make_task('completed', 1.0), revision=5)
+        manager.save_task(make_task('running', 0.5), revision=4)
+        manager.flush_tasks()
+        self.assertEqual(manager.storage.load_tasks()['tasks']['task_1']['status'], 'completed')
+
+    def test_tasks_survive_restart_without_stale_counter(self):
+        manager = self.create_manager(DataManager.DURABILITY_TRANSITION)
+        manager.save_task(make_task('running', 0.5))
+        manager.shutdown()
+
+        reloaded = self.create_manager(DataManager.DURABILITY_TRANSITION)
+        tasks_data = reloaded.load_tasks()
+        self.assertEqual(tasks_data['tasks']['task_1']['progress'], 0.5)
+        self.assertNotIn('task_counter', tasks_data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单连接下载写入测试（缓冲写入、预分配和.part续传）
+"""
+
+import ftplib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.ftp_client import FTPClient
+
+
+DATA = os.urandom(200 * 1024)
+
+
+class FakeConnection:
+    """按REST偏移返回远程文件内容的数据连接，每次最多返回4KB"""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.reads = 0
+
+    def recv_into(self, buffer):
+        count = min(len(buffer), len(self.data), 4096)
+        buffer[:count] = self.data[:count]
+        self.data = self.data[count:]
+        self.reads += 1
+        return count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class FakeFTP:
+    def __init__(self, data):
+        self.data = data
+        self.commands = []
+
+    def voidcmd(self, cmd):
+        self.commands.append(cmd)
+
+    def size(self, path):
+        return len(self.data)
+
+    def transfercmd(self, cmd, rest=None):
+        self.commands.append((cmd, rest))
+        return FakeConnection(self.data[rest or 0:])
+
+    def voidresp(self):
+        return '226 Transfer complete'
+
+    def quit(self):
+        pass
+
+
+class DownloadWriterTest(unittest.TestCase):
+    """数据写入预分配的.part文件，完成后重命名，中止后从.part大小续传"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.local_path = os.path.join(self.data_dir, 'file.bin')
+        self.client = FTPClient('localhost', chunk_size=64 * 1024)
+        self.client.fill_timeout = 60
+        self.client.ftp = FakeFTP(DATA)
+        self.client.connected = True
+        self.client.ensure_connected = lambda: True
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_download_preallocates_and_renames(self):
+        with mock.patch('os.posix_fallocate', wraps=os.posix_fallocate) as fallocate, \
+                mock.patch.object(FTPClient, '_write_at', autospec=True,
+                                  side_effect=FTPClient._write_at) as write_at:
+            self.assertTrue(self.client.download_file('/file.bin', self.local_path))
+        self.assertEqual(fallocate.call_args[0][1:], (0, len(DATA)))
+        # 读满缓冲区后才写入，写入次数按缓冲区大小计算
+        self.assertEqual(write_at.call_count, len(DATA) // (64 * 1024) + 1)
+        self.assertFalse(os.path.exists(f"{self.local_path}.part"))
+        with open(self.local_path, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+
+    def test_aborted_download_truncates_part_and_resumes(self):
+        self.client.progress_bytes = 1
+        self.assertTrue(self.client.download_file('/file.bin', self.local_path,
+                                                  progress_callback=lambda *_: False))
+        part_path = f"{self.local_path}.part"
+        self.assertEqual(os.path.getsize(part_path), 64 * 1024)
+        self.assertFalse(os.path.exists(self.local_path))
+
+        self.assertTrue(self.client.download_file('/file.bin', self.local_path))
+        self.assertIn(('RETR /file.bin', 64 * 1024), self.client.ftp.commands)
+        with open(self.local_path, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+
+    def test_failed_transfer_keeps_downloaded_prefix(self):
+        def broken_resp():
+            raise ftplib.error_temp('426 Connection closed')
+
+        # 数据连接在100KB处断开
+        self.client.ftp.transfercmd = lambda cmd, rest=None: FakeConnection(DATA[:100 * 1024])
+        self.client.ftp.voidresp = broken_resp
+        self.assertFalse(self.client.download_file('/file.bin', self.local_path))
+        # 预分配的未写入部分已去掉，.part大小等于已下载字节数
+        self.assertEqual(os.path.getsize(f"{self.local_path}.part"), 100 * 1024)
+
+    def test_existing_complete_file_is_skipped(self):
+        with open(self.local_path, 'wb') as f:
+            f.write(DATA)
+        self.assertTrue(self.client.download_file('/file.bin', self.local_path))
+        self.assertFalse(any(isinstance(cmd, tuple) for cmd in self.client.ftp.commands))
+
+
+if __name__ == '__main__':
+    unittest.main()
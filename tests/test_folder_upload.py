@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件夹并行上传测试
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.folder_transfer import FolderUploadEngine
+
+
+class FakeSession:
+    """记录创建的目录和上传的文件"""
+
+    def __init__(self, uploads, fail_once=()):
+        self.uploads = uploads
+        self.fail_once = set(fail_once)
+        self.created_directories = []
+        self.known_directories = set()
+        self.connected = True
+        self.last_error = None
+
+    def ensure_remote_directory(self, remote_dir):
+        if remote_dir not in self.known_directories:
+            self.created_directories.append(remote_dir)
+            self.known_directories.add(remote_dir)
+        return True
+
+    def upload_file(self, local_path, remote_path, progress_callback=None):
+        if remote_path in self.fail_once:
+            self.fail_once.discard(remote_path)
+            self.last_error = "553 Could not create file"
+            return False
+        self.uploads.append((local_path, remote_path))
+        return True
+
+
+class FakePool:
+    def __init__(self, fail_once=()):
+        self.lock = threading.Lock()
+        self.uploads = []
+        self.sessions = []
+        self.released = 0
+        self.fail_once = fail_once
+
+    def acquire(self, site_config, timeout=None, task_id=None):
+        with self.lock:
+            session = FakeSession(self.uploads, self.fail_once)
+            self.sessions.append(session)
+            return session
+
+    def release(self, client, discard=False):
+        with self.lock:
+            self.released += 1
+
+
+class FolderUploadTest(unittest.TestCase):
+    """上传清单、目录预创建和并行上传"""
+
+    def setUp(self):
+        self.local_dir = tempfile.mkdtemp()
+        for rel_path in ('b.txt', 'a/1.txt', 'a/c/2.txt', 'd/3.txt'):
+            path = os.path.join(self.local_dir, *rel_path.split('/'))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(rel_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.local_dir, ignore_errors=True)
+
+    def test_manifest_lists_parents_first(self):
+        manifest = FolderUploadEngine.build_manifest(self.local_dir)
+        self.assertEqual(manifest['directories'], ['a', 'a/c', 'd'])
+        self.assertEqual(manifest['files'], [['b.txt', 5], ['a/1.txt', 7], ['a/c/2.txt', 9], ['d/3.txt', 7]])
+
+    def test_directories_created_once_then_files_uploaded_in_parallel(self):
+        pool = FakePool()
+        engine = FolderUploadEngine(pool, {'id': 'site_1'}, concurrency=3)
+        manifest = FolderUploadEngine.build_manifest(self.local_dir)
+        result = engine.run(self.local_dir, '/upload/', manifest, {'b.txt'}, lambda: False)
+
+        self.assertTrue(result['finished'])
+        self.assertTrue(result['directories_ready'])
+        self.assertEqual(pool.sessions[0].created_directories,
+                         ['/upload', '/upload/a', '/upload/a/c', '/upload/d'])
+        # 其他会话共享主会话已知的目录，不再创建
+        self.assertTrue(all(not session.created_directories for session in pool.sessions[1:]))
+        self.assertEqual(len(pool.sessions), 3)
+        self.assertEqual(sorted(remote for _, remote in pool.uploads),
+                         ['/upload/a/1.txt', '/upload/a/c/2.txt', '/upload/d/3.txt'])
+        self.assertEqual(result['transferred_bytes'], 23)
+        self.assertEqual(pool.released, 3)
+
+    def test_stop_before_directories_ready(self):
+        pool = FakePool()
+        engine = FolderUploadEngine(pool, {'id': 'site_1'})
+        result = engine.run(self.local_dir, '/upload', FolderUploadEngine.build_manifest(self.local_dir),
+                            set(), lambda: True)
+        self.assertFalse(result['directories_ready'])
+        self.assertFalse(result['finished'])
+        self.assertEqual(pool.uploads, [])
+
+    def test_failed_upload_is_retried(self):
+        pool = FakePool(fail_once={'/upload/d/3.txt'})
+        engine = FolderUploadEngine(pool, {'id': 'site_1'}, concurrency=1, max_retries=1)
+        manifest = FolderUploadEngine.build_manifest(self.local_dir)
+        result = engine.run(self.local_dir, '/upload', manifest, set(), lambda: False, directories_ready=True)
+        self.assertTrue(result['finished'])
+        self.assertEqual(result['failed_files'], {})
+        self.assertEqual(len(result['completed_files']), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
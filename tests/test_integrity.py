@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+完整性校验测试
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core import integrity
+from app.core.integrity import RunningDigest, parse_hash_reply, sample_ranges
+
+
+SHA256 = hashlib.sha256(b'data').hexdigest()
+MD5 = hashlib.md5(b'data').hexdigest()
+
+
+class ParseHashReplyTest(unittest.TestCase):
+    """HASH/XCRC/XMD5响应解析"""
+
+    def test_hash_reply(self):
+        self.assertEqual(parse_hash_reply(f"213 SHA-256 0-3 {SHA256.upper()} data.bin", 'sha256'), SHA256)
+
+    def test_hash_reply_with_hex_filename(self):
+        self.assertEqual(parse_hash_reply("213 CRC32 0-3 1a2b3c4d cafe", 'crc32'), '1a2b3c4d')
+
+    def test_xmd5_reply(self):
+        self.assertEqual(parse_hash_reply(f"250 {MD5}", 'md5'), MD5)
+        self.assertEqual(parse_hash_reply(f"250 {MD5} data.bin", 'md5'), MD5)
+
+    def test_xcrc_reply(self):
+        self.assertEqual(parse_hash_reply("250 0A2B3C4D", 'crc32'), '0a2b3c4d')
+
+    def test_crc32_requires_eight_hex_digits(self):
+        self.assertIsNone(parse_hash_reply("250 a2b3c4d", 'crc32'))
+        self.assertIsNone(parse_hash_reply("213 CRC32 0-3 cafe", 'crc32'))
+        self.assertIsNone(parse_hash_reply("250 Transfer ok cafe", 'crc32'))
+
+    def test_wrong_algorithm_or_length(self):
+        self.assertIsNone(parse_hash_reply(f"213 SHA-1 0-3 {SHA256} data.bin", 'sha256'))
+        self.assertIsNone(parse_hash_reply(f"250 {MD5}", 'sha256'))
+        self.assertIsNone(parse_hash_reply("250", 'md5'))
+
+
+class RunningDigestTest(unittest.TestCase):
+    """续传时从摘要状态继续计算"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.data_dir, 'file.part')
+        self.data = os.urandom(10000)
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_resume_reads_only_missing_bytes(self):
+        digest = RunningDigest('sha256')
+        digest.update(self.data[:6000])
+        with mock.patch.object(integrity, 'hash_file', wraps=integrity.hash_file) as hash_file:
+            digest.resume(self.path, 6000)
+            self.assertFalse(hash_file.called)
+            digest.resume(self.path, 8000)
+            self.assertEqual(hash_file.call_args[1]['offset'], 6000)
+        digest.update(self.data[8000:])
+        self.assertEqual(digest.hexdigest(), hashlib.sha256(self.data).hexdigest())
+
+    def test_resume_before_offset_restarts(self):
+        digest = RunningDigest('md5')
+        digest.update(b'stale data')
+        digest.resume(self.path, 0)
+        digest.update(self.data)
+        self.assertEqual(digest.hexdigest(), hashlib.md5(self.data).hexdigest())
+
+    def test_crc32_state_round_trip(self):
+        digest = RunningDigest('crc32')
+        digest.update(self.data[:4000])
+        restored = RunningDigest.from_state(digest.state(), 'crc32')
+        self.assertEqual(restored.offset, 4000)
+        restored.update(self.data[4000:])
+        self.assertEqual(restored.hexdigest(), f"{zlib.crc32(self.data):08x}")
+
+    def test_hashlib_state_is_not_restored(self):
+        digest = RunningDigest('sha256')
+        digest.update(self.data)
+        self.assertIsNone(RunningDigest.from_state(digest.state(), 'sha256'))
+        self.assertIsNone(RunningDigest.from_state(None, 'crc32'))
+
+
+class SampleRangesTest(unittest.TestCase):
+    def test_small_range_compared_whole(self):
+        self.assertEqual(sample_ranges(10, 100, 8, 64), [(10, 90)])
+
+    def test_samples_include_both_ends(self):
+        ranges = sample_ranges(0, 10000, 4, 100)
+        self.assertEqual(ranges[0], (0, 100))
+        self.assertEqual(ranges[-1], (9900, 100))
+
+
+if __name__ == '__main__':
+    unittest.main()
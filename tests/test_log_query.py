@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志查询测试
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.log_query import LogQueryEngine
+from app.models.log_writer import JSONLLogWriter
+
+
+def make_entry(i, day='2024-05-01'):
+    return {'timestamp': f"{day}T10:{i // 60:02d}:{i % 60:02d}", 'seq': i,
+            'action': 'download' if i % 2 else 'upload', 'site_id': f"site_{i % 3}"}
+
+
+class LogQueryTest(unittest.TestCase):
+    """倒序查询、游标分页和过滤测试"""
+
+    compress = False
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        # 分段很小，保证日志分布在多个分段中
+        self.writer = JSONLLogWriter(self.log_dir, max_segment_size=2048, flush_interval=60,
+                                     compress_rotated=self.compress)
+        self.engine = LogQueryEngine(self.writer)
+        for i in range(200):
+            self.writer.write('transfers', make_entry(i))
+        self.writer.flush()
+
+    def tearDown(self):
+        self.writer.close()
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def page_all(self, **kwargs):
+        seqs = []
+        cursor = None
+        pages = 0
+        while True:
+            result = self.engine.query('transfers', limit=30, cursor=cursor, **kwargs)
+            seqs.extend(entry['seq'] for entry in result['logs'])
+            pages += 1
+            cursor = result['next_cursor']
+            if cursor is None:
+                return seqs, pages
+
+    def test_segments_rotated(self):
+        self.assertGreater(len(self.writer.list_segments('transfers', '2024-05-01')), 3)
+
+    def test_cursor_pages_cover_all_entries_newest_first(self):
+        seqs, pages = self.page_all(date='2024-05-01')
+        self.assertEqual(seqs, list(range(199, -1, -1)))
+        self.assertEqual(pages, 7)
+
+    def test_time_range(self):
+        seqs, _ = self.page_all(since='2024-05-01T10:01:00', until='2024-05-01T10:01:59')
+        self.assertEqual(seqs, list(range(119, 59, -1)))
+
+    def test_filters_with_cursor(self):
+        seqs, _ = self.page_all(date='2024-05-01', filters={'action': 'download', 'site_id': 'site_0'})
+        self.assertEqual(seqs, [i for i in range(199, -1, -1) if i % 2 and i % 3 == 0])
+
+    def test_new_entries_do_not_shift_existing_cursor(self):
+        first = self.engine.query('transfers', date='2024-05-01', limit=10)
+        self.writer.write('transfers', make_entry(200))
+        second = self.engine.query('transfers', date='2024-05-01', limit=10, cursor=first['next_cursor'])
+        self.assertEqual([entry['seq'] for entry in second['logs']], list(range(189, 179, -1)))
+
+    def test_legacy_json_file_is_read_after_segments(self):
+        legacy = os.path.join(self.log_dir, 'transfers', '2024-05-01.json')
+        with open(legacy, 'w', encoding='utf-8') as f:
+            json.dump([{'timestamp': '2024-05-01T09:00:00', 'seq': -1}], f)
+        seqs, _ = self.page_all(date='2024-05-01')
+        self.assertEqual(seqs[-1], -1)
+        self.assertEqual(len(seqs), 201)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(Exception):
+            self.engine.query('transfers', cursor='bad')
+
+
+class CompressedLogQueryTest(LogQueryTest):
+    """轮转后压缩的分段"""
+
+    compress = True
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON Lines日志写入测试
+"""
+
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.log_writer import JSONLLogWriter
+
+
+def make_entry(i, day='2024-05-01'):
+    return {'timestamp': f"{day}T10:00:{i % 60:02d}", 'seq': i, 'message': '下载完成'}
+
+
+def read_lines(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+class JSONLLogWriterTest(unittest.TestCase):
+    """追加写入、按日期和大小轮转、压缩已关闭的分段"""
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def create_writer(self, **kwargs):
+        kwargs.setdefault('flush_interval', 60)
+        writer = JSONLLogWriter(self.log_dir, **kwargs)
+        self.addCleanup(writer.close)
+        return writer
+
+    def segment_paths(self, writer, date='2024-05-01'):
+        return [segment[3] for segment in writer.list_segments('transfers', date)]
+
+    def test_entries_appended_as_lines(self):
+        writer = self.create_writer()
+        for i in range(3):
+            writer.write('transfers', make_entry(i))
+        writer.flush()
+        path = os.path.join(self.log_dir, 'transfers', '2024-05-01.jsonl')
+        self.assertEqual([entry['seq'] for entry in read_lines(path)], [0, 1, 2])
+        self.assertEqual(read_lines(path)[0]['message'], '下载完成')
+
+    def test_rotates_by_date(self):
+        writer = self.create_writer()
+        writer.write('transfers', make_entry(0, '2024-05-01'))
+        writer.write('transfers', make_entry(1, '2024-05-02'))
+        writer.flush()
+        self.assertEqual(len(self.segment_paths(writer, '2024-05-01')), 1)
+        self.assertEqual(len(self.segment_paths(writer, '2024-05-02')), 1)
+
+    def test_rotates_by_size_and_compresses(self):
+        writer = self.create_writer(max_segment_size=512, compress_rotated=True)
+        for i in range(50):
+            writer.write('transfers', make_entry(i))
+        writer.flush()
+
+        paths = self.segment_paths(writer)
+        self.assertGreater(len(paths), 2)
+        self.assertTrue(all(path.endswith('.gz') for path in paths[:-1]))
+        self.assertFalse(paths[-1].endswith('.gz'))
+        seqs = [entry['seq'] for path in paths for entry in read_lines(path)]
+        self.assertEqual(seqs, list(range(50)))
+
+    def test_reopen_continues_after_compressed_segment(self):
+        writer = self.create_writer(max_segment_size=512, compress_rotated=True)
+        for i in range(20):
+            writer.write('transfers', make_entry(i))
+        writer.close()
+
+        # 重新打开后追加到最新的未压缩分段，不覆盖已有分段
+        reopened = self.create_writer(max_segment_size=512, compress_rotated=True)
+        reopened.write('transfers', make_entry(20))
+        reopened.flush()
+        seqs = [entry['seq'] for path in self.segment_paths(reopened) for entry in read_lines(path)]
+        self.assertEqual(seqs, list(range(21)))
+
+    def test_background_flush(self):
+        writer = self.create_writer(flush_interval=0.05)
+        writer.write('operations', make_entry(0))
+        path = os.path.join(self.log_dir, 'operations', '2024-05-01.jsonl')
+        deadline = time.time() + 2
+        while not os.path.exists(path) or not os.path.getsize(path):
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.02)
+        self.assertEqual(read_lines(path)[0]['seq'], 0)
+
+    def test_close_writes_pending_entries(self):
+        writer = self.create_writer()
+        writer.write('transfers', make_entry(0))
+        writer.close()
+        self.assertEqual(len(read_lines(self.segment_paths(writer)[0])), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
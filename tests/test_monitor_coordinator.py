@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监控协调器测试
+"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.scheduler import DynamicTimeSliceScheduler
+from app.services.monitor_coordinator import MonitorCoordinator, next_poll_interval
+
+
+SITE = {'id': 'site_1'}
+
+
+class FakeClient:
+    """记录列目录次数的会话"""
+
+    def __init__(self):
+        self.listed = []
+
+    def list_entries(self, path):
+        self.listed.append(path)
+        return [{'name': f"file{len(self.listed)}.txt", 'size': 1, 'is_directory': False, 'modified': None}]
+
+
+class FakePool:
+    def __init__(self):
+        self.client = FakeClient()
+
+    def acquire(self, site_config, timeout=None, task_id=None):
+        return self.client
+
+    def release(self, client, discard=False):
+        pass
+
+
+class FakeScheduler:
+    """监控同一站点的其他任务"""
+
+    def __init__(self, tasks=()):
+        self.tasks = list(tasks)
+
+    def find_tasks(self, func_name, site_id=None):
+        return self.tasks
+
+
+class MonitorCoordinatorTest(unittest.TestCase):
+    """列表共享、过期和每个监控只使用更新的列表"""
+
+    def setUp(self):
+        self.pool = FakePool()
+        self.coordinator = MonitorCoordinator(self.pool, FakeScheduler(), share_window=0.3)
+
+    def test_other_monitor_reuses_listing(self):
+        first, listed_at = self.coordinator.get_listing(SITE, '/data', 'task_1')
+        second, shared_at = self.coordinator.get_listing(SITE, '/data/', 'task_2')
+        self.assertEqual(first, second)
+        self.assertEqual(listed_at, shared_at)
+        self.assertEqual(self.pool.client.listed, ['/data'])
+        self.assertEqual(self.coordinator.get_statistics()['shared_hits'], 1)
+
+    def test_same_monitor_never_gets_consumed_listing(self):
+        _, first_at = self.coordinator.get_listing(SITE, '/data', 'task_1')
+        _, second_at = self.coordinator.get_listing(SITE, '/data', 'task_1')
+        self.assertGreater(second_at, first_at)
+        self.assertEqual(len(self.pool.client.listed), 2)
+
+    def test_listing_expires_after_share_window(self):
+        self.coordinator.get_listing(SITE, '/data', 'task_1')
+        time.sleep(0.35)
+        self.coordinator.get_listing(SITE, '/data', 'task_2')
+        self.assertEqual(len(self.pool.client.listed), 2)
+
+    def test_due_monitors_listed_together(self):
+        self.coordinator.scheduler = FakeScheduler([
+            {'remote_path': '/other', 'status': 'pending', 'next_execution': None},
+            {'remote_path': '/paused', 'status': 'paused'}
+        ])
+        self.coordinator.get_listing(SITE, '/data', 'task_1')
+        self.coordinator.get_listing(SITE, '/other', 'task_2')
+        self.assertEqual(self.pool.client.listed, ['/data', '/other'])
+
+    def test_list_directory_with_callers_session(self):
+        client = FakeClient()
+        self.coordinator.list_directory(client, SITE, '/data/sub', 'task_1')
+        self.coordinator.list_directory(client, SITE, '/data/sub', 'task_2')
+        self.coordinator.list_directory(client, SITE, '/data/sub', 'task_1')
+        self.assertEqual(client.listed, ['/data/sub', '/data/sub'])
+
+
+class PollIntervalTest(unittest.TestCase):
+    """自适应轮询间隔及其上下限"""
+
+    def test_backs_off_without_changes_up_to_max(self):
+        interval = 300
+        for expected in (600, 1200, 1800, 1800):
+            interval = next_poll_interval(interval, 0, 0, 30, 1800)
+            self.assertEqual(interval, expected)
+
+    def test_changes_speed_up_down_to_min(self):
+        interval = 1800
+        for expected in (900, 450, 225, 112.5, 56.25, 30, 30):
+            interval = next_poll_interval(interval, 1, 0, 30, 1800)
+            self.assertEqual(interval, expected)
+
+    def test_burst_or_pending_uses_min_interval(self):
+        self.assertEqual(next_poll_interval(1800, 10, 0, 30, 1800), 30)
+        self.assertEqual(next_poll_interval(1800, 0, 1, 30, 1800), 30)
+
+    def test_previous_outside_bounds_is_clamped(self):
+        self.assertEqual(next_poll_interval(5, 1, 0, 30, 1800), 30)
+        self.assertEqual(next_poll_interval(10000, 0, 0, 30, 1800), 1800)
+
+    def test_reschedule_uses_next_interval_with_jitter(self):
+        scheduler = DynamicTimeSliceScheduler(default_monitor_interval=300, reschedule_jitter=0.1)
+        task = {'checkpoint_data': {'next_interval': 1000}, 'monitor_interval': 60}
+        for _ in range(50):
+            self.assertTrue(900 <= scheduler._reschedule_interval(task) <= 1100)
+        self.assertTrue(270 <= scheduler._reschedule_interval({'checkpoint_data': {}}) <= 330)
+
+
+if __name__ == '__main__':
+    unittest.main()
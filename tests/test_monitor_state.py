@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+监控状态存储测试
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.data_manager import DataManager
+from app.models.storage import JSONStorage
+
+
+SIGNATURES = {'a.txt': (10, 20240501110000), 'sub/b.txt': (None, None)}
+PENDING = {'c.txt': [5, 20240501115900, 1]}
+
+
+class MonitorStateStorageTest(unittest.TestCase):
+    """监控状态经由存储后端保存、备份和删除"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def create_manager(self, backend):
+        manager = DataManager(self.data_dir, backup_interval=3600, storage_backend=backend)
+        self.addCleanup(manager.shutdown)
+        return manager
+
+    def check_round_trip(self, manager):
+        tree = {'directories': {'': ['abc', None]},
+                'scan': {'cursor': [['sub', 1]], 'signatures': {'x.txt': (1, 2)}}}
+        manager.save_monitor_state('monitor_000001', SIGNATURES, PENDING, tree)
+        state = manager.load_monitor_state('monitor_000001')
+        self.assertEqual(state['signatures'], SIGNATURES)
+        self.assertEqual(state['pending'], PENDING)
+        self.assertEqual(state['tree']['scan']['signatures'], {'x.txt': (1, 2)})
+
+        manager.delete_monitor_state('monitor_000001')
+        self.assertIsNone(manager.load_monitor_state('monitor_000001'))
+
+    def test_json_round_trip(self):
+        self.check_round_trip(self.create_manager('json'))
+
+    def test_sqlite_round_trip(self):
+        manager = self.create_manager('sqlite')
+        self.check_round_trip(manager)
+        self.assertFalse(os.path.exists(os.path.join(self.data_dir, 'monitor_signatures')))
+
+    def test_json_backup_includes_monitor_state(self):
+        manager = self.create_manager('json')
+        manager.save_monitor_state('monitor_000001', SIGNATURES)
+        manager._create_backup()
+        backups = os.listdir(os.path.join(self.data_dir, 'backups'))
+        self.assertEqual(len(backups), 1)
+        self.assertTrue(os.path.exists(os.path.join(
+            self.data_dir, 'backups', backups[0], 'monitor_signatures', 'monitor_000001.json')))
+
+    def test_sqlite_imports_legacy_state_files(self):
+        self.create_manager('sqlite').shutdown()
+        legacy = JSONStorage(self.data_dir)
+        legacy.save_monitor_state('monitor_000002', {'version': 1, 'names': ['a.txt'], 'sizes': [3],
+                                                     'mtimes': [None], 'pending': {}})
+
+        manager = self.create_manager('sqlite')
+        self.assertEqual(manager.load_monitor_state('monitor_000002')['signatures'], {'a.txt': (3, None)})
+        self.assertEqual(legacy.list_monitor_states(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程池执行器测试
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.integrity import file_digest
+from app.core.process_executor import ProcessStageExecutor, StageContext
+
+
+def stage_pid(context, value):
+    """阶段函数：上报进度并返回执行进程的pid"""
+    context.report(50.0, {'value': value})
+    return os.getpid(), value * 2
+
+
+def task_pid(task_id, timeout, context, value):
+    """任务函数：返回执行进程的pid和截止前是否需要让出"""
+    return os.getpid(), context.should_yield(), value
+
+
+def failing_stage(context):
+    raise ValueError("stage failed")
+
+
+class ProcessStageExecutorTest(unittest.TestCase):
+    """阶段在spawn进程池中执行，进度经队列回到主进程"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = ProcessStageExecutor(max_processes=1)
+        cls.progress = []
+        cls.received = threading.Event()
+
+        def handler(task_id, progress, checkpoint_data):
+            cls.progress.append((task_id, progress, checkpoint_data))
+            cls.received.set()
+
+        cls.executor.start(handler)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def test_pool_uses_spawn(self):
+        self.assertEqual(self.executor.context.get_start_method(), 'spawn')
+
+    def test_stage_runs_in_child_process(self):
+        pid, result = self.executor.run_stage('task_1', stage_pid, 21)
+        self.assertNotEqual(pid, os.getpid())
+        self.assertEqual(result, 42)
+        self.assertTrue(self.received.wait(5))
+        self.assertIn(('task_1', 50.0, {'value': 21}), self.progress)
+
+    def test_task_runs_in_child_process(self):
+        pid, should_yield, value = self.executor.run_task(task_pid, 'task_2', 60, ('x',), {})
+        self.assertNotEqual(pid, os.getpid())
+        self.assertFalse(should_yield)
+        self.assertEqual(value, 'x')
+
+    def test_file_digest_stage(self):
+        data_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, data_dir, True)
+        path = os.path.join(data_dir, 'file.bin')
+        with open(path, 'wb') as f:
+            f.write(b'data' * 1000)
+        digest = self.executor.run_stage('task_3', file_digest, path, 4000, 'crc32', report_interval=1000)
+        self.assertEqual(digest, file_digest(StageContext('task_3'), path, 4000, 'crc32'))
+
+    def test_stage_error_is_raised(self):
+        failed = self.executor.get_statistics()['failed']
+        with self.assertRaises(ValueError):
+            self.executor.run_stage('task_4', failing_stage)
+        self.assertEqual(self.executor.get_statistics()['failed'], failed + 1)
+
+
+class StageContextTest(unittest.TestCase):
+    def test_deadline_yield_in_child(self):
+        self.assertTrue(StageContext('task_1', time.time() - 1).should_yield())
+        self.assertFalse(StageContext('task_1', time.time() + 60).should_yield())
+        self.assertFalse(StageContext('task_1').should_yield())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+传输限速测试
+"""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.rate_limiter import HierarchicalRateLimiter, TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+    """令牌桶的补充、预支和容量"""
+
+    def test_reserve_and_refill(self):
+        bucket = TokenBucket(1000)
+        now = bucket.updated
+        self.assertEqual(bucket.reserve(1000, now), 0.0)
+        # 预支的500字节需要等待0.5秒补足
+        self.assertAlmostEqual(bucket.reserve(500, now), 0.5)
+        self.assertAlmostEqual(bucket.reserve(0, now + 1.0), 0.0)
+        self.assertAlmostEqual(bucket.tokens, 500)
+
+    def test_tokens_capped_at_burst(self):
+        bucket = TokenBucket(1000, burst_seconds=2)
+        bucket.reserve(0, bucket.updated + 60)
+        self.assertEqual(bucket.tokens, 2000)
+
+    def test_unlimited_bucket_never_waits(self):
+        self.assertEqual(TokenBucket(0).reserve(10 ** 9, 0), 0.0)
+
+    def test_lower_rate_drops_excess_tokens(self):
+        bucket = TokenBucket(1000)
+        bucket.set_rate(100)
+        self.assertLessEqual(bucket.tokens, 100)
+
+
+class HierarchicalRateLimiterTest(unittest.TestCase):
+    """全局、站点、任务三级限速按最慢的一级等待"""
+
+    def setUp(self):
+        self.limiter = HierarchicalRateLimiter(global_rate=10000)
+        self.limiter.set_site_limit('site_1', 4000)
+        self.limiter.set_task_limit('task_1', 1000)
+
+    def consume(self, nbytes, site_id=None, task_id=None):
+        with mock.patch('app.core.rate_limiter.time.sleep') as sleep:
+            self.limiter.consume(nbytes, site_id, task_id)
+        return sleep.call_args[0][0] if sleep.called else 0.0
+
+    def test_effective_rate_is_slowest_level(self):
+        self.assertEqual(self.limiter.get_effective_rate('site_1', 'task_1'), 1000)
+        self.assertEqual(self.limiter.get_effective_rate('site_1', 'task_2'), 4000)
+        self.assertEqual(self.limiter.get_effective_rate('site_2'), 10000)
+        self.assertIsNone(HierarchicalRateLimiter().get_effective_rate('site_1', 'task_1'))
+
+    def test_wait_follows_slowest_bucket(self):
+        self.assertEqual(self.consume(1000, 'site_1', 'task_1'), 0.0)
+        # 任务桶已空，再传输1000字节需要等待约1秒
+        self.assertAlmostEqual(self.consume(1000, 'site_1', 'task_1'), 1.0, places=2)
+
+    def test_site_tokens_shared_by_tasks(self):
+        self.assertEqual(self.consume(4000, 'site_1', 'task_2'), 0.0)
+        self.assertAlmostEqual(self.consume(2000, 'site_1', 'task_3'), 0.5, places=2)
+        # 其他站点只受全局限速
+        self.assertEqual(self.consume(4000, 'site_2', 'task_4'), 0.0)
+
+    def test_global_limit_applies_to_all_sites(self):
+        self.consume(10000, 'site_2')
+        self.assertAlmostEqual(self.consume(5000, 'site_3'), 0.5, places=2)
+
+    def test_chunk_size_follows_effective_rate(self):
+        self.assertEqual(self.limiter.chunk_size('site_1', 'task_1', 65536), 4096)
+        self.assertEqual(self.limiter.chunk_size('site_1', None, 65536), 4096)
+        self.limiter.set_global_limit(0)
+        self.limiter.set_site_limit('site_1', 0)
+        self.assertEqual(self.limiter.chunk_size('site_1', None, 65536), 65536)
+        self.limiter.set_site_limit('site_1', 1024 * 1024)
+        self.assertEqual(self.limiter.chunk_size('site_1', None, 65536), 65536)
+        self.assertEqual(self.limiter.chunk_size('site_1', None, 1024 * 1024), 256 * 1024)
+
+    def test_runtime_site_limit_overrides_config(self):
+        self.limiter.configure_site('site_1', 9000)
+        self.assertEqual(self.limiter.get_limits()['sites']['site_1'], 4000)
+        self.limiter.configure_site('site_2', 2000)
+        self.assertEqual(self.limiter.get_limits()['sites']['site_2'], 2000)
+
+    def test_removed_task_is_not_limited(self):
+        self.limiter.remove_task('task_1')
+        self.assertEqual(self.limiter.get_effective_rate('site_1', 'task_1'), 4000)
+
+    def test_throttle_statistics(self):
+        self.consume(1000, 'site_1', 'task_1')
+        self.consume(1000, 'site_1', 'task_1')
+        stats = self.limiter.get_limits()['stats']
+        self.assertEqual(stats['throttled_bytes'], 1000)
+        self.assertGreater(stats['throttle_wait_time'], 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
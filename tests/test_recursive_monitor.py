@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+递归监控目录树遍历测试
+"""
+
+import ftplib
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.task_service import TaskService
+
+
+SITE = {'id': 'site_1'}
+OLD = '2024-01-01T00:00:00'
+
+
+def file_entry(name, size=1):
+    return {'name': name, 'size': size, 'is_directory': False, 'modified': OLD}
+
+
+def dir_entry(name):
+    return {'name': name, 'size': 0, 'is_directory': True, 'modified': OLD}
+
+
+class FakeClient:
+    """按tree列目录，按dir_mtimes返回目录的MLST修改时间"""
+
+    def __init__(self, tree, dir_mtimes, listed):
+        self.tree = tree
+        self.dir_mtimes = dir_mtimes
+        self.listed = listed
+
+    def list_entries(self, path):
+        self.listed.append(path)
+        if path not in self.tree:
+            raise ftplib.error_perm('550 No such directory')
+        return list(self.tree[path])
+
+    def get_modify_time(self, path):
+        return self.dir_mtimes.get(path)
+
+
+class FakePool:
+    def __init__(self, tree, dir_mtimes):
+        self.listed = []
+        self.client = FakeClient(tree, dir_mtimes, self.listed)
+
+    def acquire(self, site_config, timeout=None, task_id=None):
+        return self.client
+
+    def release(self, client, discard=False):
+        pass
+
+
+class FakeScheduler:
+    def find_tasks(self, func_name, site_id=None):
+        return []
+
+    def update_task_progress(self, task_id, progress, checkpoint_data=None):
+        pass
+
+
+class FakeDataManager:
+    def __init__(self):
+        self.saved = {}
+
+    def save_monitor_state(self, monitor_id, signatures, pending=None, tree=None):
+        self.saved[monitor_id] = {'signatures': signatures, 'pending': pending, 'tree': tree}
+
+
+class RecursiveMonitorScanTest(unittest.TestCase):
+    """未变化的子目录不再列出，游标跨时间片继续，深度限制和无法列出的目录"""
+
+    def setUp(self):
+        self.tree = {
+            '/mon': [file_entry('a.txt'), dir_entry('sub')],
+            '/mon/sub': [file_entry('b.txt'), dir_entry('deep')],
+            '/mon/sub/deep': [file_entry('c.txt')]
+        }
+        self.dir_mtimes = {'/mon/sub': '2024-01-01T00:00:00', '/mon/sub/deep': '2024-01-01T00:00:00'}
+        self.pool = FakePool(self.tree, self.dir_mtimes)
+        self.data_manager = FakeDataManager()
+        self.service = TaskService(FakeScheduler(), self.data_manager, connection_pool=self.pool,
+                                   monitor_full_scan_interval=3600)
+
+    def scan(self, state=None, max_depth=None, should_stop=lambda: False):
+        return self.service._scan_monitor_tree('task_1', self.service.scheduler, SITE, '/mon', 'monitor_1',
+                                               state, max_depth, should_stop)
+
+    def first_state(self):
+        current, tree, _, _ = self.scan()
+        del self.pool.listed[:]
+        return {'signatures': current, 'pending': {}, 'tree': tree}
+
+    def test_first_scan_lists_whole_tree(self):
+        current, tree, mtimes_utc, listed_at = self.scan()
+        self.assertEqual(set(current), {'a.txt', 'sub/b.txt', 'sub/deep/c.txt'})
+        self.assertEqual(set(tree['directories']), {'', 'sub', 'sub/deep'})
+        self.assertEqual(self.pool.listed, ['/mon', '/mon/sub', '/mon/sub/deep'])
+        self.assertIsNotNone(tree['full_scan_at'])
+        self.assertIsNotNone(listed_at)
+
+    def test_unchanged_directories_are_not_listed(self):
+        state = self.first_state()
+        current, _, _, _ = self.scan(state)
+        self.assertEqual(self.pool.listed, ['/mon'])
+        self.assertEqual(current, state['signatures'])
+
+    def test_changed_subtree_is_listed(self):
+        state = self.first_state()
+        self.tree['/mon/sub/deep'] = [file_entry('c.txt'), file_entry('d.txt', 5)]
+        self.dir_mtimes['/mon/sub/deep'] = '2024-01-02T00:00:00'
+        current, _, _, _ = self.scan(state)
+        self.assertEqual(self.pool.listed, ['/mon', '/mon/sub/deep'])
+        self.assertEqual(current['sub/deep/d.txt'][0], 5)
+        self.assertIn('sub/b.txt', current)
+
+    def test_full_scan_after_interval(self):
+        state = self.first_state()
+        state['tree']['full_scan_at'] -= 7200
+        self.scan(state)
+        self.assertEqual(self.pool.listed, ['/mon', '/mon/sub', '/mon/sub/deep'])
+
+    def test_max_depth(self):
+        current, tree, _, _ = self.scan(max_depth=1)
+        self.assertEqual(set(current), {'a.txt', 'sub/b.txt'})
+        self.assertNotIn('/mon/sub/deep', self.pool.listed)
+
+    def test_cursor_resumes_in_next_slice(self):
+        self.assertIsNone(self.scan(should_stop=lambda: True))
+        saved = self.data_manager.saved['monitor_1']
+        self.assertEqual(saved['tree']['scan']['cursor'], [['sub/deep', 2]])
+
+        current, _, _, _ = self.scan(self.service.monitor_states['monitor_1'])
+        self.assertEqual(set(current), {'a.txt', 'sub/b.txt', 'sub/deep/c.txt'})
+        self.assertEqual(self.pool.listed, ['/mon', '/mon/sub', '/mon/sub/deep'])
+
+    def test_unlistable_directory_keeps_previous_signatures(self):
+        state = self.first_state()
+        del self.tree['/mon/sub']
+        self.dir_mtimes['/mon/sub'] = None
+        current, tree, _, _ = self.scan(state)
+        self.assertIn('sub/b.txt', current)
+        self.assertIn('sub/deep/c.txt', current)
+        self.assertIn('sub/deep', tree['directories'])
+
+
+if __name__ == '__main__':
+    unittest.main()
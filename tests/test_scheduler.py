@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+调度器测试
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.connection_pool import PoolExhaustedError
+from app.core.scheduler import DynamicTimeSliceScheduler
+
+
+def wait_for(condition, timeout=5.0):
+    """等待条件成立，超时返回False"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class ElasticPoolIdleTest(unittest.TestCase):
+    """elastic线程池空闲测试"""
+
+    def test_idle_workers_at_minimum_do_not_spin(self):
+        """线程数已是最小值时，空闲超时后的工作线程应阻塞等待而不是反复唤醒"""
+        scheduler = DynamicTimeSliceScheduler(max_workers=2, worker_mode='elastic', min_workers=1,
+                                              worker_idle_timeout=0.2, scale_interval=0.5)
+        wakeups = []
+        original_wait = scheduler.task_available.wait
+
+        def counting_wait(timeout=None):
+            wakeups.append(timeout)
+            return original_wait(timeout)
+
+        scheduler.task_available.wait = counting_wait
+        scheduler.start_workers()
+        try:
+            time.sleep(1.5)
+            self.assertEqual(len(scheduler.workers), 1)
+            self.assertLess(len(wakeups), 20)
+        finally:
+            scheduler.stop_workers()
+
+    def test_idle_worker_above_minimum_retires(self):
+        """线程数多于最小值时空闲超时的线程退出"""
+        scheduler = DynamicTimeSliceScheduler(max_workers=3, worker_mode='elastic', min_workers=1,
+                                              worker_idle_timeout=0.2, scale_interval=0.5)
+        scheduler.start_workers()
+        try:
+            with scheduler.task_available:
+                scheduler.target_workers = 3
+                scheduler._ensure_workers()
+            deadline = time.time() + 3
+            while time.time() < deadline and len(scheduler.workers) > 1:
+                time.sleep(0.05)
+            self.assertEqual(len(scheduler.workers), 1)
+            self.assertEqual(scheduler.target_workers, 1)
+        finally:
+            scheduler.stop_workers()
+
+
+class SiteAdmissionTest(unittest.TestCase):
+    """按站点轮转出队与站点并发上限测试（不启动工作线程，直接出队）"""
+
+    def add(self, scheduler, site_id, priority='medium'):
+        return scheduler.add_task({'func_name': 'noop', 'priority': priority, 'site_id': site_id})
+
+    def test_sites_take_turns_within_priority(self):
+        scheduler = DynamicTimeSliceScheduler(max_tasks_per_site=0)
+        a1, a2, a3 = (self.add(scheduler, 'site_a') for _ in range(3))
+        b1 = self.add(scheduler, 'site_b')
+        order = [scheduler.get_next_task_from_sequence()['id'] for _ in range(4)]
+        self.assertEqual(order, [a1, b1, a2, a3])
+        self.assertIsNone(scheduler.get_next_task_from_sequence())
+
+    def test_higher_priority_first(self):
+        scheduler = DynamicTimeSliceScheduler()
+        low = self.add(scheduler, 'site_a', 'low')
+        high = self.add(scheduler, 'site_b', 'high')
+        self.assertEqual(scheduler.get_next_task_from_sequence()['id'], high)
+        self.assertEqual(scheduler.get_next_task_from_sequence()['id'], low)
+
+    def test_full_site_is_skipped_until_admission_released(self):
+        scheduler = DynamicTimeSliceScheduler(max_tasks_per_site=1)
+        a1, a2 = self.add(scheduler, 'site_a'), self.add(scheduler, 'site_a')
+        b1 = self.add(scheduler, 'site_b')
+
+        self.assertEqual(scheduler.get_next_task_from_sequence()['id'], a1)
+        self.assertEqual(scheduler.get_next_task_from_sequence()['id'], b1)
+        self.assertIsNone(scheduler.get_next_task_from_sequence())
+        self.assertEqual(scheduler.site_running, {'site_a': 1, 'site_b': 1})
+
+        scheduler._release_admission(a1, scheduler.admissions[a1])
+        self.assertEqual(scheduler.get_next_task_from_sequence()['id'], a2)
+        self.assertEqual(scheduler.site_running, {'site_a': 1, 'site_b': 1})
+
+    def test_stale_admission_is_not_released_twice(self):
+        scheduler = DynamicTimeSliceScheduler(max_tasks_per_site=1)
+        a1 = self.add(scheduler, 'site_a')
+        scheduler.get_next_task_from_sequence()
+        admission = scheduler.admissions[a1]
+        scheduler._release_admission(a1, admission)
+        scheduler._release_admission(a1, admission)
+        self.assertEqual(scheduler.site_running, {})
+
+    def test_site_limit_override(self):
+        scheduler = DynamicTimeSliceScheduler(max_tasks_per_site=1)
+        a1, a2 = self.add(scheduler, 'site_a'), self.add(scheduler, 'site_a')
+        scheduler.set_site_task_limit('site_a', 2)
+        self.assertEqual(scheduler.get_site_task_limit('site_a'), 2)
+        self.assertEqual(scheduler.get_next_task_from_sequence()['id'], a1)
+        self.assertEqual(scheduler.get_next_task_from_sequence()['id'], a2)
+
+
+class LockFreeSaveTest(unittest.TestCase):
+    """保存任务时不持有调度器的锁"""
+
+    def test_save_task_called_without_scheduler_locks(self):
+        scheduler = DynamicTimeSliceScheduler()
+
+        class RecordingDataManager:
+            def __init__(self):
+                self.saves = []
+
+            def save_task(self, task, revision=None):
+                # 在其他线程中尝试获取调度器的锁，锁被持有时获取失败
+                free = []
+
+                def probe():
+                    acquired = [lock for lock in (scheduler.sequence_lock, scheduler.task_lock)
+                                if lock.acquire(timeout=0.5)]
+                    free.append(len(acquired) == 2)
+                    for lock in acquired:
+                        lock.release()
+
+                thread = threading.Thread(target=probe)
+                thread.start()
+                thread.join()
+                self.saves.append((task['status'], revision, free[0]))
+
+        scheduler.data_manager = RecordingDataManager()
+        task_id = scheduler.add_task({'func_name': 'noop', 'priority': 'medium'})
+        scheduler.pause_task(task_id)
+        scheduler.update_task_progress(task_id, 0.5, {'offset': 10})
+        scheduler.resume_task(task_id)
+        scheduler.cancel_task(task_id)
+
+        saves = scheduler.data_manager.saves
+        self.assertEqual([status for status, _, _ in saves], ['pending', 'paused', 'paused', 'pending', 'failed'])
+        self.assertTrue(all(free for _, _, free in saves))
+        revisions = [revision for _, revision, _ in saves]
+        self.assertEqual(revisions, sorted(revisions))
+
+
+class PoolExhaustedTest(unittest.TestCase):
+    """连接池已满时的任务处理测试"""
+
+    def test_pool_exhausted_task_is_retried_not_failed(self):
+        scheduler = DynamicTimeSliceScheduler(max_workers=1, pool_retry_delay=0.2)
+        attempts = []
+
+        def task(task_id, time_slice, scheduler):
+            attempts.append(time.time())
+            if len(attempts) == 1:
+                raise PoolExhaustedError("获取FTP连接超时")
+            return "完成"
+
+        scheduler.register_function('pool_task', task)
+        scheduler.start_workers()
+        try:
+            task_id = scheduler.add_task({'func_name': 'pool_task', 'priority': 'medium', 'site_id': 'site_1'})
+            self.assertTrue(wait_for(lambda: task_id not in scheduler.task_index))
+            self.assertEqual(len(attempts), 2)
+            self.assertGreaterEqual(attempts[1] - attempts[0], 0.15)
+            self.assertEqual(scheduler.stats['failed_tasks'], 0)
+            self.assertEqual(scheduler.stats['completed_tasks'], 1)
+            self.assertEqual(scheduler.site_running, {})
+        finally:
+            scheduler.stop_workers()
+
+
+
+class PreemptionTest(unittest.TestCase):
+    """时间片结束后的让出与孤儿执行测试"""
+
+    def test_cooperative_task_yields_within_grace_period(self):
+        scheduler = DynamicTimeSliceScheduler(preemption_grace_period=1.0)
+
+        def cooperative(task_id, time_slice, scheduler):
+            while not scheduler.should_yield(task_id):
+                time.sleep(0.01)
+            return "TIMEOUT"
+
+        self.assertEqual(scheduler._execute_with_timeout(cooperative, 'task_1', 0.05), "TIMEOUT")
+        self.assertEqual(scheduler.stats['preempted_executions'], 1)
+        self.assertEqual(scheduler.orphaned_executions, {})
+
+    def test_thread_alive_after_exit_cleanup_is_not_orphaned(self):
+        """执行线程已完成退出清理但仍短暂存活时，不应登记为孤儿执行"""
+
+        class SlowExitScheduler(DynamicTimeSliceScheduler):
+            def _on_execution_exit(self, *args):
+                super()._on_execution_exit(*args)
+                time.sleep(0.5)
+
+        scheduler = SlowExitScheduler(preemption_grace_period=0.1)
+        result = scheduler._execute_with_timeout(lambda *args: "完成", 'task_1', 0.05)
+        self.assertEqual(result, "完成")
+        self.assertEqual(scheduler.orphaned_executions, {})
+        self.assertNotIn('task_1', scheduler.preemption_events)
+
+    def test_orphan_is_recovered_when_thread_exits(self):
+        scheduler = DynamicTimeSliceScheduler(preemption_grace_period=0.1)
+        release = threading.Event()
+
+        def stuck(task_id, time_slice, scheduler):
+            release.wait(5)
+            return "完成"
+
+        result = scheduler._execute_with_timeout(stuck, 'task_1', 0.05)
+        self.assertEqual(result, "ORPHANED")
+        self.assertIn('task_1', scheduler.orphaned_executions)
+        release.set()
+        self.assertTrue(wait_for(lambda: not scheduler.orphaned_executions))
+        self.assertEqual(scheduler.stats['recovered_orphans'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分段下载测试
+"""
+
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.ftp_client import FTPClient
+from app.services.task_service import TaskService
+
+
+DATA = bytes(range(256)) * 64
+
+
+class FakeConnection:
+    """按REST偏移返回远程文件内容的数据连接，每次最多返回100字节"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def recv(self, size):
+        chunk, self.data = self.data[:min(size, 100)], self.data[min(size, 100):]
+        return chunk
+
+    def close(self):
+        pass
+
+
+class FakeFTP:
+    def __init__(self, data):
+        self.data = data
+        self.commands = []
+
+    def voidcmd(self, cmd):
+        self.commands.append(cmd)
+
+    def transfercmd(self, cmd, rest=None):
+        self.commands.append((cmd, rest))
+        return FakeConnection(self.data[rest or 0:])
+
+    def voidresp(self):
+        return '226 Transfer complete'
+
+
+class DownloadRangeTest(unittest.TestCase):
+    """按位置写入的分段下载"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.data_dir, 'file.part')
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        os.ftruncate(self.fd, len(DATA))
+        self.client = FTPClient('localhost', chunk_size=256)
+        self.client.ftp = FakeFTP(DATA)
+        self.client.ensure_connected = lambda: True
+
+    def tearDown(self):
+        os.close(self.fd)
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_segments_written_at_their_offsets(self):
+        # 倒序下载各分段，结果仍与远程文件一致
+        for start in range(len(DATA) - 4096, -1, -4096):
+            received = self.client.download_range('/file', self.fd, start, start + 4096)
+            self.assertEqual(received, 4096)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), DATA)
+        self.assertIn(('RETR /file', 4096), self.client.ftp.commands)
+
+    def test_short_writes_are_completed(self):
+        real_pwrite = os.pwrite
+
+        def short_pwrite(fd, data, offset):
+            return real_pwrite(fd, data[:7], offset)
+
+        with mock.patch('os.pwrite', side_effect=short_pwrite):
+            self.client.download_range('/file', self.fd, 1000, 2000)
+        with open(self.path, 'rb') as f:
+            f.seek(1000)
+            self.assertEqual(f.read(1000), DATA[1000:2000])
+
+    def test_stop_from_progress_callback(self):
+        received = self.client.download_range('/file', self.fd, 0, 4096, lambda n: False)
+        self.assertEqual(received, 100)
+
+
+class PreallocationFallbackTest(unittest.TestCase):
+    """预分配失败时改用单连接下载"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.local_path = os.path.join(self.data_dir, 'file.bin')
+        self.service = TaskService(None, None, connection_pool=mock.Mock())
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_allocation_failure_removes_part_file(self):
+        error = OSError(errno.ENOSPC, 'No space left on device')
+        with mock.patch.object(TaskService, '_preallocate', side_effect=error), \
+                mock.patch('os.close', wraps=os.close) as close:
+            result = self.service._segmented_download('task_1', 10, None, {}, None, '/file',
+                                                      self.local_path, len(DATA), {}, 4)
+        self.assertIsNone(result)
+        self.assertEqual(close.call_count, 1)
+        self.assertFalse(os.path.exists(f"{self.local_path}.part"))
+
+    def test_download_error_closes_part_file(self):
+        with mock.patch.object(TaskService, '_download_segments', side_effect=Exception('boom')), \
+                mock.patch('os.close', wraps=os.close) as close:
+            with self.assertRaises(Exception):
+                self.service._segmented_download('task_1', 10, None, {}, None, '/file',
+                                                 self.local_path, len(DATA), {}, 4)
+        self.assertEqual(close.call_count, 1)
+
+    def test_unsupported_fallocate_extends_file(self):
+        fd = os.open(self.local_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with mock.patch('os.posix_fallocate', side_effect=OSError(errno.EOPNOTSUPP, 'unsupported')):
+                TaskService._preallocate(fd, 12345)
+            self.assertEqual(os.fstat(fd).st_size, 12345)
+        finally:
+            os.close(fd)
+
+
+if __name__ == '__main__':
+    unittest.main()
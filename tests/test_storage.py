@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+存储后端测试
+"""
+
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.storage import JSONStorage, SQLiteStorage, create_storage, import_json_data
+
+
+def make_task(i, status='pending'):
+    return {'id': f"task_{i}", 'status': status, 'created_by': 'user_000001',
+            'created_at': f"2024-05-01T10:00:{i:02d}", 'name': f"下载任务{i}"}
+
+
+class SQLiteStorageTest(unittest.TestCase):
+    """SQLite后端的读写往返"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.data_dir, 'ftp_web.db')
+        self.storage = SQLiteStorage(self.db_path)
+
+    def tearDown(self):
+        self.storage.close()
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def reopen(self):
+        self.storage.close()
+        self.storage = SQLiteStorage(self.db_path)
+        return self.storage
+
+    def test_wal_mode(self):
+        mode = self.storage._connection().execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+
+    def test_task_round_trip(self):
+        self.storage.save_tasks([make_task(i) for i in range(3)])
+        self.storage.save_task(dict(make_task(1), status='completed'))
+
+        tasks = self.reopen().load_tasks()['tasks']
+        self.assertEqual(list(tasks), ['task_0', 'task_1', 'task_2'])
+        self.assertEqual(tasks['task_1']['status'], 'completed')
+        self.assertEqual(tasks['task_2']['name'], '下载任务2')
+
+        self.assertTrue(self.storage.delete_task('task_0'))
+        self.assertFalse(self.storage.delete_task('task_0'))
+        self.assertEqual([t['id'] for t in self.storage.get_recent_tasks(1)], ['task_2'])
+
+    def test_records_keep_insertion_order(self):
+        for i in range(3):
+            self.storage.save_record('sites', {'id': f"site_{i}", 'name': f"站点{i}"})
+        self.storage.save_record('sites', {'id': 'site_0', 'name': '改名'})
+
+        sites = self.reopen().load_records('sites')
+        self.assertEqual([site['id'] for site in sites], ['site_0', 'site_1', 'site_2'])
+        self.assertEqual(sites[0]['name'], '改名')
+        self.assertTrue(self.storage.delete_record('sites', 'site_1'))
+        self.assertEqual(len(self.storage.load_records('sites')), 2)
+
+    def test_next_id_survives_reopen(self):
+        self.assertEqual(self.storage.next_id('sites'), 'site_000001')
+        self.assertEqual(self.reopen().next_id('sites'), 'site_000002')
+
+    def test_writes_from_other_threads(self):
+        def worker(start):
+            self.storage.save_tasks([make_task(i) for i in range(start, start + 10)])
+            self.storage.close()
+
+        threads = [threading.Thread(target=worker, args=(start,)) for start in (0, 10, 20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.storage.load_tasks()['tasks']), 30)
+
+    def test_backup_is_readable(self):
+        self.storage.save_task(make_task(1))
+        backup_dir = os.path.join(self.data_dir, 'backup')
+        os.makedirs(backup_dir)
+        self.storage.backup(backup_dir)
+        conn = sqlite3.connect(os.path.join(backup_dir, 'ftp_web.db'))
+        try:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0], 1)
+        finally:
+            conn.close()
+
+
+class ImportJSONDataTest(unittest.TestCase):
+    """现有JSON数据导入到SQLite"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_import_keeps_records_and_counters(self):
+        source = JSONStorage(self.data_dir)
+        default_data = {collection: {collection: [], f"{collection[:-1]}_counter": 0}
+                        for collection in ('users', 'sites', 'monitors')}
+        source.initialize(dict(default_data, tasks={'tasks': {}}))
+        source.save_task(make_task(1))
+        for _ in range(3):
+            site_id = source.next_id('sites')
+        source.save_record('sites', {'id': site_id, 'name': '站点'})
+
+        storage = create_storage('sqlite', self.data_dir)
+        self.addCleanup(storage.close)
+        counts = import_json_data(self.data_dir, storage)
+        self.assertEqual((counts['tasks'], counts['sites']), (1, 1))
+        self.assertEqual(storage.load_records('sites')[0]['name'], '站点')
+        # 保存新记录时JSON计数器也会增加，导入后新ID不与已有ID冲突
+        self.assertEqual(storage.next_id('sites'), 'site_000005')
+
+
+if __name__ == '__main__':
+    unittest.main()
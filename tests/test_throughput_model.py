@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+吞吐模型和按学习速率计算时间片的测试
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.rate_limiter import HierarchicalRateLimiter
+from app.core.scheduler import DynamicTimeSliceScheduler, TaskPriority
+from app.core.throughput_model import ThroughputModel
+
+
+MB = 1024 * 1024
+
+
+class ThroughputModelTest(unittest.TestCase):
+    """EWMA更新、样本门槛和持久化"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.model = ThroughputModel(alpha=0.5, min_samples=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def test_ewma_updates(self):
+        self.model.record_transfer('site_1', 10 * MB, 10)
+        self.assertIsNone(self.model.get_site_throughput('site_1'))
+        self.model.record_transfer('site_1', 30 * MB, 10)
+        # 1MB/s + 0.5 × (3MB/s - 1MB/s)
+        self.assertEqual(self.model.get_site_throughput('site_1'), 2 * MB)
+
+    def test_small_samples_are_ignored(self):
+        for _ in range(3):
+            self.model.record_transfer('site_1', MB - 1, 10)
+            self.model.record_transfer('site_1', 10 * MB, 0.5)
+        self.assertEqual(self.model.get_statistics()['sites'], {})
+
+    def test_connection_and_completion_times(self):
+        self.model.record_connection('site_1', 2.0)
+        self.model.record_connection('site_1', 1.0)
+        self.assertEqual(self.model.get_setup_time('site_1'), 1.5)
+
+        self.model.record_completion('folder_download', 100, 2)
+        self.assertIsNone(self.model.get_completion_time('folder_download'))
+        self.model.record_completion('folder_download', 200, 4)
+        self.assertEqual(self.model.get_completion_time('folder_download'), 150)
+
+    def test_saved_statistics_survive_restart(self):
+        path = os.path.join(self.data_dir, 'throughput.json')
+        model = ThroughputModel(path, alpha=0.5, min_samples=1)
+        model.record_transfer('site_1', 10 * MB, 10)
+        model.save()
+
+        reloaded = ThroughputModel(path, alpha=0.5, min_samples=1)
+        self.assertEqual(reloaded.get_site_throughput('site_1'), MB)
+
+
+class LearnedTimeSliceTest(unittest.TestCase):
+    """样本充足时按预计剩余时间计算时间片，并限制在上下限之间"""
+
+    def setUp(self):
+        self.model = ThroughputModel(min_samples=1)
+        self.model.record_transfer('site_1', 10 * MB, 10)
+        self.model.record_connection('site_1', 1.0)
+        self.limiter = HierarchicalRateLimiter()
+        self.scheduler = DynamicTimeSliceScheduler(throughput_model=self.model, rate_limiter=self.limiter)
+
+    def make_task(self, file_size, downloaded=0, site_id='site_1'):
+        return {'id': 'task_1', 'site_id': site_id, 'priority': TaskPriority.MEDIUM,
+                'task_type': 'file_download', 'file_size': file_size,
+                'checkpoint_data': {'downloaded_bytes': downloaded}}
+
+    def test_slice_from_remaining_bytes(self):
+        # 剩余100MB，1MB/s，留10%余量
+        self.assertAlmostEqual(self.scheduler.calculate_learned_time_slice(self.make_task(150 * MB, 50 * MB)), 110)
+
+    def test_lower_bound_from_setup_time(self):
+        # 建立连接耗时1秒，不超过时间片的5%
+        self.assertEqual(self.scheduler.calculate_learned_time_slice(self.make_task(MB)), 20)
+
+    def test_upper_bound_and_rate_limit(self):
+        self.limiter.set_task_limit('task_1', 100 * 1024)
+        # 基础时间片60秒 × 下载倍数2 × 3
+        self.assertEqual(self.scheduler.calculate_learned_time_slice(self.make_task(50 * MB)), 360)
+
+    def test_unknown_site_falls_back_to_static(self):
+        task = self.make_task(50 * MB, site_id='site_2')
+        self.assertIsNone(self.scheduler.calculate_learned_time_slice(task))
+        self.scheduler._update_time_slice(task)
+        self.assertEqual(task['time_slice_source'], 'static')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+远程目录树遍历测试
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.tree_walker import RemoteTreeWalker
+
+
+TREE = {
+    '/root': ['a', 'b', 'x.txt'],
+    '/root/a': ['y.txt'],
+    '/root/b': ['z.txt']
+}
+
+
+class FakeSession:
+    """按TREE列目录的会话，列出fail_on中的目录时连接断开"""
+
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.connected = True
+
+    def list_entries(self, path):
+        if path in self.fail_on:
+            self.connected = False
+            raise OSError("connection reset")
+        return [
+            {'name': name, 'is_directory': '.' not in name, 'size': 1, 'modified': None}
+            for name in TREE.get(path, [])
+        ]
+
+
+class FakePool:
+    """记录借用和归还的连接池"""
+
+    def __init__(self, sessions):
+        self.sessions = list(sessions)
+        self.acquired = []
+        self.released = []
+
+    def acquire(self, site_config, timeout=None, task_id=None):
+        if not self.sessions:
+            raise Exception("no session")
+        self.acquired.append(task_id)
+        return self.sessions.pop(0)
+
+    def release(self, client, discard=False):
+        self.released.append((client, discard))
+
+
+class TreeWalkerSessionTest(unittest.TestCase):
+    """会话失效测试"""
+
+    def walk(self, pool, **kwargs):
+        paths = []
+        walker = RemoteTreeWalker(pool, {'id': 'site_1'}, task_id='task_1', **kwargs)
+        complete = walker.walk('/root', lambda rel_path, entry: paths.append(rel_path))
+        return complete, sorted(paths)
+
+    def test_replaces_dead_session_and_finishes(self):
+        first = FakeSession(fail_on={'/root/a'})
+        pool = FakePool([first, FakeSession()])
+        complete, paths = self.walk(pool)
+        self.assertTrue(complete)
+        self.assertEqual(paths, ['a', 'a/y.txt', 'b', 'b/z.txt', 'x.txt'])
+        self.assertEqual(pool.acquired, ['task_1', 'task_1'])
+        self.assertIn((first, True), pool.released)
+
+    def test_raises_when_sessions_keep_failing(self):
+        dead = {'/root/a', '/root/b'}
+        pool = FakePool([FakeSession(dead), FakeSession(dead), FakeSession(dead)])
+        with self.assertRaises(Exception):
+            self.walk(pool, max_session_retries=2)
+        self.assertEqual(len(pool.released), 3)
+        self.assertTrue(all(discard for _, discard in pool.released))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上传发送路径测试（sendfile/mmap）
+"""
+
+import ftplib
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.ftp_client import FTPClient
+
+
+DATA = os.urandom(300 * 1024)
+
+
+class Receiver:
+    """在后台线程中读取套接字对另一端收到的全部数据"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.data = bytearray()
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+
+    def _read(self):
+        while True:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                break
+            self.data.extend(chunk)
+        self.sock.close()
+
+    def result(self) -> bytes:
+        self.thread.join(5)
+        return bytes(self.data)
+
+
+class FakeFTP:
+    """数据连接为本地套接字对，remote_size为服务器上已有的字节数"""
+
+    def __init__(self, remote_size=None):
+        self.remote_size = remote_size
+        self.commands = []
+        self.receiver = None
+
+    def voidcmd(self, cmd):
+        self.commands.append(cmd)
+
+    def size(self, path):
+        if self.remote_size is None:
+            raise ftplib.error_perm("550 No such file")
+        return self.remote_size
+
+    def transfercmd(self, cmd, rest=None):
+        self.commands.append(cmd)
+        local, remote = socket.socketpair()
+        self.receiver = Receiver(remote)
+        return local
+
+    def voidresp(self):
+        return '226 Transfer complete'
+
+
+class SendFileTest(unittest.TestCase):
+    """sendfile和mmap两条发送路径发送的数据相同"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.data_dir, 'upload.bin')
+        with open(self.path, 'wb') as f:
+            f.write(DATA)
+        self.client = FTPClient('localhost')
+        self.client.send_chunk_size = 64 * 1024
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def send(self, offset, end):
+        local, remote = socket.socketpair()
+        receiver = Receiver(remote)
+        sent = []
+        with local, open(self.path, 'rb') as f:
+            self.client._send_file(local, f, offset, end, sent.append)
+        return receiver.result(), sent
+
+    def test_sendfile_range(self):
+        self.assertTrue(hasattr(os, 'sendfile'))
+        data, sent = self.send(1000, len(DATA))
+        self.assertEqual(data, DATA[1000:])
+        self.assertEqual(sum(sent), len(DATA) - 1000)
+        self.assertTrue(all(count <= 64 * 1024 for count in sent))
+
+    def test_mmap_fallback_range(self):
+        sendfile = os.sendfile
+        del os.sendfile
+        try:
+            data, sent = self.send(1000, 200 * 1024)
+        finally:
+            os.sendfile = sendfile
+        self.assertEqual(data, DATA[1000:200 * 1024])
+        self.assertEqual(sum(sent), 200 * 1024 - 1000)
+
+    def test_empty_range_sends_nothing(self):
+        data, sent = self.send(len(DATA), len(DATA))
+        self.assertEqual((data, sent), (b'', []))
+
+
+class UploadFileTest(unittest.TestCase):
+    """upload_file使用STOR上传，续传时使用APPE从远程大小开始追加"""
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.data_dir, 'upload.bin')
+        with open(self.path, 'wb') as f:
+            f.write(DATA)
+        self.client = FTPClient('localhost')
+        self.client.connected = True
+        self.client.ensure_connected = lambda: True
+        self.client.ensure_remote_directory = lambda path: True
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def upload(self, remote_size):
+        self.client.ftp = FakeFTP(remote_size)
+        self.assertTrue(self.client.upload_file(self.path, '/dir/upload.bin'))
+        return self.client.ftp
+
+    def test_new_upload_uses_stor(self):
+        ftp = self.upload(None)
+        self.assertIn('STOR /dir/upload.bin', ftp.commands)
+        self.assertEqual(ftp.receiver.result(), DATA)
+
+    def test_resume_appends_from_remote_size(self):
+        ftp = self.upload(5000)
+        self.assertIn('APPE /dir/upload.bin', ftp.commands)
+        self.assertEqual(ftp.receiver.result(), DATA[5000:])
+
+
+if __name__ == '__main__':
+    unittest.main()